@@ -30,12 +30,14 @@ administration of Serial Attached SCSI (SAS) fabrics.
 %py3_install
 install -d %{buildroot}/%{_mandir}/man1
 install -p -m 0644 doc/man/man1/sas_counters.1 %{buildroot}/%{_mandir}/man1/
+install -p -m 0644 doc/man/man1/sas_counters_analyze.1 %{buildroot}/%{_mandir}/man1/
 install -p -m 0644 doc/man/man1/sas_devices.1 %{buildroot}/%{_mandir}/man1/
 install -p -m 0644 doc/man/man1/sas_discover.1 %{buildroot}/%{_mandir}/man1/
 install -p -m 0644 doc/man/man1/ses_report.1 %{buildroot}/%{_mandir}/man1/
 
 %files
 %{_bindir}/sas_counters
+%{_bindir}/sas_counters_analyze
 %{_bindir}/sas_devices
 %{_bindir}/sas_discover
 %{_bindir}/sas_mpath_snic_alias
@@ -45,6 +47,7 @@ install -p -m 0644 doc/man/man1/ses_report.1 %{buildroot}/%{_mandir}/man1/
 %{python3_sitelib}/sasutils/
 %{python3_sitelib}/sasutils-*-py%{python3_version}.egg-info
 %{_mandir}/man1/sas_counters.1*
+%{_mandir}/man1/sas_counters_analyze.1*
 %{_mandir}/man1/sas_devices.1*
 %{_mandir}/man1/sas_discover.1*
 %{_mandir}/man1/ses_report.1*
@@ -36,6 +36,7 @@ install -p -m 0644 doc/man/man1/ses_report.1 %{buildroot}/%{_mandir}/man1/
 
 %files
 %{_bindir}/sas_counters
+%{_bindir}/sas_counters_analyze
 %{_bindir}/sas_devices
 %{_bindir}/sas_discover
 %{_bindir}/sas_mpath_snic_alias
@@ -0,0 +1,320 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Fleet analytics over collected sas_counters outputs
+
+Stream many sas_counters dumps (Carbon plaintext lines) into NumPy arrays
+keyed by host, expander and phy, and compute per-phy error growth, z-scores
+relative to the other phys of the same expander, and suspect cables and
+expanders.
+
+Requires NumPy.
+
+Samples are processed in fixed-size chunks; only per-series state (last
+value, last timestamp, accumulated growth) is kept between chunks, so memory
+use is bounded by the chunk size and the number of distinct series.
+"""
+
+import gzip
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_PREFIX = 'sasutils.sas_counters'
+DEFAULT_CHUNK_SIZE = 1000000
+
+PHY_COUNTERS = ('invalid_dword_count', 'loss_of_dword_sync_count',
+                'phy_reset_problem_count', 'running_disparity_error_count')
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path)
+
+
+def _parse_int(value):
+    """Parse an integer Carbon value, which may be written as a float."""
+    try:
+        result = int(value)
+    except ValueError:
+        result = int(float(value))
+    if not -2**63 <= result < 2**63:
+        raise OverflowError('%s does not fit in 64 bits' % value)
+    return result
+
+
+class PhyCounterSeries(object):
+    """Per-series state of phy error counters, stored in NumPy arrays."""
+
+    def __init__(self, prefix=DEFAULT_PREFIX, chunk_size=DEFAULT_CHUNK_SIZE):
+        if np is None:
+            raise ImportError('NumPy is required for sasutils.analytics')
+        self.prefix = prefix.strip('.') + '.' if prefix.strip('.') else ''
+        self.chunk_size = chunk_size
+        # series key -> series id
+        self._ids = {}
+        # per series labels
+        self.hosts = []
+        self.expanders = []
+        self.phys = []
+        self.counters = []
+        self.nsamples = 0
+        # number of malformed lines skipped
+        self.malformed = 0
+        capacity = 1024
+        self.last_value = np.zeros(capacity, dtype=np.int64)
+        self.last_ts = np.full(capacity, -1, dtype=np.int64)
+        self.growth = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def _series_id(self, key):
+        """Return id of the series named key, or -1 if key is not a phy
+        error counter."""
+        sid = self._ids.get(key)
+        if sid is not None:
+            return sid
+        if not key.startswith(self.prefix):
+            self._ids[key] = -1
+            return -1
+        # host.board.addr[.expander...].phys.N.extra.counter
+        path, sep, phyinfo = key[len(self.prefix):].rpartition('.phys.')
+        phyinfo = phyinfo.split('.')
+        if not sep or len(phyinfo) != 3 or phyinfo[2] not in PHY_COUNTERS:
+            self._ids[key] = -1
+            return -1
+        sid = len(self.hosts)
+        self.hosts.append(path.split('.', 1)[0])
+        self.expanders.append(path)
+        self.phys.append(int(phyinfo[0]))
+        self.counters.append(phyinfo[2])
+        self._ids[key] = sid
+        if sid >= len(self.growth):
+            self._grow(2 * len(self.growth))
+        return sid
+
+    def _grow(self, capacity):
+        count = len(self.growth)
+        for name, fill in (('last_value', 0), ('last_ts', -1),
+                           ('growth', 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=np.int64)
+            new[:count] = old
+            setattr(self, name, new)
+
+    def load(self, paths):
+        """Stream counter dumps; paths are processed in the given order, so
+        dumps of the same host should be provided in chronological order."""
+        for path in paths:
+            with _open(path) as fp:
+                while True:
+                    lines = fp.readlines(self.chunk_size * 128)
+                    if not lines:
+                        break
+                    self._add_lines(lines)
+
+    def _add_lines(self, lines):
+        """Parse a block of Carbon lines and add its phy counter samples.
+        Malformed lines (not "key value timestamp" with numeric value and
+        timestamp) are skipped and counted in self.malformed."""
+        ids = self._ids
+        sids = []
+        vals = []
+        tss = []
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) != 3:
+                self.malformed += 1
+                continue
+            key, val, ts = fields
+            sid = ids.get(key)
+            if sid is None:
+                sid = self._series_id(key)
+            if sid < 0:
+                continue
+            try:
+                val = _parse_int(val)
+                ts = _parse_int(ts)
+            except (ValueError, OverflowError):
+                self.malformed += 1
+                continue
+            sids.append(sid)
+            vals.append(val)
+            tss.append(ts)
+        if sids:
+            self._add_chunk(np.array(sids, dtype=np.int64),
+                            np.array(vals, dtype=np.int64),
+                            np.array(tss, dtype=np.int64))
+
+    def _add_chunk(self, sid, val, ts):
+        """Vectorized delta computation over one chunk of samples."""
+        self.nsamples += len(sid)
+
+        order = np.lexsort((ts, sid))
+        sid, val, ts = sid[order], val[order], ts[order]
+
+        # previous sample of each sample: within chunk or carried state
+        first = np.ones(len(sid), dtype=bool)
+        first[1:] = sid[1:] != sid[:-1]
+        prev_val = np.empty_like(val)
+        prev_ts = np.empty_like(ts)
+        prev_val[1:] = val[:-1]
+        prev_ts[1:] = ts[:-1]
+        prev_val[first] = self.last_value[sid[first]]
+        prev_ts[first] = self.last_ts[sid[first]]
+
+        # ignore first samples of a series and out of order samples
+        valid = (prev_ts >= 0) & (ts > prev_ts)
+        delta = val - prev_val
+        # a decreasing counter has been reset
+        reset = delta < 0
+        delta[reset] = val[reset]
+        delta[~valid] = 0
+        self.growth[:len(self.hosts)] += np.bincount(
+            sid, weights=delta, minlength=len(self.hosts)).astype(np.int64)
+
+        # carry last sample of each series over to the next chunk
+        last = np.ones(len(sid), dtype=bool)
+        last[:-1] = sid[1:] != sid[:-1]
+        newer = ts[last] > self.last_ts[sid[last]]
+        self.last_value[sid[last][newer]] = val[last][newer]
+        self.last_ts[sid[last][newer]] = ts[last][newer]
+
+    def phy_report(self):
+        """Aggregate counters per phy.
+
+        Return a PhyReport with one entry per (host, expander, phy).
+        """
+        return PhyReport(self)
+
+
+def _group_ids(labels):
+    """Return (unique labels, integer id of each label)."""
+    uniq = {}
+    ids = np.fromiter((uniq.setdefault(label, len(uniq)) for label in labels),
+                      dtype=np.int64, count=len(labels))
+    return list(uniq), ids
+
+
+def _zscores(values, groups, ngroups):
+    """Return z-score of each value relative to its group."""
+    count = np.bincount(groups, minlength=ngroups).astype(np.float64)
+    total = np.bincount(groups, weights=values, minlength=ngroups)
+    mean = total / np.maximum(count, 1)
+    sqdev = (values - mean[groups]) ** 2
+    std = np.sqrt(np.bincount(groups, weights=sqdev, minlength=ngroups) /
+                  np.maximum(count, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscores = (values - mean[groups]) / std[groups]
+    zscores[~np.isfinite(zscores)] = 0.0
+    return zscores
+
+
+class PhyReport(object):
+    """Per-phy error growth, z-scores, suspect cables and expanders."""
+
+    def __init__(self, series):
+        nseries = len(series.hosts)
+        phykeys = list(zip(series.expanders, series.phys))
+        self.phy_labels, phy_of_series = _group_ids(phykeys)
+        nphys = len(self.phy_labels)
+        growth = series.growth[:nseries].astype(np.float64)
+
+        # total error growth per phy (all counters)
+        self.growth = np.bincount(phy_of_series, weights=growth,
+                                  minlength=nphys)
+        # per counter breakdown
+        self.by_counter = {}
+        counters = np.array(series.counters, dtype=object)
+        for counter in PHY_COUNTERS:
+            mask = counters == counter
+            self.by_counter[counter] = np.bincount(
+                phy_of_series[mask], weights=growth[mask], minlength=nphys)
+
+        # per expander (or HBA) peer groups
+        self.expander_labels, self.phy_expander = _group_ids(
+            [label[0] for label in self.phy_labels])
+        nexp = len(self.expander_labels)
+        self.zscores = _zscores(self.growth, self.phy_expander, nexp)
+        self.expander_growth = np.bincount(self.phy_expander,
+                                           weights=self.growth,
+                                           minlength=nexp)
+        self.expander_errphys = np.bincount(self.phy_expander,
+                                            weights=self.growth > 0,
+                                            minlength=nexp)
+        self.expander_nphys = np.bincount(self.phy_expander, minlength=nexp)
+
+    def top_phys(self, count):
+        """Yield (expander, phy, growth, zscore, per counter growth) of the
+        phys with the largest error growth."""
+        order = np.argsort(-self.growth, kind='stable')[:count]
+        for idx in order:
+            if self.growth[idx] <= 0:
+                break
+            expander, phy = self.phy_labels[idx]
+            counters = dict((name, int(values[idx])) for name, values
+                            in self.by_counter.items() if values[idx])
+            yield (expander, phy, int(self.growth[idx]),
+                   float(self.zscores[idx]), counters)
+
+    def suspect_cables(self, lanes=4, min_lanes=2):
+        """Yield (expander, first phy, lanes with errors, growth) of wide
+        ports (groups of lanes consecutive phys) where at least min_lanes
+        phys have increasing error counters."""
+        phys = np.array([label[1] for label in self.phy_labels],
+                        dtype=np.int64)
+        cablekeys = list(zip(self.phy_expander.tolist(),
+                             (phys // lanes).tolist()))
+        labels, cable_of_phy = _group_ids(cablekeys)
+        ncables = len(labels)
+        errlanes = np.bincount(cable_of_phy, weights=self.growth > 0,
+                               minlength=ncables)
+        growth = np.bincount(cable_of_phy, weights=self.growth,
+                             minlength=ncables)
+        order = np.lexsort((-errlanes, -growth))
+        for idx in order:
+            if errlanes[idx] < min_lanes:
+                continue
+            expidx, cable = labels[idx]
+            yield (self.expander_labels[expidx], cable * lanes,
+                   int(errlanes[idx]), int(growth[idx]))
+
+    def suspect_expanders(self, threshold=2.0):
+        """Yield (expander, phys with errors, phys, growth, zscore) of
+        expanders whose total error growth z-score across all expanders is
+        above threshold, or whose phys all have increasing error counters."""
+        nexp = len(self.expander_labels)
+        groups = np.zeros(nexp, dtype=np.int64)
+        zscores = _zscores(self.expander_growth, groups, 1)
+        order = np.argsort(-self.expander_growth, kind='stable')
+        for idx in order:
+            if self.expander_growth[idx] <= 0:
+                break
+            allerr = self.expander_errphys[idx] == self.expander_nphys[idx]
+            if zscores[idx] >= threshold or allerr:
+                yield (self.expander_labels[idx],
+                       int(self.expander_errphys[idx]),
+                       int(self.expander_nphys[idx]),
+                       int(self.expander_growth[idx]), float(zscores[idx]))
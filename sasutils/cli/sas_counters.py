@@ -16,25 +16,129 @@
 
 
 import argparse
+import json
+import os
 import socket
 import sys
 import time
 
+from sasutils.command import add_executor_arguments, setup_executor
+from sasutils.history import CounterHistory
+from sasutils.history import DEFAULT_MAX_SERIES, DEFAULT_NSLOTS
+from sasutils.profiling import add_profile_argument, phase, setup_profiling
 from sasutils.sas import SASHost
-from sasutils.ses import ses_get_snic_nickname
+from sasutils.ses import ses_get_snic_nickname, ses_get_snic_nicknames
 from sasutils.scsi import MAP_TYPES
 from sasutils.sysfs import sysfs
 
+# error counters reported by the history query mode
+ERROR_COUNTERS = ('invalid_dword_count', 'loss_of_dword_sync_count',
+                  'phy_reset_problem_count', 'running_disparity_error_count',
+                  'ioerr_cnt')
+
+
+class ChangeFilter(object):
+    """Only let through counters whose value changed since they were last
+    emitted, or that were not emitted for heartbeat seconds.
+
+    Last emitted values are kept across runs in a JSON state file.
+    """
+
+    def __init__(self, path, heartbeat):
+        self.path = path
+        self.heartbeat = heartbeat
+        self.emitted = 0
+        self.suppressed = 0
+        try:
+            with open(path) as fp:
+                self.last = json.load(fp)
+        except (IOError, OSError, ValueError):
+            self.last = {}
+        if not isinstance(self.last, dict):
+            # valid JSON, but not a state file: start afresh
+            self.last = {}
+        # only remember series seen during this run
+        self.state = {}
+
+    def __call__(self, key, value, timestamp):
+        value = str(value)
+        last = self.last.get(key)
+        try:
+            unchanged = last[0] == value and \
+                timestamp - last[1] < self.heartbeat
+        except (TypeError, IndexError, KeyError):
+            # new series or invalid state entry
+            unchanged = False
+        if unchanged:
+            self.state[key] = last
+            self.suppressed += 1
+            return False
+        self.state[key] = [value, int(timestamp)]
+        self.emitted += 1
+        return True
+
+    def close(self):
+        tmppath = '%s.%d' % (self.path, os.getpid())
+        try:
+            with open(tmppath, 'w') as fp:
+                json.dump(self.state, fp)
+            os.rename(tmppath, self.path)
+        except (IOError, OSError) as err:
+            print("Cannot save state: %s" % err, file=sys.stderr)
+        total = self.emitted + self.suppressed
+        print("sas_counters: %d series, %d emitted, %d suppressed (%.1f%%)" %
+              (total, self.emitted, self.suppressed,
+               100.0 * self.suppressed / total if total else 0.0),
+              file=sys.stderr)
+
+
+class CarbonOutput(object):
+    """Print counters using the Carbon plaintext protocol, optionally
+    recording them into a local counter history and only printing changed
+    values."""
+
+    def __init__(self, history=None, changes=None):
+        self.history = history
+        self.changes = changes
+        self.samples = []
+
+    def write(self, key, value):
+        timestamp = time.time()
+        if self.history is not None:
+            try:
+                self.samples.append((key, int(value)))
+            except ValueError:
+                pass
+        if self.changes is not None and \
+                not self.changes(key, value, timestamp):
+            return
+        print('%s %s %d' % (key, value, timestamp))
+
+    def close(self):
+        if self.history is not None:
+            self.history.record(time.time(), self.samples)
+            self.history.close()
+        if self.changes is not None:
+            self.changes.close()
+
 
 class SDNode(object):
-    def __init__(self, baseobj, name=None, parent=None, prefix=''):
+    # profiling phase of resolve()
+    profile_phase = 'hosts'
+
+    def __init__(self, baseobj, name=None, parent=None, prefix='',
+                 output=None):
         self.name = name
         self.parent = parent
         self.baseobj = baseobj
         self.prefix = prefix
+        if output is None:
+            output = parent.output if parent else CarbonOutput()
+        self.output = output
         self.children = []
         self.nickname = None
-        self.resolve()
+        with phase(self.profile_phase):
+            self.resolve()
 
     def resolve(self):
         pass
@@ -56,13 +160,7 @@ class SDNode(object):
         path = self.bottomup()
         path.reverse()
         keybase = '.'.join(path).replace(' ', '_')
-        # some counters in sysfs are hex numbers
-        try:
-            if value.startswith('0x'):
-                value = int(value, 16)
-        except AttributeError:
-            pass
-        print('%s.%s %s %d' % (keybase, key, value, time.time()))
+        self.output.write('%s.%s' % (keybase, key), value)
 
     def add_child(self, sdclass, parent, baseobj, name=None):
         if not name:
@@ -92,15 +190,12 @@ class SDHostNode(SDNode):
             if len(port_n.expanders) > 0:
                 return [1, 0, 0]
             sortv = [0, 0, 0]  # exp?, -type, bay
-            try:
-                if len(port_n.end_devices) > 0:
-                    if len(port_n.end_devices[0].targets) > 0:
-                        sortv[1] = -int(port_n.end_devices[0].targets[0].attrs
-                                        .type)
-                    sortv[2] = int(port_n.end_devices[0].sas_device.attrs
-                                   .bay_identifier)
-            except (RuntimeError, ValueError):
-                pass
+            if len(port_n.end_devices) > 0:
+                end_device = port_n.end_devices[0]
+                if len(end_device.targets) > 0:
+                    sortv[1] = -end_device.targets[0].attrs.typed('type', 0)
+                sortv[2] = end_device.sas_device.attrs.typed('bay_identifier',
+                                                             0)
             return sortv
 
         for port in sorted(self.baseobj.ports, key=portsortfunc):
@@ -133,10 +228,12 @@ class SDHostNode(SDNode):
                             else:
                                 extra = tgt.scsi_generic.sg_name
                 phykey = 'phys.%s.%s.%s' % (phyid, extra, key)
-                try:
-                    self.print_counter(phykey, phy.attrs.get(key))
-                except AttributeError as exc:
-                    print('%s: %s' % (phy, exc), file=sys.stderr)
+                value = phy.attrs.typed(key)
+                if value is None:
+                    print('%s: no valid %s attribute' % (phy, key),
+                          file=sys.stderr)
+                else:
+                    self.print_counter(phykey, value)
 
     def __str__(self):
         board = self.baseobj.scsi_host.attrs.get('board_name', 'UNKNOWN_BOARD')
@@ -145,6 +242,8 @@ class SDHostNode(SDNode):
 
 
 class SDExpanderNode(SDHostNode):
+    profile_phase = 'expanders'
+
     def __str__(self):
         expander = self.baseobj
         if self.nickname:
@@ -155,6 +254,8 @@ class SDExpanderNode(SDHostNode):
 
 
 class SDEndDeviceNode(SDNode):
+    profile_phase = 'end devices'
+
     def resolve(self):
         for target in self.baseobj.targets:
             self.add_child(SDSCSIDeviceNode, self, target)
@@ -162,12 +263,7 @@ class SDEndDeviceNode(SDNode):
     def __str__(self):
         sas_end_device = self.baseobj
 
-        bay = None
-        try:
-            bay = int(sas_end_device.sas_device.attrs.bay_identifier)
-        except (AttributeError, ValueError):
-            pass
-
+        bay = sas_end_device.sas_device.attrs.typed('bay_identifier')
         if bay is None:
             return 'no-bay.%s' % sas_end_device.name
 
@@ -175,12 +271,17 @@ class SDEndDeviceNode(SDNode):
 
 
 class SDSCSIDeviceNode(SDNode):
+    profile_phase = 'scsi devices'
+
     def resolve(self):
         # Display device errors (work with both ses and sd drivers)
         scsi_device = self.baseobj
-        self.print_counter('ioerr_cnt', scsi_device.attrs['ioerr_cnt'])
-        self.print_counter('iodone_cnt', scsi_device.attrs['iodone_cnt'])
-        self.print_counter('iorequest_cnt', scsi_device.attrs['iorequest_cnt'])
+        for key in ('ioerr_cnt', 'iodone_cnt', 'iorequest_cnt'):
+            value = scsi_device.attrs.typed(key)
+            if value is None:
+                # raise AttributeError like before if missing
+                value = scsi_device.attrs[key]
+            self.print_counter(key, value)
 
     def __str__(self):
         return self.get_scsi_device_info(self.baseobj)
@@ -209,6 +310,21 @@ class SDSCSIDeviceNode(SDNode):
         return dev_info
 
 
+def print_history(path, window):
+    """Print error counters that increased within the last window seconds
+    according to the local counter history."""
+    try:
+        history = CounterHistory(path, readonly=True)
+    except (IOError, OSError, ValueError) as err:
+        print("Cannot open history: %s" % err, file=sys.stderr)
+        sys.exit(1)
+    with history:
+        for key, gain in history.gains(window, now=time.time(),
+                                       keys=lambda k: k.endswith(
+                                           ERROR_COUNTERS)):
+            print('%s %d' % (key, gain))
+
+
 def main():
     """console_scripts entry point for sas_counters command-line."""
     parser = argparse.ArgumentParser()
@@ -216,17 +332,68 @@ def main():
                         default='sasutils.sas_counters',
                         help='carbon prefix (example: "datacenter.cluster",'
                              ' default is "sasutils.sas_counters")')
+    parser.add_argument('--history-file', action='store', metavar='FILE',
+                        help='also record counters into a local fixed-size '
+                             'history FILE')
+    parser.add_argument('--history', action='store', type=int,
+                        metavar='SECONDS',
+                        help='query mode: print error counters that '
+                             'increased within the last SECONDS according '
+                             'to --history-file, without scanning sysfs')
+    parser.add_argument('--history-series', action='store', type=int,
+                        default=DEFAULT_MAX_SERIES, metavar='N',
+                        help='maximum number of series of a new history '
+                             'file (default is %d)' % DEFAULT_MAX_SERIES)
+    parser.add_argument('--history-slots', action='store', type=int,
+                        default=DEFAULT_NSLOTS, metavar='N',
+                        help='number of samples kept per series in a new '
+                             'history file (default is %d)' % DEFAULT_NSLOTS)
+    parser.add_argument('--changed-only', action='store', metavar='STATE',
+                        help='only print counters that changed since they '
+                             'were last printed, remembering them in STATE '
+                             'file between runs')
+    parser.add_argument('--heartbeat', action='store', type=int, default=600,
+                        metavar='SECONDS',
+                        help='with --changed-only, print unchanged counters '
+                             'again after SECONDS (default is 600)')
+    add_profile_argument(parser)
+    add_executor_arguments(parser)
     pargs = parser.parse_args()
+    setup_profiling(pargs.profile)
+    setup_executor(pargs.jobs, pargs.timeout, pargs.deadline)
+    if pargs.history is not None:
+        if not pargs.history_file:
+            parser.error('--history requires --history-file')
+        print_history(pargs.history_file, pargs.history)
+        return
+
     pfx = pargs.prefix.strip('.')
+    history = None
+    if pargs.history_file:
+        try:
+            history = CounterHistory(pargs.history_file,
+                                     pargs.history_series,
+                                     pargs.history_slots)
+        except (IOError, OSError, ValueError) as err:
+            parser.error('cannot open history: %s' % err)
+    changes = None
+    if pargs.changed_only:
+        changes = ChangeFilter(pargs.changed_only, pargs.heartbeat)
+    output = CarbonOutput(history, changes)
     try:
         # print short hostname as tree root node
         root_name = socket.gethostname().split('.')[0]
         root_obj = sysfs.node('class').node('sas_host')
-        SDRootNode(root_obj, name=root_name, prefix=pfx).print_tree()
+        # query enclosure nicknames in parallel (kept in command cache)
+        ses_get_snic_nicknames()
+        SDRootNode(root_obj, name=root_name, prefix=pfx,
+                   output=output).print_tree()
     except IOError:
         pass
     except KeyError as err:
         print("Not found: %s" % err, file=sys.stderr)
+    finally:
+        output.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,109 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+sas_counters_analyze - find outlier SAS links in collected sas_counters dumps
+"""
+
+import argparse
+import sys
+import time
+
+from sasutils.analytics import DEFAULT_CHUNK_SIZE, DEFAULT_PREFIX
+from sasutils.analytics import PhyCounterSeries
+
+
+def _init_argparser():
+    """Initialize argparser object for sas_counters_analyze command-line."""
+    desc = 'Analyze phy error counters from many sas_counters outputs ' \
+           '(part of sasutils).'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help='sas_counters outputs (Carbon format, may be '
+                             'gzip compressed, "-" for stdin); dumps of the '
+                             'same host must be given in chronological order')
+    parser.add_argument('--prefix', action='store', default=DEFAULT_PREFIX,
+                        help='carbon prefix used by sas_counters (default '
+                             'is "%s")' % DEFAULT_PREFIX)
+    parser.add_argument('--top', '-n', action='store', type=int, default=20,
+                        help='number of phys to report (default is 20)')
+    parser.add_argument('--lanes', action='store', type=int, default=4,
+                        help='number of phys per cable (default is 4)')
+    parser.add_argument('--zscore', action='store', type=float, default=2.0,
+                        help='expander z-score threshold (default is 2.0)')
+    parser.add_argument('--chunk-size', action='store', type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help='number of samples processed at once (default '
+                             'is %d)' % DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--verbose', '-v', action='count', default=0,
+                        help='Verbosity level, repeat multiple times!')
+    return parser
+
+
+def main():
+    """console_scripts entry point for sas_counters_analyze command-line."""
+    parser = _init_argparser()
+    pargs = parser.parse_args()
+
+    try:
+        series = PhyCounterSeries(pargs.prefix, pargs.chunk_size)
+    except ImportError as err:
+        print("Error: %s" % err, file=sys.stderr)
+        sys.exit(1)
+
+    start = time.time()
+    try:
+        series.load(pargs.files)
+    except (IOError, OSError) as err:
+        print("Error: %s" % err, file=sys.stderr)
+        sys.exit(1)
+    if series.malformed:
+        print("Warning: skipped %d malformed lines" % series.malformed,
+              file=sys.stderr)
+    report = series.phy_report()
+    if pargs.verbose > 0:
+        print("Loaded %d samples of %d series (%d phys) in %.1fs" %
+              (series.nsamples, len(series), len(report.phy_labels),
+               time.time() - start))
+
+    print("*** Top phy error growth")
+    print('%10s %7s  %s' % ('GROWTH', 'ZSCORE', 'PHY'))
+    for expander, phy, growth, zscore, counters in \
+            report.top_phys(pargs.top):
+        print('%10d %7.1f  %s.phys.%d' % (growth, zscore, expander, phy))
+        if pargs.verbose > 0:
+            for counter, value in sorted(counters.items()):
+                print('%10d %7s    %s' % (value, '', counter))
+
+    print("*** Suspect cables")
+    print('%10s %7s  %s' % ('GROWTH', 'LANES', 'PHYS'))
+    for expander, phy, errlanes, growth in \
+            report.suspect_cables(pargs.lanes):
+        print('%10d %5d/%d  %s.phys.%d-%d' % (growth, errlanes, pargs.lanes,
+                                              expander, phy,
+                                              phy + pargs.lanes - 1))
+
+    print("*** Suspect expanders")
+    print('%10s %7s %9s  %s' % ('GROWTH', 'ZSCORE', 'ERR_PHYS', 'EXPANDER'))
+    for expander, errphys, nphys, growth, zscore in \
+            report.suspect_expanders(pargs.zscore):
+        print('%10d %7.1f %4d/%-4d  %s' % (growth, zscore, errphys, nphys,
+                                           expander))
+
+
+if __name__ == '__main__':
+    main()
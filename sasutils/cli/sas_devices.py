@@ -17,21 +17,28 @@
 
 
 import argparse
-from collections import namedtuple, OrderedDict
+from collections import OrderedDict
 from itertools import groupby
-from operator import attrgetter
+from operator import itemgetter
+from os.path import exists, join, realpath
 from string import Formatter
 import re
 import struct
 import sys
 import time
 
-from sasutils.sas import SASHost, SASExpander, SASEndDevice
+from sasutils.profiling import add_profile_argument, phase, setup_profiling
+from sasutils.sas import SASDevice, SASEndDevice
+from sasutils.query import Query
+from sasutils.records import add_record_arguments, record_writer
 from sasutils.scsi import EnclosureDevice, strtype, TYPE_ENCLOSURE
-from sasutils.ses import ses_get_snic_nickname
+from sasutils.command import add_executor_arguments, get_executor
+from sasutils.command import setup_executor
+from sasutils.ses import ses_get_snic_nickname, ses_get_snic_nicknames
+from sasutils.sgio import inquiry_vpd_many
 from sasutils.sysfs import sysfs
-from sasutils.vpd import vpd_decode_pg83_lu, vpd_get_page83_lu
-from sasutils.vpd import vpd_get_page80_sn
+from sasutils.vpd import vpd_decode_pg80_sn, vpd_decode_pg83_lu
+from sasutils.vpd import vpd_get_page80_sn, vpd_get_page83_lu, vpd_read_page
 
 
 # header keywords
@@ -53,6 +60,13 @@ FMT_MAP = { 'bay': 'BAY',
             'vendor': 'VENDOR',
             'wwid': 'WWID' }
 
+# optional reads needed by fields: unit serial number VPD pages (read with
+# SG_IO when missing in sysfs) and SES subenclosure nicknames (sg_ses);
+# sysfs attributes of other fields are only read on access
+FIELD_READS = {'enclosure': ('ses_snic',),
+               'sn': ('vpd_pg80',),
+               'snic': ('ses_snic',)}
+
 # default format string
 DEF_FMT = '{type:>10} {vendor:>12} {model:>16} {rev:>6} {size:>7} ' \
           '{paths:>6} {state:>9}'
@@ -64,6 +78,65 @@ DEF_FMT_VERB = '{bay:>3} {type:>10} {wwid:>24} {snic:>16} {dm:>18} ' \
                '{target:>10} {state:>8}'
 
 
+class DeviceTable(object):
+    """Columnar table of device attributes.
+
+    Each FMT_MAP field is stored as a column of integer codes referring to
+    the column dictionary of distinct values, so that identical rows can be
+    folded by sorting and grouping codes.
+    """
+
+    def __init__(self, fields=FMT_MAP):
+        self.fields = list(fields)
+        self.columns = dict((field, []) for field in self.fields)
+        # per column: value -> code, and code -> value
+        self.codes = dict((field, {}) for field in self.fields)
+        self.values = dict((field, []) for field in self.fields)
+        self.objects = []
+        # number of rows with at least one non-empty value
+        self.nonempty = 0
+
+    def __len__(self):
+        return len(self.objects)
+
+    def append(self, row, obj=None):
+        """Append a row (dict of field values) and its associated object."""
+        used = False
+        for field in self.fields:
+            value = row.get(field, '')
+            codes = self.codes[field]
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                self.values[field].append(value)
+            self.columns[field].append(code)
+            used = used or bool(value)
+        if used:
+            self.nonempty += 1
+        self.objects.append(obj)
+
+    def row(self, index):
+        """Return row at index as a dict of field values."""
+        return dict((field, self.values[field][self.columns[field][index]])
+                    for field in self.fields)
+
+    def used_fields(self):
+        """Return list of fields with at least one non-empty value."""
+        return [field for field in self.fields if any(self.values[field])]
+
+    def fold(self):
+        """Group identical rows.
+
+        Return list of lists of row indexes, ordered by first appearance.
+        """
+        keys = list(zip(*(self.columns[field] for field in self.fields)))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        groups = [list(indexes) for _, indexes in
+                  groupby(order, key=keys.__getitem__)]
+        groups.sort(key=itemgetter(0))
+        return groups
+
+
 class SASDevicesCLI(object):
     """Main class for sas_devises command-line interface."""
 
@@ -76,10 +149,29 @@ class SASDevicesCLI(object):
         parser.add_argument('--format', '-o', action='store', default=DEF_FMT,
                             help='Specify  the  information  to be displayed' \
                                  ' (default: "%s" or "%s" with -v)' % (DEF_FMT, DEF_FMT_VERB))
+        parser.add_argument('--where', '-w', action='append', default=[],
+                            metavar='PREDICATE',
+                            help='only show devices matching predicate, eg. '
+                                 '"size=16TB", "state!=running", "vendor in '
+                                 'HGST,WDC", "model~ST16*" or "enclosure=NAME"'
+                                 ' (may be repeated)')
+        group = parser.add_mutually_exclusive_group()
+        add_record_arguments(group)
+        add_profile_argument(parser)
+        add_executor_arguments(parser)
         self.args = parser.parse_args()
+        setup_profiling(self.args.profile)
+        setup_executor(self.args.jobs, self.args.timeout, self.args.deadline)
         if self.args.verbose > 0 and self.args.format is DEF_FMT:
             self.args.format = DEF_FMT_VERB
 
+        # machine-readable output: one record per LU with format fields
+        if self.args.ndjson or self.args.csv:
+            if self.args.format is DEF_FMT:
+                self.args.format = DEF_FMT_VERB
+            # keep stdout for records only
+            self.args.verbose = 0
+
         if self.args.verbose > 1:
             print('FORMAT: "%s"' % self.args.format)
 
@@ -94,24 +186,50 @@ class SASDevicesCLI(object):
         if not self.fields:
             parser.error('No valid field found in format string')
 
+        # enclosure: like with --where, the enclosure group of the device
+        self.writer = record_writer(self.args,
+                                    list(self.fields) + ['enclosure'])
+
+        try:
+            self.query = Query.parse(self.args.where)
+        except ValueError as err:
+            parser.error(str(err))
+        for field in self.query.fields:
+            if field not in FMT_MAP and field != 'enclosure':
+                parser.error('Unknown predicate field "%s"' % field)
+
+        # device attributes to get: displayed or used by predicates
+        self.wanted = set(self.fields)
+        self.wanted.update(self.query.fields)
+        self._snics = {}
+        # VPD pages read with SG_IO when missing in sysfs
+        self._vpd_pages = {}
+
+        self.reads = self._plan_reads()
+        if self.args.verbose > 1:
+            print('READS: %s' % ','.join(sorted(self.reads)))
+
+    def _plan_reads(self):
+        """Return the set of optional reads needed for the requested
+        output."""
+        reads = set()
+        for field in self.wanted:
+            reads.update(FIELD_READS.get(field, ()))
+        if not self.writer:
+            # enclosure group headers
+            reads.add('ses_snic')
+        if self.args.verbose > 0:
+            # hosts and expanders are only reported in verbose mode
+            reads.update(('sas_hosts', 'sas_expanders'))
+        return reads
+
     def print_hosts(self, sysfsnode):
-        total = len(sysfsnode)
-        tslen = len(str(total))
-        maxlen = num = 0
-        sas_hosts = []
-        for sas_host in sysfsnode:
-            num += 1
-            if not self.args.quiet:
-                towrite = '%s: %*d/%*d\r' % (sysfsnode, tslen, num, tslen, total)
-                maxlen = max(len(towrite), maxlen)
-                sys.stderr.write(towrite)
-            sas_hosts.append(SASHost(sas_host.node('device')))
-        if not self.args.quiet:
-            sys.stderr.write(' ' * maxlen + '\r')
+        # only host names are needed here, do not resolve SASHost trees
+        sas_hosts = list(sysfsnode)
         msgstr = "Found %d SAS hosts" % len(sas_hosts)
         if self.args.verbose > 1:
             print("%s: %s" % (msgstr,
-                              ','.join(host.name for host in sas_hosts)))
+                              ','.join(str(host) for host in sas_hosts)))
         elif self.args.verbose > 0:
             print(msgstr)
 
@@ -126,18 +244,20 @@ class SASDevicesCLI(object):
                 towrite = '%s: %*d/%*d\r' % (sysfsnode, tslen, num, tslen, total)
                 maxlen = max(len(towrite), maxlen)
                 sys.stderr.write(towrite)
-            sas_expanders.append(SASExpander(expander.node('device')))
+            # only SAS addresses are needed here, do not resolve SASExpander
+            sas_device = SASDevice(expander.node('device'))
+            sas_expanders.append((sas_device.attrs.sas_address,
+                                  str(expander)))
 
         # Find unique expander thanks to their sas_address
-        attrname = 'sas_device.attrs.sas_address'
         # Sort the expander list before using groupby()
-        sas_expanders = sorted(sas_expanders, key=attrgetter(attrname))
+        sas_expanders.sort()
         # Group expanders by SAS address
         num_exp = 0
-        for addr, expgroup in groupby(sas_expanders, attrgetter(attrname)):
+        for addr, expgroup in groupby(sas_expanders, itemgetter(0)):
             if self.args.verbose > 1:
                 exps = list(expgroup)
-                explist = ','.join(exp.name for exp in exps)
+                explist = ','.join(name for _, name in exps)
                 print('SAS expander %s x%d (%s)' % (addr, len(exps), explist))
             num_exp += 1
 
@@ -153,14 +273,14 @@ class SASDevicesCLI(object):
 
         for key in ('model', 'rev', 'state', 'timeout', 'vendor'):
             res[key] = ''
-            if key in self.fields:
+            if key in self.wanted:
                 try:
                     res[key] = getattr(scsi_device.attrs, key)
                 except AttributeError as exc:
                     print('ERROR: %s: %s' % (scsi_device, exc), file=sys.stderr)
                     res[key] = '<error>'
 
-        if 'target' in self.fields:
+        if 'target' in self.wanted:
             res['target'] = ''
             try:
                 res['target'] = str(scsi_device.sysfsnode)
@@ -168,7 +288,7 @@ class SASDevicesCLI(object):
                 print('ERROR: %s: %s' % (scsi_device, exc), file=sys.stderr)
                 res['target'] = '<error>'
 
-        if 'type' in self.fields:
+        if 'type' in self.wanted:
             res['type'] = ''
             try:
                 res['type'] = scsi_device.strtype
@@ -177,7 +297,7 @@ class SASDevicesCLI(object):
                 res['type'] = '<error>'
 
         # size of block device
-        if 'size' in self.fields:
+        if 'size' in self.wanted:
             res['size'] = ''
             # Size of block device
             if scsi_device.block:
@@ -193,7 +313,7 @@ class SASDevicesCLI(object):
                     res['size'] = '<error>'
 
         # Device Mapper name
-        if 'dm' in self.fields:
+        if 'dm' in self.wanted:
             res['dm'] = ''
             if scsi_device.block:
                 try:
@@ -202,30 +322,30 @@ class SASDevicesCLI(object):
                     pass
 
         # Bay identifier
-        if 'bay' in self.fields:
-            res['bay'] = ''
-            try:
-                res['bay'] = int(sas_end_device.sas_device.attrs.bay_identifier)
-            except (AttributeError, ValueError):
-                pass
+        if 'bay' in self.wanted:
+            res['bay'] = sas_end_device.sas_device.attrs.typed(
+                'bay_identifier', '')
 
-        if 'sn' in self.fields:
+        if 'sn' in self.wanted:
             res['sn'] = ''
             # Serial number
+            pg80 = self._vpd_page(scsi_device, 0x80)
             try:
-                pg80 = scsi_device.attrs.vpd_pg80
-                res['sn'] = pg80[4:].decode("utf-8", errors='backslashreplace')
-            except AttributeError:
-                if scsi_device.block:
-                    pg80 = vpd_get_page80_sn(scsi_device.block.name)
-                    res['sn'] = pg80
+                res['sn'] = vpd_decode_pg80_sn(pg80) if pg80 else ''
+            except struct.error:
+                pass
+            if not res['sn'] and scsi_device.block:
+                try:
+                    res['sn'] = vpd_get_page80_sn(scsi_device.block.name)
+                except OSError:
+                    pass
             res['sn'] = res['sn'].strip()
 
         # SES Subenclosure nickname
-        if 'snic' in self.fields:
+        if 'snic' in self.wanted:
             snic = None
-            if int(scsi_device.attrs.type) == TYPE_ENCLOSURE:
-                snic = ses_get_snic_nickname(scsi_device.scsi_generic.name)
+            if scsi_device.attrs.typed('type') == TYPE_ENCLOSURE:
+                snic = self._snic(scsi_device.scsi_generic.name)
             res['snic'] = snic or ''
 
         return res
@@ -234,22 +354,22 @@ class SASDevicesCLI(object):
         # use the first device for the following common attributes
         res = self._get_dev_attrs(*devlist[0])
 
-        if 'wwid' in self.fields:
+        if 'wwid' in self.wanted:
             res['wwid'] = wwid
 
-        if 'blkdevs' in self.fields:
+        if 'blkdevs' in self.wanted:
             res['blkdevs'] = ','.join(scsi_device.block.name
                                        for sas, scsi_device in devlist
                                        if scsi_device.block)
-        if 'sgdevs' in self.fields:
+        if 'sgdevs' in self.wanted:
             res['sgdevs'] = ','.join(scsi_device.scsi_generic.sg_name
                                       for sas, scsi_device in devlist)
-        if 'stdevs' in self.fields:
+        if 'stdevs' in self.wanted:
             res['stdevs'] = ','.join(scsi_device.tape.name
                                        for sas, scsi_device in devlist
                                        if scsi_device.tape)
 
-        if 'paths' in self.fields:
+        if 'paths' in self.wanted:
             # Number of paths
             paths = "%d" % len(devlist)
             if maxpaths and len(devlist) < maxpaths:
@@ -258,6 +378,67 @@ class SASDevicesCLI(object):
 
         return res
 
+    def _snic(self, sg_name):
+        """Return (cached) SES subenclosure nickname of enclosure."""
+        if sg_name not in self._snics:
+            self._snics[sg_name] = ses_get_snic_nickname(sg_name)
+        return self._snics[sg_name]
+
+    def _prefetch_snics(self, sg_names):
+        """Get uncached SES subenclosure nicknames in parallel."""
+        self._snics.update(ses_get_snic_nicknames(
+            set(sg_names).difference(self._snics)))
+
+    def _vpd_page(self, scsi_device, page):
+        """Return VPD page buffer of device from sysfs or read with SG_IO,
+        or None."""
+        pagebuf = vpd_read_page(scsi_device.sysfsnode, page)
+        if pagebuf is None:
+            sg_name = scsi_device.scsi_generic.sg_name
+            pagebuf = self._vpd_pages.get(sg_name, {}).get(page)
+        return pagebuf
+
+    def _prefetch_vpd_pages(self, targets):
+        """Read with SG_IO, in one concurrent batch, the VPD pages needed
+        and not available in sysfs (older kernels)."""
+        pages = []
+        if 'vpd_pg80' in self.reads:
+            pages.append(0x80)
+        if any(not wwid for _, _, wwid in targets):
+            pages.append(0x83)
+        sg_names = []
+        for _, scsi_device, wwid in targets:
+            missing = [page for page in pages
+                       if (page != 0x83 or not wwid) and not
+                       exists(join(scsi_device.sysfsnode.path,
+                                   'vpd_pg%02x' % page))]
+            if missing:
+                sg_names.append(scsi_device.scsi_generic.sg_name)
+        if sg_names:
+            self._vpd_pages.update(inquiry_vpd_many(sg_names, pages,
+                                                     get_executor().jobs))
+
+    def _resolve_query_enclosures(self):
+        """Resolve enclosure identifiers (sg names and nicknames) for
+        pushdown of enclosure predicates."""
+        sg_names = []
+        for node in sysfs.node('class').node('enclosure'):
+            try:
+                enc = EnclosureDevice(node.node('device'))
+                sg_name = enc.scsi_generic.name
+            except KeyError:
+                continue
+            sg_names.append((node, sg_name))
+        self._prefetch_snics(sg_name for _, sg_name in sg_names)
+        enclosures = []
+        for node, sg_name in sg_names:
+            ids = [sg_name]
+            snic = self._snic(sg_name)
+            if snic:
+                ids.append(snic)
+            enclosures.append((node, ids))
+        self.query.resolve_enclosures(enclosures)
+
     def print_end_devices(self, sysfsnode):
         total = len(sysfsnode)
         tslen = len(str(total))
@@ -265,6 +446,13 @@ class SASDevicesCLI(object):
 
         # This code is ugly and should be rewritten...
         devmap = {}  # LU -> list of (SASEndDevice, SCSIDevice)
+        targets = []  # list of (SASEndDevice, SCSIDevice, wwid attribute)
+
+        if 'enclosure' in self.query.fields:
+            try:
+                self._resolve_query_enclosures()
+            except KeyError:
+                pass  # no enclosure class in sysfs
 
         for node in sysfsnode:
             num += 1
@@ -273,170 +461,161 @@ class SASDevicesCLI(object):
                 maxlen = max(len(towrite), maxlen)
                 sys.stderr.write(towrite)
 
-            sas_end_device = SASEndDevice(node.node('device'))
+            device = node.node('device')
+            if self.query and not self.query.prefilter(device):
+                # skip end devices that cannot match without resolving them
+                continue
+
+            sas_end_device = SASEndDevice(device)
 
             for scsi_device in sas_end_device.targets:
                 if self.args.verbose > 1:
                     print("Device: %s" % scsi_device.sysfsnode.path)
-
-                wwid = scsi_device.attrs.wwid
-                if not wwid:
-                    if scsi_device.block:
-                        try:
-                            try:
-                                pg83 = bytes(scsi_device.attrs.vpd_pg83)
-                            except TypeError:
-                                pg83 = bytes(scsi_device.attrs.vpd_pg83,
-                                             encoding='utf-8')
-                            wwid = vpd_decode_pg83_lu(pg83)
-                        except (AttributeError, struct.error):
-                            wwid = vpd_get_page83_lu(scsi_device.block.name)
-                        except TypeError:
-                            wwid = 'Error-%s' % scsi_device.block.name
-                            print('Error: %s vpd_pg83="%s"' % (scsi_device.block,
-                                  scsi_device.attrs.vpd_pg83), file=sys.stderr)
-
-                        devmap.setdefault(wwid, []).append((sas_end_device,
-                                                            scsi_device))
-                    else:
-                        print('Error: no wwid for %s' % scsi_device.sysfsnode.path,
-                              file=sys.stderr)
-                        wwid = 'Error-%s' % scsi_device.sysfsnode
-                if wwid.startswith('[Errno'):
-                    wwid = wwid.split(']')[0] + ']'
-                devmap.setdefault(wwid, []).append((sas_end_device, scsi_device))
+                targets.append((sas_end_device, scsi_device,
+                                scsi_device.attrs.wwid))
 
         if not self.args.quiet:
             sys.stderr.write(' ' * maxlen + '\r')
+
+        self._prefetch_vpd_pages(targets)
+
+        for sas_end_device, scsi_device, wwid in targets:
+            if not wwid:
+                pg83 = self._vpd_page(scsi_device, 0x83)
+                if pg83:
+                    wwid = vpd_decode_pg83_lu(pg83)
+                if not wwid and scsi_device.block:
+                    try:
+                        wwid = vpd_get_page83_lu(scsi_device.block.name)
+                    except OSError:
+                        pass
+                if not wwid:
+                    print('Error: no wwid for %s' % scsi_device.sysfsnode.path,
+                          file=sys.stderr)
+                    wwid = 'Error-%s' % scsi_device.sysfsnode
+            if wwid.startswith('[Errno'):
+                wwid = wwid.split(']')[0] + ']'
+            devmap.setdefault(wwid, []).append((sas_end_device, scsi_device))
         if self.args.verbose > 0:
             print("Found %d SAS end devices" % num)
 
-        # list of set of enclosure
-        encgroups = []
+        phase('enclosure groups')
+
+        # Group LUs sharing enclosures (union-find over enclosure identities)
+        enclosures = {}  # enclosure key -> EnclosureDevice
+        uf_parent = {}   # enclosure key -> parent enclosure key
+
+        def uf_find(key):
+            while uf_parent[key] != key:
+                # path halving
+                uf_parent[key] = uf_parent[uf_parent[key]]
+                key = uf_parent[key]
+            return key
 
+        lu_encs = {}  # LU -> list of enclosure keys
         for lu, dev_list in devmap.items():
-            encs = set()
+            keys = []
             for sas_ed, scsi_device in dev_list:
                 if scsi_device.array_device:
                     # 'enclosure_device' symlink is present (preferred method)
-                    encs.add(scsi_device.array_device.enclosure)
+                    enc = scsi_device.array_device.enclosure
+                    key = realpath(enc.sysfsnode.path)
+                    if key not in enclosures:
+                        enclosures[key] = enc
+                        uf_parent[key] = key
+                    keys.append(key)
                     if self.args.verbose > 1:
-                        print("Info: found enclosure device %s for device %s" \
-                              % (scsi_device.array_device.enclosure.sysfsnode.path,
+                        print("Info: found enclosure device %s for device %s"
+                              % (enc.sysfsnode.path,
                                  scsi_device.sysfsnode.path))
-                else:
-                    encs.add(None)
-                    if self.args.verbose > 1:
-                        print("Info: no enclosure symlink set for %s in %s" %
-                              (scsi_device.name, scsi_device.sysfsnode.path))
-            done = False
-            for encset in encgroups:
-                if not encset.isdisjoint(encs):
-                    encset.update(encs)
-                    done = True
-                    break
-            if not done:
-                encgroups.append(encs)
+                elif self.args.verbose > 1:
+                    print("Info: no enclosure symlink set for %s in %s" %
+                          (scsi_device.name, scsi_device.sysfsnode.path))
+            lu_encs[lu] = keys
+            if keys:
+                root = uf_find(keys[0])
+                for key in keys[1:]:
+                    other = uf_find(key)
+                    if other != root:
+                        uf_parent[other] = root
+
+        # Single pass to bucket LUs by enclosure group; LUs without any
+        # enclosure are gathered in the standalone group (None)
+        encgroups = OrderedDict()  # group root -> list of (LU, devlist)
+        for lu, dev_list in devmap.items():
+            keys = lu_encs[lu]
+            root = uf_find(keys[0]) if keys else None
+            encgroups.setdefault(root, []).append((lu, dev_list))
+
+        group_encs = {}  # group root -> list of enclosures
+        for key, enc in enclosures.items():
+            group_encs.setdefault(uf_find(key), []).append(enc)
 
         sys.stderr.write(' ' * maxlen + '\r')
-        num_encgroups = len([enc for enc in encgroups if list(enc)[0]])
+        num_encgroups = len([root for root in encgroups if root])
         if self.args.verbose > 0:
             if num_encgroups > 0:
                 print("Resolved %d enclosure groups" % num_encgroups)
             else:
                 print("No enclosure found")
 
-        for encset in encgroups:
-            encinfolist = []
+        def kfun_enc(o):
+            return int(re.sub(r"\D", "", o.scsi_generic.name))
 
-            def kfun(o):
-                if o:
-                    return int(re.sub("\D", "", o.scsi_generic.name))
-                else:
-                    return -1
-
-            def enclosure_finder(arg):
-                _lu, _dev_list = arg
-                for _sas_ed, _scsi_device in _dev_list:
-                    if _scsi_device.array_device:
-                        # 'enclosure_device' symlink is present
-                        if _scsi_device.array_device.enclosure in encset:
-                            return True
-                return False
-
-            def enclosure_absent(arg):
-                _lu, _dev_list = arg
-                for _sas_ed, _scsi_device in _dev_list:
-                    if _scsi_device.array_device:
-                        # 'enclosure_device' symlink is present
-                        if _scsi_device.array_device.enclosure:
-                            return False
-                return True
-
-            has_orphans = False
-            for enc in sorted(encset, key=kfun):
-                if enc:
-                    snic = ses_get_snic_nickname(enc.scsi_generic.name)
-                    if snic:
-                        if self.args.verbose > 0:
-                            encinfolist.append('[%s:%s, addr: %s]' %
-                                               (enc.scsi_generic.name,
-                                                snic, enc.attrs.sas_address))
-                        else:
-                            encinfolist.append('[%s:%s]' % (enc.scsi_generic.name,
-                                                            snic))
-                    else:
-                        if self.args.verbose > 0:
-                            vals = (enc.scsi_generic.name, enc.attrs.vendor,
-                                    enc.attrs.model, enc.attrs.sas_address)
-                            encinfolist.append('[%s:%s %s, addr: %s]' % vals)
-                        else:
-                            vals = (enc.attrs.vendor, enc.attrs.model,
-                                    enc.attrs.sas_address)
-                            encinfolist.append('[%s %s, addr: %s]' % vals)
-                else:
-                    has_orphans = True
-
-            encdevs = []
-            if has_orphans:
-                encdevs = list(filter(enclosure_absent, devmap.items()))
+        def kfun_bay(o):
+            return o[1][0][0].sas_device.attrs.typed('bay_identifier', -1)
 
+        phase('output')
+        if 'ses_snic' in self.reads:
+            self._prefetch_snics(enc.scsi_generic.name
+                                 for encs in group_encs.values()
+                                 for enc in encs)
+        for root, encdevs in encgroups.items():
+            encs = sorted(group_encs.get(root, []), key=kfun_enc)
+            encdevs = self._select(encs, sorted(encdevs, key=kfun_bay))
             if not encdevs:
-                encdevs = list(filter(enclosure_finder, devmap.items()))
+                continue
 
-            maxpaths = max(len(devs) for lu, devs in encdevs)
+            if self.writer:
+                self._write_records(encs, encdevs)
+                continue
 
-            def kfun(o):
-                try:
-                    return int(o[1][0][0].sas_device.attrs.bay_identifier)
-                except ValueError:
-                    return -1
+            encinfolist = []
 
-            cnt = 0
-            grp_format = self.args.format
-            field_trckr = {}
-            folded = {}
-            for lu, devlist in sorted(encdevs, key=kfun):
-                devinfo = self._get_devlist_attrs(lu, devlist)
-                # try to regroup devices by getting common attributes
-                devinfo['paths'] = len(devlist)
-                folded_key = namedtuple('FoldedDict',
-                                        devinfo.keys())(**devinfo)
-                folded.setdefault(folded_key, []).append(devlist)
-                used = False
-                for field in self.fields:
-                    if devinfo.get(field):
-                        field_trckr[field] = field_trckr.setdefault(field, 0) + 1
-                        if not used:
-                            used = True
-                            cnt += 1
+            has_orphans = root is None
+            for enc in encs:
+                snic = self._snic(enc.scsi_generic.name)
+                if snic:
+                    if self.args.verbose > 0:
+                        encinfolist.append('[%s:%s, addr: %s]' %
+                                           (enc.scsi_generic.name,
+                                            snic, enc.attrs.sas_address))
+                    else:
+                        encinfolist.append('[%s:%s]' % (enc.scsi_generic.name,
+                                                        snic))
+                else:
+                    if self.args.verbose > 0:
+                        vals = (enc.scsi_generic.name, enc.attrs.vendor,
+                                enc.attrs.model, enc.attrs.sas_address)
+                        encinfolist.append('[%s:%s %s, addr: %s]' % vals)
+                    else:
+                        vals = (enc.attrs.vendor, enc.attrs.model,
+                                enc.attrs.sas_address)
+                        encinfolist.append('[%s %s, addr: %s]' % vals)
+
+            table = DeviceTable(self.fields)
+            for lu, devlist, devinfo in encdevs:
+                table.append(devinfo, devlist)
+            cnt = table.nonempty
 
             # remove unused columns
-            for field in self.fields:
-                fcnt = field_trckr.get(field, 0)
-                if fcnt == 0:
-                    grp_format = re.sub('\s*\{%s.*?\}\s*' % field, ' ',
-                                        grp_format)
+            grp_format = self.args.format
+            used = table.used_fields()
+            unused = [field for field in self.fields if field not in used]
+            if unused:
+                unused_re = re.compile(r'\s*(?:\{(?:%s)(?:[:!][^}]*)?\}\s*)+'
+                                       % '|'.join(unused))
+                grp_format = unused_re.sub(' ', grp_format)
 
             if cnt > 0:
                 if has_orphans:
@@ -447,28 +626,51 @@ class SASDevicesCLI(object):
                 hdrfmt = '      ' + grp_format
                 print(hdrfmt.format(**FMT_MAP))
 
-                for t, v in folded.items():
-                    if maxpaths and t.paths < maxpaths:
-                        pathstr = '%s*' % t.paths
-                    else:
-                        pathstr = '%s ' % t.paths
-
-                    infostr = grp_format.format(**t._asdict())
+                # fold identical devices
+                for indexes in table.fold():
+                    infostr = grp_format.format(**table.row(indexes[0]))
 
                     if self.args.verbose > 1:
-                        for devlist in v:
-                            for _, scsi_dev in devlist:
+                        for index in indexes:
+                            for _, scsi_dev in table.objects[index]:
                                 print("Info: %s: %s" % (scsi_dev.__class__.__name__,
                                                         scsi_dev.sysfsnode.path))
 
-                    if len(v) > 1:
-                        print('%3d x %s' % (len(v), infostr))
+                    if len(indexes) > 1:
+                        print('%3d x %s' % (len(indexes), infostr))
                     else:
                         print('      %s' % infostr)
 
                 if not self.args.quiet:
                     print("Total: %d devices" % cnt)
 
+    def _select(self, encs, encdevs):
+        """Return list of (LU, devlist, attributes) of an enclosure group
+        matching the query."""
+        encids = []
+        if 'enclosure' in self.query.fields:
+            for enc in encs:
+                encids.append(enc.scsi_generic.name)
+                snic = self._snic(enc.scsi_generic.name)
+                if snic:
+                    encids.append(snic)
+        selected = []
+        for lu, devlist in encdevs:
+            devinfo = self._get_devlist_attrs(lu, devlist)
+            if not self.query or \
+                    self.query.matches(dict(devinfo, enclosure=encids)):
+                selected.append((lu, devlist, devinfo))
+        return selected
+
+    def _write_records(self, encs, encdevs):
+        """Write one record per LU of an enclosure group."""
+        encnames = ','.join(enc.scsi_generic.name for enc in encs)
+        for lu, devlist, record in encdevs:
+            if 'paths' in record:
+                record['paths'] = len(devlist)
+            record['enclosure'] = encnames
+            self.writer.write(record)
+
 
 def main():
     """console_scripts entry point for sas_devices command-line."""
@@ -476,12 +678,19 @@ def main():
     sas_devices_cli = SASDevicesCLI()
 
     try:
-        root = sysfs.node('class').node('sas_host')
-        sas_devices_cli.print_hosts(root)
-        root = sysfs.node('class').node('sas_expander')
-        sas_devices_cli.print_expanders(root)
+        if 'sas_hosts' in sas_devices_cli.reads:
+            phase('hosts')
+            root = sysfs.node('class').node('sas_host')
+            sas_devices_cli.print_hosts(root)
+        if 'sas_expanders' in sas_devices_cli.reads:
+            phase('expanders')
+            root = sysfs.node('class').node('sas_expander')
+            sas_devices_cli.print_expanders(root)
+        phase('end devices')
         root = sysfs.node('class').node('sas_end_device')
         sas_devices_cli.print_end_devices(root)
+        if sas_devices_cli.writer:
+            sas_devices_cli.writer.close()
     except KeyError as err:
         print("Not found: %s" % err, file=sys.stderr)
 
@@ -17,17 +17,44 @@
 
 
 import argparse
-import ast
+from contextlib import redirect_stdout
+import difflib
+from io import StringIO
 from itertools import groupby
+import os
+import re
+import select
 import socket
 import sys
+import time
 
 from collections import Counter
-from sasutils.sas import SASHost
-from sasutils.ses import ses_get_snic_nickname
-from sasutils.scsi import TYPE_ENCLOSURE
+from sasutils.command import add_executor_arguments, command_cache
+from sasutils.command import setup_executor
+from sasutils.profiling import add_profile_argument, phase, setup_profiling
+from sasutils.records import add_record_arguments, record_writer
+from sasutils.sas import SASEndDevice, SASExpander, SASHost, SASNode
+from sasutils.sas import SASPort, walk
+from sasutils.ses import ses_get_snic_nickname, ses_prefetch_snic_nicknames
+from sasutils.scsi import SCSIDevice, TYPE_ENCLOSURE
 from sasutils.sysfs import sysfs
 
+# kernel uevents netlink protocol (see linux/netlink.h)
+NETLINK_KOBJECT_UEVENT = 15
+
+# with kernel uevents, fallback polling interval of watch mode (seconds)
+WATCH_FALLBACK_POLL = 60
+
+# watch mode highlighting (ANSI)
+HL_CHANGED = '\033[1;33m{}\033[0m'
+HL_REMOVED = '\033[9;31m{}\033[0m'
+HL_ADDED = '\033[1;32m{}\033[0m'
+
+# record fields of --ndjson and --csv outputs
+RECORD_FIELDS = ('host', 'depth', 'node', 'name', 'parent', 'sas_address',
+                 'phys', 'linkrate', 'bay', 'device_type', 'vendor', 'model',
+                 'rev', 'scsi_type', 'sg', 'block', 'tape', 'size')
+
 
 def format_attrs(attrlist, attrs):
     """filter keys to avoid SysfsObject cache miss on all attrs"""
@@ -37,13 +64,22 @@ def format_attrs(attrlist, attrs):
 
 
 class SDNode(object):
+    """
+    Node of the sas_discover tree.
+
+    Nodes are resolved (see resolve()) on first access to their children
+    or their string representation, so that the tree can be printed while
+    it is being discovered.
+    """
     gatherme = False
+    # profiling phase of resolve()
+    profile_phase = 'hosts'
 
     def __init__(self, name, baseobj, nphys=0, speedstr='', depth=0, disp=None,
                  prinfo=None):
         self.name = name
         self.baseobj = baseobj
-        self.children = []
+        self._children = []
         self.speedstr = speedstr
         self.nphys = nphys
         self.depth = depth
@@ -51,11 +87,22 @@ class SDNode(object):
         self.prinfo = prinfo or []
         self.proffset = 0  # prompt offset; derived classes may override
         self._prompt = None
-        self.resolve()
+        self._resolved = False
 
     def resolve(self):
         pass
 
+    def resolve_once(self):
+        if not self._resolved:
+            self._resolved = True
+            with phase(self.profile_phase):
+                self.resolve()
+
+    @property
+    def children(self):
+        self.resolve_once()
+        return self._children
+
     def __str__(self):
         return self.name
 
@@ -101,11 +148,14 @@ class SDNode(object):
             baseobjname = baseobj.name  # mandatory when name not provided
         else:
             baseobjname = name
-        self.children.append(sdclass(baseobjname, baseobj, nphys, speedstr,
-                                     self.depth + 1, self.disp,
-                                     self.adv_prompt(self.proffset, last)))
+        self._children.append(sdclass(baseobjname, baseobj, nphys, speedstr,
+                                      self.depth + 1, self.disp,
+                                      self.adv_prompt(self.proffset, last)))
 
     def print_tree(self):
+        """Print node and its subtree, resolving children as we go: gather
+        groups are resolved per parent node."""
+        self.resolve_once()
         print('%s%s' % (self.prompt, self))
         if self.children and all(child.gatherme for child in self.children):
             self.print_children_gathered()
@@ -114,7 +164,7 @@ class SDNode(object):
                 child.print_tree()
 
     def print_children_gathered(self):
-        self.children = sorted(self.children, key=lambda x: x.gathergrp())
+        self._children = sorted(self.children, key=lambda x: x.gathergrp())
         groups = [(group, list(children)) for group, children
                   in groupby(self.children, lambda x: x.gathergrp())]
 
@@ -139,13 +189,16 @@ class SDRootNode(SDNode):
     def resolve(self):
         sas_hosts = list(self.baseobj)
         for index, obj in enumerate(sas_hosts):
-            sas_host = SASHost(obj.node('device'))
             last = bool(index == len(sas_hosts) - 1)
-            self.add_child(SDHostNode, sas_host, last=last)
+            # SASHost is only built when the host node is resolved
+            self.add_child(SDHostNode, obj, name=str(obj), last=last)
 
 
 class SDHostNode(SDNode):
     def resolve(self):
+        if not isinstance(self.baseobj, SASNode):
+            # sas_host class node
+            self.baseobj = SASHost(self.baseobj.node('device'))
 
         def portsortfunc(p):
             """helper sort function to return expanders first, then order by
@@ -153,14 +206,12 @@ class SDHostNode(SDNode):
             if len(p.expanders) > 0:
                 return [1, 0, 0]
             sortv = [0, 0, 0]  # exp?, -type, bay
-            try:
-                if len(p.end_devices) > 0:
-                    if len(p.end_devices[0].targets) > 0:
-                        sortv[1] = -int(p.end_devices[0].targets[0].attrs.type)
-                    sortv[2] = int(p.end_devices[0].sas_device.attrs
-                                   .bay_identifier)
-            except (AttributeError, IndexError, ValueError):
-                pass
+            if len(p.end_devices) > 0:
+                end_device = p.end_devices[0]
+                if len(end_device.targets) > 0:
+                    sortv[1] = -end_device.targets[0].attrs.typed('type', 0)
+                sortv[2] = end_device.sas_device.attrs.typed('bay_identifier',
+                                                             0)
             return sortv
 
         ports = sorted(self.baseobj.ports, key=portsortfunc)
@@ -217,6 +268,8 @@ class SDHostNode(SDNode):
 
 
 class SDExpanderNode(SDHostNode):
+    profile_phase = 'expanders'
+
     def resolve(self):
         linkinfo = '%dx--' % self.nphys
         self.proffset = len(linkinfo)
@@ -251,6 +304,8 @@ class SDExpanderNode(SDHostNode):
 
 
 class SDEndDeviceNode(SDNode):
+    profile_phase = 'end devices'
+
     @property
     def gatherme(self):
         return (self.disp['verbose'] < 2 and not self.disp.get('addr')
@@ -292,10 +347,7 @@ class SDEndDeviceNode(SDNode):
             speed_info = " (%s)" % self.speedstr
 
         if verb > 1:
-            try:
-                bay = int(sas_end_device.sas_device.attrs.bay_identifier)
-            except (AttributeError, ValueError):
-                pass
+            bay = sas_end_device.sas_device.attrs.typed('bay_identifier')
 
         if bay is None:
             istr = '%s%s%s' % (linkinfo, sas_end_device.name, speed_info)
@@ -311,6 +363,7 @@ class SDEndDeviceNode(SDNode):
 
 class SDSCSIDeviceNode(SDNode):
     # Note: additional instance attribute dinfo defined in resolve()
+    profile_phase = 'scsi devices'
 
     @property
     def gatherme(self):
@@ -319,10 +372,8 @@ class SDSCSIDeviceNode(SDNode):
             return False
 
         # Do not gather enclosure
-        try:
-            return int(self.baseobj.attrs.type) != TYPE_ENCLOSURE
-        except ValueError:
-            return False
+        scsi_type = self.baseobj.attrs.typed('type')
+        return scsi_type is not None and scsi_type != TYPE_ENCLOSURE
 
     def gathergrp(self):
         # gather group is our single child scsi type string
@@ -338,6 +389,7 @@ class SDSCSIDeviceNode(SDNode):
                 self.add_child(SDBlockQueueNode, qval, name=qattr, last=last)
 
     def __str__(self):
+        self.resolve_once()
         return self.dinfo  # defined in resolve()
 
     def get_scsi_device_info(self, scsi_device, want_queue_attrs=False):
@@ -361,7 +413,7 @@ class SDSCSIDeviceNode(SDNode):
         if self.disp.get('counters'):
             iokeys = ('ioerr_cnt', 'iodone_cnt', 'iorequest_cnt')
             for key in iokeys:
-                iargs[key] = ast.literal_eval(scsi_device.attrs.get(key, 0))
+                iargs[key] = scsi_device.attrs.typed(key, 0)
 
         dev_info = ' '.join(dev_info_fmt).format(**iargs)
 
@@ -408,6 +460,239 @@ class SDBlockQueueNode(SDNode):
         return 'queue.%s: %s' % (self.name, self.baseobj)
 
 
+def iter_records(root_obj):
+    """Walk SAS hosts and yield one record per topology node, each host
+    being resolved only when its records are requested."""
+    for obj in root_obj:
+        sas_host = SASHost(obj.node('device'))
+        attrs = sas_host.scsi_host.attrs
+        yield {'host': sas_host.name, 'depth': 0, 'node': 'host',
+               'name': sas_host.name,
+               'sas_address': attrs.get('host_sas_address'),
+               'phys': len(sas_host.phys),
+               'vendor': attrs.get('board_name'),
+               'model': attrs.get('version_product'),
+               'rev': attrs.get('version_fw')}
+        for record in _iter_node_records(sas_host):
+            record['host'] = sas_host.name
+            yield record
+
+
+def _port_linkrate(port):
+    counts = Counter(phy.attrs.get('negotiated_linkrate')
+                     for phy in port.phys)
+    return ', '.join('%d x %s' % (count, speed)
+                     for speed, count in counts.items())
+
+
+def _iter_node_records(sas_host):
+    """Yield records of the topology below sas_host, streamed with walk()
+    so that only the current branch is kept in memory."""
+    # objects of the current branch and link rates of its ports, by depth
+    stack = []
+    linkrates = {}
+    for depth, obj in walk(sas_host):
+        del stack[depth:]
+        stack.append(obj)
+        if isinstance(obj, SASPort):
+            linkrates[depth] = _port_linkrate(obj)
+        elif isinstance(obj, SASExpander):
+            port = stack[depth - 1]
+            yield {'depth': depth // 2, 'node': 'expander',
+                   'name': obj.name, 'parent': stack[depth - 2].name,
+                   'sas_address': obj.sas_device.attrs.get('sas_address'),
+                   'phys': len(port.phys), 'linkrate': linkrates[depth - 1],
+                   'vendor': obj.attrs.get('vendor_id'),
+                   'model': obj.attrs.get('product_id'),
+                   'rev': obj.attrs.get('product_rev')}
+        elif isinstance(obj, SASEndDevice):
+            port = stack[depth - 1]
+            attrs = obj.sas_device.attrs
+            yield {'depth': depth // 2, 'node': 'end_device',
+                   'name': obj.name, 'parent': stack[depth - 2].name,
+                   'sas_address': attrs.get('sas_address'),
+                   'phys': len(port.phys), 'linkrate': linkrates[depth - 1],
+                   'bay': attrs.typed('bay_identifier'),
+                   'device_type': attrs.get('device_type')}
+        elif isinstance(obj, SCSIDevice):
+            record = {'depth': depth // 2 + 1, 'node': 'scsi_device',
+                      'name': obj.name, 'parent': stack[depth - 1].name,
+                      'sas_address': obj.attrs.get('sas_address'),
+                      'vendor': obj.attrs.get('vendor'),
+                      'model': obj.attrs.get('model'),
+                      'rev': obj.attrs.get('rev'),
+                      'scsi_type': obj.strtype,
+                      'sg': obj.scsi_generic.name}
+            if obj.block:
+                record['block'] = obj.block.name
+                try:
+                    record['size'] = int(obj.block.sizebytes())
+                except AttributeError:
+                    record['size'] = None  # no valid size
+            if obj.tape:
+                record['tape'] = obj.tape.name
+            yield record
+
+
+def host_signature(path, counters=False):
+    """
+    Return a cheap signature of the SAS topology below a SAS host sysfs
+    device path: names of ports, expanders, end devices, targets and phys,
+    phys negotiated link rates and, optionally, SCSI devices I/O counters.
+    """
+    signature = []
+    stack = [path]
+    while stack:
+        dirpath = stack.pop()
+        try:
+            names = sorted(os.listdir(dirpath))
+        except OSError:
+            continue
+        for name in names:
+            if name.startswith(('port-', 'expander-', 'end_device-',
+                                'target')):
+                signature.append(name)
+                stack.append(os.path.join(dirpath, name))
+            elif name.startswith('phy-'):
+                rate = sysfs.get(os.path.join(dirpath, name, 'sas_phy', name,
+                                              'negotiated_linkrate'),
+                                 ignore_errors=True, absolute=True)
+                signature.append((name, rate))
+            elif re.match(r'\d+:\d+:\d+:\d+$', name):
+                signature.append(name)
+                if counters:
+                    for key in ('ioerr_cnt', 'iodone_cnt', 'iorequest_cnt'):
+                        signature.append(sysfs.get(
+                            os.path.join(dirpath, name, key),
+                            ignore_errors=True, absolute=True))
+    return signature
+
+
+class SDWatcher(object):
+    """
+    sas_discover watch mode
+
+    The tree is rendered host by host: a SAS host subtree is only
+    rediscovered when its signature (see host_signature()) changes. When
+    kernel uevents are available, signatures are only checked after an
+    uevent, or every WATCH_FALLBACK_POLL seconds in case one was missed (and
+    every interval seconds if I/O counters are displayed, as they change
+    without uevents). Otherwise, they are checked every interval seconds.
+    """
+
+    def __init__(self, root_name, root_obj, disp, interval):
+        self.root_name = root_name
+        self.root_obj = root_obj
+        self.disp = disp
+        self.interval = interval
+        self.isatty = sys.stdout.isatty()
+        # (host name, last) -> (signature, rendered lines)
+        self._hosts = {}
+        self._lines = None
+        self._uevents = self._uevent_socket()
+        # time of last signatures check
+        self._checked = 0
+
+    @staticmethod
+    def _uevent_socket():
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                 NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1))
+            return sock
+        except (AttributeError, OSError):
+            return None
+
+    def render(self):
+        """Return list of tree lines, rediscovering changed hosts only."""
+        # rediscovered hosts must not see command results of previous runs
+        command_cache.clear()
+        self._checked = time.time()
+        root = SDRootNode(name=self.root_name, baseobj=self.root_obj,
+                          disp=self.disp)
+        lines = ['%s%s' % (root.prompt, root)]
+        hosts = {}
+        for index, host in enumerate(root.children):
+            key = (host.name, index == len(root.children) - 1)
+            signature = host_signature(host.baseobj.node('device').path,
+                                       self.disp.get('counters'))
+            cached = self._hosts.get(key)
+            if cached and cached[0] == signature:
+                hosts[key] = cached
+            else:
+                output = StringIO()
+                with redirect_stdout(output):
+                    host.print_tree()
+                hosts[key] = (signature, output.getvalue().splitlines())
+            lines += hosts[key][1]
+        self._hosts = hosts
+        return lines
+
+    def display(self, lines):
+        """Display lines, highlighting changes since last display."""
+        old = self._lines
+        self._lines = lines
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        if old is None:
+            if self.isatty:
+                sys.stdout.write('\033[H\033[2J')
+                print('Every %ss: sas_discover  %s\n' % (self.interval, stamp))
+            print('\n'.join(lines))
+            sys.stdout.flush()
+            return
+
+        matcher = difflib.SequenceMatcher(None, old, lines, autojunk=False)
+        if self.isatty:
+            # full redraw, highlighting changed lines
+            out = ['\033[H\033[2J',
+                   'Every %ss: sas_discover  %s\n' % (self.interval, stamp)]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    out += lines[j1:j2]
+                    continue
+                out += [HL_REMOVED.format(line) for line in old[i1:i2]
+                        if tag == 'delete']
+                hl_fmt = HL_ADDED if tag == 'insert' else HL_CHANGED
+                out += [hl_fmt.format(line) for line in lines[j1:j2]]
+            print('\n'.join(out))
+        else:
+            # print differences only
+            print('--- %s' % stamp)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag != 'equal':
+                    for line in old[i1:i2]:
+                        print('-%s' % line)
+                    for line in lines[j1:j2]:
+                        print('+%s' % line)
+        sys.stdout.flush()
+
+    def wait(self):
+        """Wait for kernel uevents or polling interval. Return True if host
+        signatures should be checked again."""
+        if self._uevents is None:
+            time.sleep(self.interval)
+            return True
+        rlist, _, _ = select.select([self._uevents], [], [], self.interval)
+        if rlist:
+            # let related events settle, then drain them
+            time.sleep(0.5)
+            while select.select([self._uevents], [], [], 0)[0]:
+                self._uevents.recv(65536)
+            return True
+        if self.disp.get('counters'):
+            return True
+        return time.time() - self._checked >= WATCH_FALLBACK_POLL
+
+    def run(self):
+        check = True
+        while True:
+            if check:
+                lines = self.render()
+                if lines != self._lines:
+                    self.display(lines)
+            check = self.wait()
+
+
 def main():
     """console_scripts entry point for sas_discover command-line."""
     parser = argparse.ArgumentParser()
@@ -419,7 +704,30 @@ def main():
                         help='Print associated devices')
     parser.add_argument('--counters', action='store_true', default=False,
                         help='Print I/O counters')
+    group = parser.add_mutually_exclusive_group()
+    add_record_arguments(group)
+    add_profile_argument(parser)
+    add_executor_arguments(parser)
+    group.add_argument('--watch', action='store', type=float, nargs='?',
+                       const=2.0, metavar='SECONDS',
+                       help='refresh changed parts of the tree on kernel '
+                            'events or every SECONDS (default is 2)')
     pargs = parser.parse_args()
+    setup_profiling(pargs.profile)
+    setup_executor(pargs.jobs, pargs.timeout, pargs.deadline)
+
+    writer = record_writer(pargs, RECORD_FIELDS)
+    if writer:
+        phase('records')
+        try:
+            for record in iter_records(sysfs.node('class').node('sas_host')):
+                writer.write(record)
+            writer.close()
+        except IOError:
+            pass
+        except KeyError as err:
+            print("Not found: %s" % err, file=sys.stderr)
+        return
 
     try:
         # print short hostname as tree root node
@@ -427,8 +735,17 @@ def main():
         root_obj = sysfs.node('class').node('sas_host')
         disp = {'verbose': pargs.verbose, 'addr': pargs.addr,
                 'devices': pargs.devices, 'counters': pargs.counters}
+        if pargs.watch:
+            SDWatcher(root_name, root_obj, disp, pargs.watch).run()
+            return
+        if pargs.verbose > 0:
+            # query enclosure nicknames in the background (kept in command
+            # cache) without delaying the first lines of the tree
+            ses_prefetch_snic_nicknames()
         root = SDRootNode(name=root_name, baseobj=root_obj, disp=disp)
         root.print_tree()
+    except KeyboardInterrupt:
+        pass
     except IOError:
         pass
     except KeyError as err:
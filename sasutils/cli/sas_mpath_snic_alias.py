@@ -29,6 +29,8 @@ import logging
 import os
 import sys
 
+from sasutils.command import setup_executor
+from sasutils.profiling import setup_profiling
 from sasutils.sas import SASBlockDevice
 from sasutils.ses import ses_get_snic_nickname
 from sasutils.sysfs import sysfs
@@ -93,6 +95,10 @@ def main():
     if len(sys.argv) != 2:
         print('Usage: %s <dmdev>' % sys.argv[0], file=sys.stderr)
         sys.exit(1)
+    # profiling is only enabled by environment (SASUTILS_PROFILE)
+    setup_profiling()
+    # command timeouts are only set by environment (SASUTILS_TIMEOUT...)
+    setup_executor()
     try:
         result = sas_mpath_snic_alias(sys.argv[1])
         if result:
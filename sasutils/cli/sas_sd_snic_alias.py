@@ -28,6 +28,8 @@ KERNEL=="sd*", PROGRAM="/usr/bin/sas_sd_snic_alias %k", SYMLINK+="%c"
 import logging
 import sys
 
+from sasutils.command import setup_executor
+from sasutils.profiling import setup_profiling
 from sasutils.sas import SASBlockDevice
 from sasutils.ses import ses_get_snic_nickname
 from sasutils.sysfs import sysfs
@@ -68,6 +70,10 @@ def main():
     if len(sys.argv) != 2:
         print('Usage: %s <blkdev>' % sys.argv[0], file=sys.stderr)
         sys.exit(1)
+    # profiling is only enabled by environment (SASUTILS_PROFILE)
+    setup_profiling()
+    # command timeouts are only set by environment (SASUTILS_TIMEOUT...)
+    setup_executor()
     try:
         result = sas_sd_snic_alias(sys.argv[1])
         if result:
@@ -29,6 +29,8 @@ KERNEL=="st*", PROGRAM="/usr/bin/sas_st_snic_alias %k", SYMLINK+="%c"
 import logging
 import sys
 
+from sasutils.command import setup_executor
+from sasutils.profiling import setup_profiling
 from sasutils.sas import SASTapeDevice
 from sasutils.ses import ses_get_snic_nickname
 from sasutils.sysfs import sysfs
@@ -71,6 +73,10 @@ def main():
     if len(sys.argv) != 2:
         print('Usage: %s <stdev>' % sys.argv[0], file=sys.stderr)
         sys.exit(1)
+    # profiling is only enabled by environment (SASUTILS_PROFILE)
+    setup_profiling()
+    # command timeouts are only set by environment (SASUTILS_TIMEOUT...)
+    setup_executor()
     try:
         result = sas_st_snic_alias(sys.argv[1])
         if result:
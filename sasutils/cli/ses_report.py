@@ -26,11 +26,20 @@ import logging
 import time
 import sys
 
+from sasutils.command import add_executor_arguments, get_executor
+from sasutils.command import setup_executor
+from sasutils.profiling import add_profile_argument, phase, setup_profiling
 from sasutils.scsi import EnclosureDevice
 from sasutils.ses import ses_get_ed_metrics, ses_get_ed_status
 from sasutils.ses import ses_get_snic_nickname
+from sasutils.records import add_record_arguments, record_writer
 from sasutils.sysfs import sysfs
 
+# record fields of --ndjson and --csv outputs
+CARBON_FIELDS = ('enclosure', 'element_type', 'descriptor', 'key', 'unit',
+                 'value', 'timestamp')
+STATUS_FIELDS = ('enclosure', 'element_type', 'descriptor', 'status')
+
 
 def _init_argparser():
     """Initialize argparser object for ses_report command-line."""
@@ -51,14 +60,42 @@ def _init_argparser():
                        default='sasutils.ses_report',
                        help='carbon prefix (example: "datacenter.cluster",'
                             ' default is "sasutils.ses_report")')
-    group.add_argument('-j', '--json', action='store_true',
-                       help='alternative JSON output mode')
+    mgroup = group.add_mutually_exclusive_group()
+    mgroup.add_argument('-j', '--json', action='store_true',
+                        help='alternative JSON output mode')
+    add_record_arguments(mgroup)
+    add_profile_argument(parser)
+    add_executor_arguments(parser)
     return parser.parse_args()
 
 
+def _enclosure_nickname(enclosure):
+    """Return SES nickname of enclosure, or vendor and SAS address if SES
+    enclosure nickname is not defined."""
+    snic = ses_get_snic_nickname(enclosure.scsi_generic.name)
+    if snic:
+        return snic.replace(' ', '_')
+    snic = enclosure.attrs.vendor.replace(' ', '-')
+    return snic + '_' + enclosure.attrs.sas_address
+
+
+def _enclosure_elements(enclosure, get_elements):
+    """Return list of SES element descriptors of enclosure, or None if
+    they cannot be retrieved."""
+    sg_name = enclosure.scsi_generic.name
+    try:
+        return list(get_elements(sg_name))
+    except OSError as err:
+        print('Warning: skipping enclosure %s: %s' % (sg_name, err),
+              file=sys.stderr)
+        return None
+
+
 def ses_report():
     """ses_report command-line"""
     pargs = _init_argparser()
+    setup_profiling(pargs.profile)
+    setup_executor(pargs.jobs, pargs.timeout, pargs.deadline)
     if pargs.debug:
         # debugging on the same stream is recommended (stdout)
         logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -69,47 +106,56 @@ def ses_report():
 
     json_encl_dict = {}
 
-    # Iterate over sysfs SCSI enclosures
-    for node in sysfs.node('class').node('enclosure'):
-        # Get enclosure device
-        enclosure = EnclosureDevice(node.node('device'))
-        # Get enclosure SG device
-        sg_dev = enclosure.scsi_generic
-        # Resolve SES enclosure nickname
-        snic = ses_get_snic_nickname(sg_dev.name)
-        if snic:
-            snic = snic.replace(' ', '_')
-        else:
-            # Use Vendor + SAS address if SES encl. nickname not defined
-            snic = enclosure.attrs.vendor.replace(' ', '-')
-            snic += '_' + enclosure.attrs.sas_address
-
-        if pargs.carbon:
-            if pargs.json:
-                encl_json_list = []
-                for edinfo in ses_get_ed_metrics(sg_dev.name):
-                    encl_json_list.append(edinfo)
-                json_encl_dict[snic] = encl_json_list
+    writer = record_writer(pargs, CARBON_FIELDS if pargs.carbon
+                           else STATUS_FIELDS)
+
+    # Resolve sysfs SCSI enclosures and their SES nicknames
+    phase('enclosures')
+    enclosures = [EnclosureDevice(node.node('device'))
+                  for node in sysfs.node('class').node('enclosure')]
+    executor = get_executor()
+    snics = executor.map(_enclosure_nickname, enclosures)
+
+    # Get SES element descriptors of all enclosures in parallel
+    phase('elements')
+    if pargs.carbon:
+        get_elements = ses_get_ed_metrics
+    else:
+        get_elements = ses_get_ed_status
+    elements = executor.map(lambda encl: _enclosure_elements(encl,
+                                                             get_elements),
+                            enclosures)
+
+    for snic, edlist in zip(snics, elements):
+        if edlist is None:
+            continue
+        if writer:
+            if pargs.carbon:
+                time_now = int(time.time())
+                for edinfo in edlist:
+                    writer.write(dict(edinfo, enclosure=snic,
+                                      timestamp=time_now))
             else:
-                time_now = time.time()
-                for edinfo in ses_get_ed_metrics(sg_dev.name):
-                    # Print output using Carbon format
-                    fmt = '{element_type}.{descriptor}.{key}_{unit} {value}'
-                    path = fmt.format(**edinfo)
-                    print('%s%s.%s %d' % (pfx, snic, path, time_now))
+                for edstatus in edlist:
+                    writer.write(dict(edstatus, enclosure=snic))
+        elif pargs.json:
+            json_encl_dict[snic] = edlist
+        elif pargs.carbon:
+            time_now = time.time()
+            for edinfo in edlist:
+                # Print output using Carbon format
+                fmt = '{element_type}.{descriptor}.{key}_{unit} {value}'
+                path = fmt.format(**edinfo)
+                print('%s%s.%s %d' % (pfx, snic, path, time_now))
         else:
-            if pargs.json:
-                encl_json_list = []
-                for edstatus in ses_get_ed_status(sg_dev.name):
-                    encl_json_list.append(edstatus)
-                json_encl_dict[snic] = encl_json_list
-            else:
-                for edstatus in ses_get_ed_status(sg_dev.name):
-                    fmt = '{element_type}.{descriptor} {status}'
-                    output = fmt.format(**edstatus)
-                    print('%s%s.%s' % (pfx, snic, output))
-
-    if pargs.json:
+            for edstatus in edlist:
+                fmt = '{element_type}.{descriptor} {status}'
+                output = fmt.format(**edstatus)
+                print('%s%s.%s' % (pfx, snic, output))
+
+    if writer:
+        writer.close()
+    elif pargs.json:
         print(json.dumps(json_encl_dict, sort_keys=True, indent=4))
 
 
@@ -0,0 +1,480 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""External command execution with record and replay
+
+All external commands (sg_ses, smp_discover, scsi_id) are run through
+run_command(). Environment variables change how they are executed:
+
+    SASUTILS_RECORD=FILE
+        Run commands and append their arguments, stdout, stderr, exit
+        status and latency to FILE (one JSON object per line).
+
+    SASUTILS_REPLAY=FILE
+        Do not run anything: serve results recorded in FILE. Commands that
+        were not recorded fail like a missing executable (OSError).
+
+    SASUTILS_REPLAY_LATENCY=SCALE
+        In replay mode, sleep SCALE times the recorded latency of each
+        command (default is 0, 1 replays the original latencies). A value
+        ending with "s" (eg. "0.5s") is a fixed latency in seconds.
+
+    SASUTILS_TIMEOUT=SECONDS
+        Kill commands that do not complete within SECONDS (default is 30,
+        0 disables the timeout). Also set by the --timeout option.
+
+    SASUTILS_DEADLINE=SECONDS
+        Do not run commands or wait for them after SECONDS from the start of
+        the run (default: no deadline). Also set by the --deadline option.
+
+    SASUTILS_JOBS=N
+        Run at most N commands concurrently (default is 8). Also set by the
+        --jobs option.
+
+Commands that time out raise CommandTimeout, an OSError (ETIMEDOUT) that
+callers handle like a failed command: tools degrade to partial results and
+list the commands that timed out on stderr at exit.
+
+For example, to simulate a slow enclosure on another machine:
+
+    $ SASUTILS_RECORD=cmds.ndjson sas_devices -v
+    $ SASUTILS_REPLAY=cmds.ndjson SASUTILS_REPLAY_LATENCY=10 sas_devices -v
+
+Results are cached by argument vector for the duration of the run, so that
+each distinct query command is only executed once; identical calls from
+concurrent threads wait for the same execution. Commands that change device
+state must be run with cache=False, which also invalidates the cache.
+"""
+
+import atexit
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+RECORD_ENV = 'SASUTILS_RECORD'
+REPLAY_ENV = 'SASUTILS_REPLAY'
+REPLAY_LATENCY_ENV = 'SASUTILS_REPLAY_LATENCY'
+TIMEOUT_ENV = 'SASUTILS_TIMEOUT'
+DEADLINE_ENV = 'SASUTILS_DEADLINE'
+JOBS_ENV = 'SASUTILS_JOBS'
+
+# default timeout of a command in seconds
+DEFAULT_TIMEOUT = 30.0
+# default maximum number of concurrent commands
+DEFAULT_JOBS = 8
+
+
+class CommandResult(namedtuple('CommandResult',
+                               'args returncode stdout stderr latency')):
+    """Result of an external command (stdout and stderr are bytes)."""
+
+    __slots__ = ()
+
+    def check(self):
+        """Raise CalledProcessError if the command failed."""
+        if self.returncode:
+            raise subprocess.CalledProcessError(self.returncode,
+                                                list(self.args), self.stdout,
+                                                self.stderr)
+        return self
+
+
+class CommandTimeout(OSError):
+    """External command killed, or not run, because of a timeout."""
+
+    def __init__(self, args, timeout):
+        OSError.__init__(self, errno.ETIMEDOUT,
+                         '%s timed out after %.1fs' % (' '.join(args),
+                                                       max(timeout, 0)))
+        self.cmdargs = tuple(args)
+
+
+def _encode(data):
+    return data.decode('utf-8', errors='surrogateescape')
+
+
+def _decode(text):
+    return text.encode('utf-8', errors='surrogateescape')
+
+
+class CommandRecorder(object):
+    """Append command results to a NDJSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, args, result=None, error=None, latency=0.0):
+        entry = {'args': list(args), 'latency': latency}
+        if error is not None:
+            entry['error'] = [error.errno, error.strerror]
+        else:
+            entry.update(returncode=result.returncode,
+                         stdout=_encode(result.stdout),
+                         stderr=_encode(result.stderr))
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as fp:
+                fp.write(line)
+
+
+class CommandReplayer(object):
+    """Serve command results recorded by CommandRecorder.
+
+    Results of the same command line are served in recording order; the
+    last one is repeated if the command is run more times.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.scale, self.fixed = 0.0, None
+        if isinstance(latency, str) and latency.endswith('s'):
+            self.fixed = float(latency[:-1])
+        else:
+            self.scale = float(latency or 0)
+        self._entries = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        with open(path) as fp:
+            for line in fp:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(tuple(entry['args']),
+                                             []).append(entry)
+
+    def replay(self, args, timeout=None):
+        args = tuple(args)
+        entries = self._entries.get(args)
+        if not entries:
+            raise OSError(errno.ENOENT, 'no recorded result for %s'
+                          % ' '.join(args))
+        with self._lock:
+            index = self._served.get(args, 0)
+            self._served[args] = index + 1
+        entry = entries[min(index, len(entries) - 1)]
+
+        latency = entry.get('latency', 0.0)
+        delay = self.fixed if self.fixed is not None else latency * self.scale
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise CommandTimeout(args, timeout)
+        if delay > 0:
+            time.sleep(delay)
+
+        if 'error' in entry:
+            if entry['error'][0] == errno.ETIMEDOUT:
+                raise CommandTimeout(args, latency)
+            raise OSError(*entry['error'])
+        return CommandResult(args, entry['returncode'],
+                             _decode(entry['stdout']),
+                             _decode(entry['stderr']),
+                             delay)
+
+
+class CommandCache(object):
+    """Memoize command results (or OSError) by argument vector and
+    environment, coalescing identical in-flight calls."""
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(args, env):
+        return tuple(args), (tuple(sorted(env.items())) if env else None)
+
+    def get(self, args, env, func):
+        """Return cached result of func(args, env), calling it if needed."""
+        key = self._key(args, env)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                # [done event, result, error]
+                entry = self._results[key] = [threading.Event(), None, None]
+                self.misses += 1
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+        if owner:
+            try:
+                entry[1] = func(args, env)
+            except OSError as err:
+                entry[2] = err
+            finally:
+                entry[0].set()
+        else:
+            entry[0].wait()
+        if entry[2] is not None:
+            raise entry[2]
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._results = {}
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._results)}
+
+
+command_cache = CommandCache()
+
+
+class CommandExecutor(object):
+    """Bound external commands: at most jobs concurrent commands, each one
+    killed after timeout seconds, none run or waited for after the run
+    deadline (seconds from creation). None means no limit."""
+
+    def __init__(self, jobs=DEFAULT_JOBS, timeout=DEFAULT_TIMEOUT,
+                 deadline=None):
+        self.jobs = max(int(jobs), 1)
+        self.timeout = timeout
+        self.deadline = None
+        if deadline is not None:
+            self.deadline = time.time() + deadline
+        self.timed_out = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.jobs)
+        # background pool of submit(), created on first use
+        self._pool = None
+
+    def call_timeout(self):
+        """Return time allowed to a command started now, or None."""
+        timeout = self.timeout
+        if self.deadline is not None:
+            remaining = self.deadline - time.time()
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        return timeout
+
+    def acquire(self, timeout):
+        """Wait for a command slot; return False on timeout."""
+        return self._slots.acquire(timeout=timeout)
+
+    def release(self):
+        self._slots.release()
+
+    def add_timeout(self, err):
+        LOGGER.debug('%s', err.strerror)
+        with self._lock:
+            self.timed_out.append(err)
+
+    def map(self, func, iterable):
+        """Return the list of func(item) for items of iterable, computed by
+        up to jobs threads (func usually runs external commands)."""
+        items = list(iterable)
+        if self.jobs == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.jobs,
+                                                len(items))) as pool:
+            return list(pool.map(func, items))
+
+    def submit(self, func, *args):
+        """Start func(*args) in a background thread without waiting for
+        it; return a Future. Used to prefetch command results into the
+        command cache."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.jobs)
+        return self._pool.submit(func, *args)
+
+    def report(self):
+        """Write the list of commands that timed out to stderr."""
+        if self.timed_out:
+            sys.stderr.write('Warning: partial results, %d external '
+                             'command(s) timed out:\n' % len(self.timed_out))
+            for err in self.timed_out:
+                sys.stderr.write('  %s\n' % err.strerror)
+            sys.stderr.flush()
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        LOGGER.warning('ignoring invalid %s value: %s', name, value)
+        return default
+
+
+_executor = None
+
+
+def get_executor():
+    """Return the command executor, configured from the environment if
+    setup_executor() was not called."""
+    if _executor is None:
+        setup_executor()
+    return _executor
+
+
+def setup_executor(jobs=None, timeout=None, deadline=None):
+    """Configure the command executor, usually from --jobs, --timeout and
+    --deadline options (None means use environment or default value)."""
+    global _executor
+    if jobs is None:
+        jobs = _env_float(JOBS_ENV, DEFAULT_JOBS)
+    if timeout is None:
+        timeout = _env_float(TIMEOUT_ENV, DEFAULT_TIMEOUT)
+    if deadline is None:
+        deadline = _env_float(DEADLINE_ENV, None)
+    if _executor is None:
+        atexit.register(_report_timeouts)
+    _executor = CommandExecutor(jobs, timeout or None, deadline)
+    return _executor
+
+
+def _report_timeouts():
+    if _executor is not None:
+        _executor.report()
+
+
+def add_executor_arguments(parser):
+    """Add --jobs, --timeout and --deadline options to an argparse
+    parser."""
+    group = parser.add_argument_group('external commands')
+    group.add_argument('--jobs', action='store', type=int, metavar='N',
+                       help='run at most N external commands concurrently '
+                            '(default is %d)' % DEFAULT_JOBS)
+    group.add_argument('--timeout', action='store', type=float,
+                       metavar='SECONDS',
+                       help='kill external commands (sg_ses...) after '
+                            'SECONDS (default is %d, 0 for no timeout)'
+                            % DEFAULT_TIMEOUT)
+    group.add_argument('--deadline', action='store', type=float,
+                       metavar='SECONDS',
+                       help='stop running external commands after SECONDS '
+                            'and report partial results')
+
+
+_recorder = None
+_replayer = None
+_configured = False
+
+
+def _configure():
+    global _recorder, _replayer, _configured
+    replay = os.environ.get(REPLAY_ENV)
+    if replay:
+        _replayer = CommandReplayer(replay,
+                                    os.environ.get(REPLAY_LATENCY_ENV, 0))
+    record = os.environ.get(RECORD_ENV)
+    if record and not replay:
+        _recorder = CommandRecorder(record)
+    _configured = True
+
+
+def _kill(proc):
+    """Kill and reap a command and its process group."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        proc.kill()
+    # do not wait for pipes possibly held open by escaped children
+    proc.stdout.close()
+    proc.stderr.close()
+    proc.wait()
+
+
+def _run(args, env, timeout):
+    """Run command, killing it after timeout seconds (None: no timeout);
+    return (returncode, stdout, stderr)."""
+    start = time.time()
+    executor = get_executor()
+    if not executor.acquire(timeout):
+        raise CommandTimeout(args, timeout)
+    try:
+        if timeout is not None:
+            timeout -= time.time() - start
+            if timeout <= 0:
+                raise CommandTimeout(args, timeout)
+        # in its own process group, to kill children of wrapper scripts
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, env=env,
+                                start_new_session=timeout is not None)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill(proc)
+            raise CommandTimeout(args, time.time() - start)
+    finally:
+        executor.release()
+    return proc.returncode, stdout, stderr
+
+
+def _execute(args, env=None):
+    """Run or replay command, return CommandResult; raise OSError if the
+    command cannot be executed or CommandTimeout if it timed out."""
+    if not _configured:
+        _configure()
+    timeout = get_executor().call_timeout()
+    start = time.time()
+    try:
+        if timeout is not None and timeout <= 0:
+            raise CommandTimeout(args, 0)
+        if _replayer is not None:
+            LOGGER.debug('replaying: %s', args)
+            return _replayer.replay(args, timeout)
+        returncode, stdout, stderr = _run(args, env, timeout)
+    except CommandTimeout as err:
+        get_executor().add_timeout(err)
+        if _recorder is not None:
+            _recorder.record(args, error=err, latency=time.time() - start)
+        raise
+    except OSError as err:
+        # logged once here, as cached errors are raised to every caller
+        LOGGER.warning('%s: %s', ' '.join(args), err)
+        if _recorder is not None:
+            _recorder.record(args, error=err, latency=time.time() - start)
+        raise
+    result = CommandResult(tuple(args), returncode, stdout, stderr,
+                           time.time() - start)
+    if _recorder is not None:
+        _recorder.record(args, result, latency=result.latency)
+    return result
+
+
+def run_command(args, env=None, cache=True):
+    """Run external command (list of arguments) and return a CommandResult.
+
+    Results are served from the per-run command cache unless cache is False
+    (for commands with side effects, the cache is then invalidated).
+    Raise OSError if the command cannot be executed; the error is logged
+    once per command execution, not for each cached result.
+    """
+    if not cache:
+        try:
+            return _execute(args, env)
+        finally:
+            command_cache.clear()
+    # _execute is looked up at call time (see profiling)
+    return command_cache.get(args, env, lambda a, e: _execute(a, e))
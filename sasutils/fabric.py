@@ -0,0 +1,192 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Logical SAS fabric merging multipath views by SAS address
+
+In sysfs, an expander or an end device reachable from several SAS hosts
+appears once per host, as distinct SASExpander or SASEndDevice objects.
+The Fabric merges these per-path objects into a single FabricNode per SAS
+address, listing all its physical paths:
+
+    >>> from sasutils.fabric import Fabric
+    >>> fabric = Fabric()
+    >>> for path in fabric.paths('0x500056b3eb2e1bff'):
+    ...     print(path.host, path.port, path.phys, path.linkrate)
+
+Attributes should be read from FabricNode.obj, the object of the first
+path, so that they are read once per logical node.
+"""
+
+from collections import Counter, namedtuple, OrderedDict
+import logging
+
+from sasutils.sas import SASEndDevice, SASExpander, SASHost, SASPort, walk
+from sasutils.scsi import SCSIDevice
+from sasutils.sysfs import sysfs
+
+LOGGER = logging.getLogger(__name__)
+
+# Physical path to a fabric node: SAS host name (eg. 'host1'), SAS address
+# of the upstream node, port name (eg. 'port-1:0'), number of phys of the
+# port and their negotiated link rates (eg. '4 x 12.0 Gbit').
+FabricPath = namedtuple('FabricPath', ['host', 'parent', 'port', 'phys',
+                                       'linkrate'])
+
+
+def _sas_address_key(sas_address):
+    """Normalize a SAS address (eg. '500056b3eb2e1bff' or '0x5000...')."""
+    sas_address = sas_address.strip().lower()
+    if not sas_address.startswith('0x'):
+        sas_address = '0x' + sas_address
+    return sas_address
+
+
+def _port_linkrate(port):
+    counts = Counter(phy.attrs.get('negotiated_linkrate', 'unknown')
+                     for phy in port.phys)
+    return ', '.join('%d x %s' % (count, speed)
+                     for speed, count in counts.items())
+
+
+class FabricNode(object):
+    """SAS host, expander or end device merged by SAS address."""
+
+    def __init__(self, sas_address, kind):
+        self.sas_address = sas_address
+        # 'host', 'expander' or 'end_device'
+        self.kind = kind
+        # per-path sysfs objects (SASHost, SASExpander or SASEndDevice)
+        self.objects = []
+        # FabricPath of each object (empty for hosts)
+        self.paths = []
+        # SCSI targets of end devices, one per path
+        self.targets = []
+        # SAS addresses of upstream and downstream nodes
+        self.parents = OrderedDict()
+        self.children = OrderedDict()
+
+    def __repr__(self):
+        return '<%s.%s %s %s paths=%d>' % (self.__module__,
+                                           self.__class__.__name__,
+                                           self.kind, self.sas_address,
+                                           len(self.paths))
+
+    @property
+    def obj(self):
+        """sysfs object of the first path."""
+        return self.objects[0]
+
+
+class Fabric(object):
+    """SAS fabric with one node per SAS address."""
+
+    def __init__(self, sysfsnode=None):
+        """Load fabric from sysfs sas_host class node (by default,
+        /sys/class/sas_host)."""
+        if sysfsnode is None:
+            sysfsnode = sysfs.node('class').node('sas_host')
+
+        # normalized SAS address (see _sas_address_key()) -> FabricNode
+        self.nodes = OrderedDict()
+
+        for node in sysfsnode:
+            self._add_host(SASHost(node.node('device')))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+    def _node(self, sas_address, kind):
+        sas_address = _sas_address_key(sas_address)
+        fnode = self.nodes.get(sas_address)
+        if fnode is None:
+            fnode = self.nodes[sas_address] = FabricNode(sas_address, kind)
+        return fnode
+
+    def _add_host(self, sas_host):
+        sas_address = sas_host.scsi_host.attrs.get('host_sas_address')
+        if not sas_address:
+            LOGGER.warning('fabric: %s has no SAS address', sas_host.name)
+            return
+        host = self._node(sas_address, 'host')
+        host.objects.append(sas_host)
+
+        # fabric nodes and ports of the current branch, by depth
+        stack = [host]
+        for depth, obj in walk(sas_host):
+            del stack[depth:]
+            if isinstance(obj, SASPort):
+                stack.append(obj)
+            elif isinstance(obj, SCSIDevice):
+                stack[depth - 1].targets.append(obj)
+                stack.append(None)
+            elif isinstance(obj, (SASExpander, SASEndDevice)):
+                stack.append(self._add_path(sas_host, stack[depth - 2],
+                                            stack[depth - 1], obj))
+            else:
+                stack.append(host)
+
+    def _add_path(self, sas_host, parent, port, obj):
+        """Add path of expander or end device obj and return its node."""
+        try:
+            sas_address = obj.sas_device.attrs.get('sas_address')
+        except (AttributeError, KeyError) as err:
+            LOGGER.warning('fabric: %s: %s', obj.name, err)
+            sas_address = None
+        if not sas_address:
+            # keep the object so that the traversal can continue
+            sas_address = 'unknown-%s' % obj.name
+        kind = 'expander' if isinstance(obj, SASExpander) else 'end_device'
+        fnode = self._node(sas_address, kind)
+        fnode.objects.append(obj)
+        fnode.paths.append(FabricPath(sas_host.name, parent.sas_address,
+                                      port.name, len(port.phys),
+                                      _port_linkrate(port)))
+        fnode.parents[parent.sas_address] = parent
+        parent.children[fnode.sas_address] = fnode
+        return fnode
+
+    #
+    # Lookups
+    #
+
+    @property
+    def hosts(self):
+        """List of SAS host nodes."""
+        return [fnode for fnode in self if fnode.kind == 'host']
+
+    @property
+    def expanders(self):
+        """List of expander nodes."""
+        return [fnode for fnode in self if fnode.kind == 'expander']
+
+    @property
+    def end_devices(self):
+        """List of end device nodes."""
+        return [fnode for fnode in self if fnode.kind == 'end_device']
+
+    def node(self, sas_address):
+        """Return fabric node of a SAS address or None."""
+        return self.nodes.get(_sas_address_key(sas_address))
+
+    def paths(self, sas_address):
+        """Return list of FabricPath of a SAS address."""
+        fnode = self.node(sas_address)
+        if fnode is None:
+            return []
+        return list(fnode.paths)
@@ -0,0 +1,255 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local counter history
+
+Fixed-size ring buffer of counter samples stored in a single memory-mapped
+file. Disk and memory use only depend on the number of series and slots
+chosen when the file is created, not on how long the history is kept.
+
+File layout (native byte order):
+
+    header      magic, version, max_series, nslots, nseries, head, rounds
+    timestamps  nslots x int64          (one timestamp per sample round)
+    last        max_series x int64      (last absolute value of each series)
+    deltas      nslots x max_series x int32
+    keys        max_series x KEY_SIZE bytes (NUL-padded series names)
+
+Values are delta-encoded: each slot holds the increase of every series since
+the previous round, so the gain of a series over a time window is the sum of
+its deltas in the window. Deltas are stored slot-major so that starting a new
+round only has to clear one contiguous slice.
+
+    >>> from sasutils.history import CounterHistory
+    >>> hist = CounterHistory('/var/lib/sasutils/counters.hist')
+    >>> hist.record(time.time(), [('host.phys.0.invalid_dword_count', 12)])
+    >>> for key, gain in hist.gains(3600): print(key, gain)
+"""
+
+import logging
+import mmap
+import os
+import struct
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'SASHIST1'
+VERSION = 1
+
+HEADER_FMT = '=8sIIIIqq'
+HEADER_SIZE = 64
+KEY_SIZE = 256
+
+DELTA_MAX = 2 ** 31 - 1
+
+# default number of series and slots (1 day of history at 1 sample/min)
+DEFAULT_MAX_SERIES = 8192
+DEFAULT_NSLOTS = 1440
+
+
+def _file_size(max_series, nslots):
+    """Return size of a history file of max_series series and nslots slots."""
+    return HEADER_SIZE + nslots * 8 + max_series * 8 + \
+        nslots * max_series * 4 + max_series * KEY_SIZE
+
+
+class CounterHistory(object):
+    """Ring buffer history of counter series backed by a mmap'ed file."""
+
+    def __init__(self, path, max_series=DEFAULT_MAX_SERIES,
+                 nslots=DEFAULT_NSLOTS, readonly=False):
+        """Open counter history file, creating it if needed.
+
+        The max_series and nslots arguments are only used when the file is
+        created; existing files keep their own geometry.
+        """
+        self.path = path
+        self.readonly = readonly
+        if not readonly and not os.path.exists(path):
+            self._create(path, max_series, nslots)
+
+        flags = os.O_RDONLY if readonly else os.O_RDWR
+        fd = os.open(path, flags)
+        try:
+            access = mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+            self._mm = mmap.mmap(fd, 0, access=access)
+        finally:
+            os.close(fd)
+
+        try:
+            self._check_header(path)
+        except ValueError:
+            self._mm.close()
+            raise
+
+        offset = HEADER_SIZE
+        size = self.nslots * 8
+        self._view = view = memoryview(self._mm)
+        self._timestamps = view[offset:offset + size].cast('q')
+        offset += size
+        size = self.max_series * 8
+        self._last = view[offset:offset + size].cast('q')
+        offset += size
+        size = self.nslots * self.max_series * 4
+        self._deltas = view[offset:offset + size].cast('i')
+        offset += size
+        self._keys = view[offset:offset + self.max_series * KEY_SIZE]
+        self._zeros = memoryview(bytes(self.max_series * 4)).cast('i')
+
+        # series name -> index
+        self._index = {}
+        for idx in range(self.nseries):
+            key = bytes(self._keys[idx * KEY_SIZE:(idx + 1) * KEY_SIZE])
+            self._index[key.rstrip(b'\x00').decode()] = idx
+
+    def _check_header(self, path):
+        """Read header and check it against the file size."""
+        try:
+            magic, version, self.max_series, self.nslots, self.nseries, \
+                self.head, self.rounds = struct.unpack_from(HEADER_FMT,
+                                                            self._mm)
+        except struct.error:
+            raise ValueError('%s: not a counter history file' % path)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s: not a counter history file' % path)
+        if self.nslots < 1 or self.nseries > self.max_series or \
+                not 0 <= self.head < self.nslots or \
+                len(self._mm) < _file_size(self.max_series, self.nslots):
+            raise ValueError('%s: truncated or corrupt counter history file'
+                             % path)
+
+    @staticmethod
+    def _create(path, max_series, nslots):
+        size = _file_size(max_series, nslots)
+        tmppath = '%s.%d' % (path, os.getpid())
+        with open(tmppath, 'wb') as fp:
+            fp.write(struct.pack(HEADER_FMT, MAGIC, VERSION, max_series,
+                                 nslots, 0, nslots - 1, 0))
+            fp.truncate(size)
+        os.rename(tmppath, path)
+
+    def close(self):
+        """Flush and close history file."""
+        if self._mm is None:
+            return
+        for view in (self._timestamps, self._last, self._deltas, self._keys,
+                     self._view):
+            view.release()
+        if not self.readonly:
+            self._mm.flush()
+        self._mm.close()
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.nseries
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def _add_series(self, key):
+        encoded = key.encode()
+        if len(encoded) > KEY_SIZE:
+            LOGGER.warning('history: series name too long: %s', key)
+            return None
+        if self.nseries >= self.max_series:
+            LOGGER.warning('history: %s is full (%d series)', self.path,
+                           self.max_series)
+            return None
+        idx = self.nseries
+        self._keys[idx * KEY_SIZE:idx * KEY_SIZE + len(encoded)] = encoded
+        self.nseries += 1
+        self._index[key] = idx
+        return idx
+
+    def _write_header(self):
+        struct.pack_into(HEADER_FMT, self._mm, 0, MAGIC, VERSION,
+                         self.max_series, self.nslots, self.nseries,
+                         self.head, self.rounds)
+
+    def record(self, timestamp, samples):
+        """Record a new round of samples.
+
+        samples is an iterable of (series name, absolute value) tuples.
+        Series not seen in this round get a zero delta. A value lower than
+        the last one is considered a counter reset.
+        """
+        head = (self.head + 1) % self.nslots
+        start = head * self.max_series
+        # clear the oldest slot, which becomes the current one
+        self._deltas[start:start + self.max_series] = self._zeros
+        self._timestamps[head] = int(timestamp)
+
+        index = self._index
+        last = self._last
+        deltas = self._deltas
+        for key, value in samples:
+            idx = index.get(key)
+            if idx is None:
+                idx = self._add_series(key)
+                if idx is None:
+                    continue
+                # first sample of this series: no delta
+                last[idx] = value
+                continue
+            delta = value - last[idx]
+            if delta < 0:
+                # counter reset
+                delta = value
+            deltas[start + idx] = min(delta, DELTA_MAX)
+            last[idx] = value
+
+        self.head = head
+        self.rounds += 1
+        self._write_header()
+
+    def _slots(self, since):
+        """Yield slot indexes recorded after timestamp since, newest first."""
+        for age in range(min(self.rounds, self.nslots)):
+            slot = (self.head - age) % self.nslots
+            if self._timestamps[slot] <= since:
+                break
+            yield slot
+
+    def gains(self, window, now=None, keys=None):
+        """Return list of (series name, gain) for series that increased
+        within the last window seconds, largest gain first.
+
+        The optional keys callable filters series by name.
+        """
+        if now is None:
+            now = self._timestamps[self.head] if self.rounds else 0
+        nseries = self.nseries
+        totals = [0] * nseries
+        for slot in self._slots(now - window):
+            start = slot * self.max_series
+            totals = [total + delta for total, delta in
+                      zip(totals, self._deltas[start:start + nseries])]
+
+        results = []
+        for key, idx in self._index.items():
+            if totals[idx] > 0 and (keys is None or keys(key)):
+                results.append((key, totals[idx]))
+        return sorted(results, key=lambda item: (-item[1], item[0]))
+
+    def last(self, key):
+        """Return last recorded absolute value of a series."""
+        return self._last[self._index[key]]
@@ -0,0 +1,272 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SAS inventory with lookup indexes
+
+The Inventory is loaded in a single pass over the SAS hosts found in sysfs.
+All SAS hosts, expanders, end devices, SCSI devices and enclosures are
+cross-linked and indexed, so that common lookups do not require any
+further sysfs traversal:
+
+    >>> from sasutils.inventory import Inventory
+    >>> inv = Inventory()
+    >>> for scsi_device in inv.by_wwid('naa.5000c500a1b2c3d4'):
+    ...     print(inv.enclosure(scsi_device), inv.bay(scsi_device))
+    >>> inv.by_block('sdb')
+    >>> inv.by_bay('sg12', 3)
+    >>> inv.children(inv.by_sas_address('0x500056b3eb2e1bff')[0])
+
+Lookups by WWID, serial number, SAS address and (enclosure, bay) return
+lists, as multipath devices and expanders are seen once per path. Lookups
+by device name return a single object or None.
+"""
+
+import logging
+from os.path import realpath
+import struct
+
+from sasutils.sas import SASHost
+from sasutils.scsi import TYPE_ENCLOSURE
+from sasutils.sysfs import sysfs
+from sasutils.vpd import vpd_decode_pg80_sn, vpd_read_page
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _wwid_key(wwid):
+    """Normalize a WWID (eg. 'naa.5000c500a1b2c3d4' or '0x5000c500...')."""
+    wwid = wwid.strip().lower()
+    for prefix in ('naa.', '0x'):
+        if wwid.startswith(prefix):
+            return wwid[len(prefix):]
+    return wwid
+
+
+def _devname(name):
+    """Strip /dev/ from device name."""
+    if name.startswith('/dev/'):
+        return name[5:]
+    return name
+
+
+class Inventory(object):
+    """Cross-linked and indexed SAS topology."""
+
+    def __init__(self, sysfsnode=None):
+        """Load inventory from sysfs sas_host class node (by default,
+        /sys/class/sas_host)."""
+        if sysfsnode is None:
+            sysfsnode = sysfs.node('class').node('sas_host')
+
+        self.hosts = []
+        self.expanders = []
+        self.end_devices = []
+        self.scsi_devices = []
+        # enclosure key (realpath) -> enclosure SCSI device
+        self._enclosures = {}
+
+        # object sysfs path -> parent object and children objects
+        self._parent = {}
+        self._children = {}
+        # scsi device sysfs path -> enclosure key and bay
+        self._scsi_enclosure = {}
+        self._scsi_bay = {}
+
+        # indexes
+        self._by_wwid = {}
+        self._by_serial = {}
+        self._by_sas_address = {}
+        self._by_block = {}
+        self._by_tape = {}
+        self._by_sg = {}
+        self._by_bay = {}
+        # enclosure sg name or logical identifier -> enclosure key
+        self._enclosure_keys = {}
+
+        for node in sysfsnode:
+            self._add_host(SASHost(node.node('device')))
+
+    def __len__(self):
+        return len(self.scsi_devices)
+
+    @staticmethod
+    def _index(index, key, obj):
+        if key:
+            index.setdefault(key, []).append(obj)
+
+    def _link(self, obj, parent):
+        self._parent[obj.sysfsnode.path] = parent
+        self._children.setdefault(parent.sysfsnode.path, []).append(obj)
+
+    def _add_host(self, sas_host):
+        self.hosts.append(sas_host)
+        self._index(self._by_sas_address,
+                    sas_host.scsi_host.attrs.get('host_sas_address'), sas_host)
+        self._add_node(sas_host)
+
+    def _add_node(self, sas_node):
+        for port in sas_node.ports:
+            for expander in port.expanders:
+                self.expanders.append(expander)
+                self._link(expander, sas_node)
+                self._index(self._by_sas_address,
+                            expander.sas_device.attrs.get('sas_address'),
+                            expander)
+                self._add_node(expander)
+            for end_device in port.end_devices:
+                self._add_end_device(end_device, sas_node)
+
+    def _add_end_device(self, end_device, parent):
+        self.end_devices.append(end_device)
+        self._link(end_device, parent)
+        try:
+            sas_attrs = end_device.sas_device.attrs
+        except KeyError as err:
+            LOGGER.warning('inventory: %s: %s', end_device.name, err)
+            return
+        self._index(self._by_sas_address, sas_attrs.get('sas_address'),
+                    end_device)
+        bay = sas_attrs.typed('bay_identifier')
+
+        for scsi_device in end_device.targets:
+            self._add_scsi_device(scsi_device, end_device, bay)
+
+    def _add_scsi_device(self, scsi_device, end_device, bay):
+        self.scsi_devices.append(scsi_device)
+        self._link(scsi_device, end_device)
+        attrs = scsi_device.attrs
+        path = scsi_device.sysfsnode.path
+
+        wwid = attrs.get('wwid')
+        if wwid:
+            self._index(self._by_wwid, _wwid_key(wwid), scsi_device)
+        self._index(self._by_serial, self._serial(scsi_device), scsi_device)
+        self._by_sg[scsi_device.scsi_generic.name] = scsi_device
+        if scsi_device.block:
+            self._by_block[scsi_device.block.name] = scsi_device
+        if scsi_device.tape:
+            self._by_tape[scsi_device.tape.name] = scsi_device
+
+        if attrs.get('type') == str(TYPE_ENCLOSURE):
+            self._add_enclosure(scsi_device)
+
+        array_device = scsi_device.array_device
+        if array_device:
+            enc_key = self._add_enclosure(array_device.enclosure)
+            self._scsi_enclosure[path] = enc_key
+            if bay is not None:
+                self._scsi_bay[path] = bay
+                self._index(self._by_bay, (enc_key, bay), scsi_device)
+
+    def _add_enclosure(self, enclosure):
+        """Register enclosure SCSI device and return its key."""
+        enc_key = realpath(enclosure.sysfsnode.path)
+        if enc_key not in self._enclosures:
+            self._enclosures[enc_key] = enclosure
+            self._enclosure_keys[enclosure.scsi_generic.name] = enc_key
+            # enclosure logical identifier (enclosure class)
+            for encl in enclosure.sysfsnode.glob('enclosure/*'):
+                try:
+                    encl_id = encl.get('id')
+                except KeyError:
+                    continue
+                self._enclosure_keys.setdefault(encl_id.lower(), enc_key)
+        return enc_key
+
+    @staticmethod
+    def _serial(scsi_device):
+        """Return serial number from sysfs vpd_pg80 or None."""
+        pg80 = vpd_read_page(scsi_device.sysfsnode, 0x80)
+        if not pg80:
+            return None
+        try:
+            return vpd_decode_pg80_sn(pg80) or None
+        except struct.error:
+            return None
+
+    def _enclosure_key(self, enclosure):
+        if hasattr(enclosure, 'sysfsnode'):
+            return realpath(enclosure.sysfsnode.path)
+        enclosure = _devname(enclosure)
+        return self._enclosure_keys.get(enclosure,
+                                        self._enclosure_keys.get(
+                                            enclosure.lower()))
+
+    #
+    # Lookups
+    #
+
+    @property
+    def enclosures(self):
+        """List of enclosure SCSI devices."""
+        return list(self._enclosures.values())
+
+    def by_wwid(self, wwid):
+        """Return list of SCSI devices (paths) of a WWID."""
+        return list(self._by_wwid.get(_wwid_key(wwid), ()))
+
+    def by_serial(self, serial):
+        """Return list of SCSI devices (paths) having a serial number."""
+        return list(self._by_serial.get(serial.strip(), ()))
+
+    def by_sas_address(self, sas_address):
+        """Return list of hosts, expanders or end devices having a SAS
+        address."""
+        sas_address = sas_address.strip().lower()
+        if not sas_address.startswith('0x'):
+            sas_address = '0x' + sas_address
+        return list(self._by_sas_address.get(sas_address, ()))
+
+    def by_block(self, name):
+        """Return SCSI device of a block device name (eg. 'sda')."""
+        return self._by_block.get(_devname(name))
+
+    def by_tape(self, name):
+        """Return SCSI device of a tape device name (eg. 'st0')."""
+        return self._by_tape.get(_devname(name))
+
+    def by_sg(self, name):
+        """Return SCSI device of a SCSI generic device name (eg. 'sg3')."""
+        return self._by_sg.get(_devname(name))
+
+    def by_bay(self, enclosure, bay):
+        """Return list of SCSI devices in an enclosure bay. The enclosure is
+        either an enclosure device, its sg name or its logical
+        identifier."""
+        enc_key = self._enclosure_key(enclosure)
+        return list(self._by_bay.get((enc_key, int(bay)), ()))
+
+    def parent(self, obj):
+        """Return parent object (host, expander or end device)."""
+        return self._parent.get(obj.sysfsnode.path)
+
+    def children(self, obj):
+        """Return list of objects directly attached to a host, expander or
+        end device."""
+        return list(self._children.get(obj.sysfsnode.path, ()))
+
+    def end_device(self, scsi_device):
+        """Return SAS end device of a SCSI device."""
+        return self.parent(scsi_device)
+
+    def enclosure(self, scsi_device):
+        """Return enclosure SCSI device holding a SCSI device or None."""
+        enc_key = self._scsi_enclosure.get(scsi_device.sysfsnode.path)
+        return self._enclosures.get(enc_key)
+
+    def bay(self, scsi_device):
+        """Return enclosure bay identifier of a SCSI device or None."""
+        return self._scsi_bay.get(scsi_device.sysfsnode.path)
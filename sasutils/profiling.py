@@ -0,0 +1,278 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""sysfs I/O and subprocess profiling
+
+When enabled (--profile[=FILE] command-line option or SASUTILS_PROFILE
+environment variable), sysfs primitives (listdir, SysfsNode iterglob/glob,
+get, gettext, getraw and readlink), realpath resolutions, SG_IO commands and
+external commands (sg_ses, smp_discover, scsi_id...) are counted and timed,
+grouped by tool phase:
+
+    with profiling.phase('expanders'):
+        ...
+
+Times are exclusive: the time of a profiled operation done within another
+one is only accounted to the inner operation. A summary is printed to
+stderr, or written as JSON to a file, at exit.
+
+Instrumentation is only installed when profiling is enabled; otherwise the
+only cost is the creation of phase objects.
+"""
+
+import atexit
+from collections import OrderedDict
+import json
+import os
+from os.path import basename
+import sys
+import threading
+import time
+
+ENV_VAR = 'SASUTILS_PROFILE'
+
+# root phase name, before any phase is entered
+MAIN_PHASE = 'main'
+
+_profiler = None
+
+
+class Profiler(object):
+    """Per-phase operation counters and timers."""
+
+    def __init__(self, output='-'):
+        self.output = output
+        self.command = basename(sys.argv[0]).replace('.py', '')
+        self.start = time.time()
+        # phase -> [wall time, OrderedDict(operation -> [count, time])]
+        self.phases = OrderedDict()
+        self.current = None
+        self._phase_start = None
+        self._local = threading.local()
+        # operations are added by executor and SG_IO pool threads
+        self._lock = threading.Lock()
+        self.switch(MAIN_PHASE)
+
+    def switch(self, name):
+        """Make name the current phase and return the previous one."""
+        with self._lock:
+            now = time.time()
+            previous = self.current
+            if previous is not None:
+                self.phases[previous][0] += now - self._phase_start
+            self.phases.setdefault(name, [0.0, OrderedDict()])
+            self.current = name
+            self._phase_start = now
+        return previous
+
+    def _stack(self):
+        """Return per-thread stack of nested operation times."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def call(self, operation, func, *args, **kwargs):
+        """Call func and account it to operation in the current phase."""
+        stack = self._stack()
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.add(operation, elapsed - nested)
+
+    def iterate(self, operation, items):
+        """Iterate over items and account the time spent producing them to
+        a single operation in the current phase."""
+        stack = self._stack()
+        total = 0.0
+        try:
+            while True:
+                stack.append(0.0)
+                start = time.time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.time() - start
+                    nested = stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+                    total += elapsed - nested
+                yield item
+        finally:
+            self.add(operation, total)
+
+    def add(self, operation, elapsed):
+        with self._lock:
+            ops = self.phases[self.current][1]
+            counter = ops.get(operation)
+            if counter is None:
+                counter = ops[operation] = [0, 0.0]
+            counter[0] += 1
+            counter[1] += elapsed
+
+    def to_dict(self):
+        self.switch(self.current)
+        phases = OrderedDict()
+        for name, (wall, ops) in self.phases.items():
+            if not ops and not wall:
+                continue
+            phases[name] = OrderedDict(
+                [('wall', wall),
+                 ('operations', OrderedDict(
+                     (op, {'count': count, 'time': elapsed})
+                     for op, (count, elapsed) in ops.items()))])
+        from sasutils.command import command_cache
+        return OrderedDict([('command', self.command),
+                            ('wall', time.time() - self.start),
+                            ('command_cache', command_cache.stats()),
+                            ('phases', phases)])
+
+    def report(self):
+        """Write profile summary to stderr or JSON file."""
+        result = self.to_dict()
+        if self.output != '-':
+            with open(self.output, 'w') as fp:
+                json.dump(result, fp, indent=2)
+            return
+        out = sys.stderr
+        out.write('*** Profile of %s (%.3fs)\n' % (result['command'],
+                                                   result['wall']))
+        out.write('%-18s %-24s %8s %10s\n' % ('PHASE', 'OPERATION', 'COUNT',
+                                              'TIME'))
+        for name, phase_res in result['phases'].items():
+            out.write('%-18s %-24s %8s %9.3fs\n' % (name, '(wall)', '-',
+                                                    phase_res['wall']))
+            for op, counter in phase_res['operations'].items():
+                out.write('%-18s %-24s %8d %9.3fs\n' % (name, op,
+                                                        counter['count'],
+                                                        counter['time']))
+        out.write('Command cache: %(hits)d hits, %(misses)d misses\n'
+                  % result['command_cache'])
+        out.flush()
+
+
+class phase(object):
+    """Enter a tool phase: operations are accounted to it until the next
+    phase, or until the end of the with block if used as a context
+    manager."""
+
+    __slots__ = ('previous',)
+
+    def __init__(self, name):
+        self.previous = None
+        if _profiler is not None:
+            self.previous = _profiler.switch(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if _profiler is not None and self.previous is not None:
+            _profiler.switch(self.previous)
+
+
+def _wrap(operation, func):
+    def wrapper(*args, **kwargs):
+        return _profiler.call(operation, func, *args, **kwargs)
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, '__name__', operation)
+    return wrapper
+
+
+def _wrap_iter(operation, func):
+    """Like _wrap() for a generator function."""
+    def wrapper(*args, **kwargs):
+        return _profiler.iterate(operation, func(*args, **kwargs))
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, '__name__', operation)
+    return wrapper
+
+
+def _install():
+    """Install instrumentation of sysfs primitives and external commands."""
+    import os.path
+    from sasutils import command, sgio, sysfs
+
+    sysfs.listdir = _wrap('listdir', sysfs.listdir)
+    # SysfsNode.glob() is accounted through iterglob()
+    sysfs.SysfsNode.iterglob = _wrap_iter('glob', sysfs.SysfsNode.iterglob)
+    sysfs.SysfsNode.get = _wrap('get', sysfs.SysfsNode.get)
+    sysfs.SysfsNode.gettext = _wrap('gettext', sysfs.SysfsNode.gettext)
+    sysfs.SysfsNode.getraw = _wrap('getraw', sysfs.SysfsNode.getraw)
+    sysfs.SysfsNode.readlink = _wrap('readlink', sysfs.SysfsNode.readlink)
+
+    # realpath is imported by name in several modules
+    realpath = os.path.realpath
+    profiled_realpath = _wrap('realpath', realpath)
+    for name, module in list(sys.modules.items()):
+        if module is not None and (name == '__main__' or
+                                   name.startswith('sasutils')):
+            if getattr(module, 'realpath', None) is realpath:
+                module.realpath = profiled_realpath
+
+    # external commands, accounted by command name
+    execute = command._execute
+
+    def profiled_execute(args, env=None):
+        return _profiler.call('exec %s' % basename(args[0]), execute, args,
+                              env)
+    profiled_execute.__wrapped__ = execute
+    command._execute = profiled_execute
+
+    # SCSI commands sent with SG_IO
+    sgio.SGIOTransport.execute = _wrap('sg_io', sgio.SGIOTransport.execute)
+
+
+def enable(output='-'):
+    """Enable profiling; the summary is written at exit to stderr if output
+    is '-' or to the output JSON file."""
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    _profiler = Profiler(output)
+    _install()
+    atexit.register(_profiler.report)
+    return _profiler
+
+
+def setup_profiling(output=None):
+    """Enable profiling if output (usually the --profile option value) is
+    set or if the SASUTILS_PROFILE environment variable is set (to 1 or -
+    for stderr, or to a JSON file path)."""
+    if output is None:
+        output = os.environ.get(ENV_VAR)
+        if not output or output == '0':
+            return None
+        if output == '1':
+            output = '-'
+    return enable(output)
+
+
+def add_profile_argument(parser):
+    """Add --profile[=FILE] option to an argparse parser."""
+    parser.add_argument('--profile', action='store', nargs='?', const='-',
+                        metavar='FILE',
+                        help='profile sysfs I/O and external commands, print '
+                             'summary to stderr or write it as JSON to FILE '
+                             '(see also %s)' % ENV_VAR)
@@ -0,0 +1,215 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Device selection predicates
+
+A query is a list of predicates that must all match. Each predicate
+compares a record field with a value:
+
+    field=value      field!=value
+    field<value      field<=value      field>value      field>=value
+    field in v1,v2   field~glob
+
+Values that look like numbers or sizes (eg. "16TB") are compared
+numerically, other values are compared as strings. When a record field
+holds a list of values (eg. the enclosure identifiers of a device), the
+predicate matches if any of the values matches (all of them for !=).
+
+    >>> from sasutils.query import Query
+    >>> query = Query.parse(['size=16TB', 'enclosure=JBOD_01',
+    ...                      'state!=running'])
+    >>> query.matches({'size': '16.0TB', 'enclosure': ['sg12', 'JBOD_01'],
+    ...                'state': 'offline'})
+    True
+
+Predicates on a few cheap-to-read keys can also be evaluated directly on
+the sysfs node of a SAS end device (see Query.prefilter), so that devices
+which cannot match are skipped before being resolved.
+"""
+
+from fnmatch import fnmatchcase
+import operator
+import re
+
+# size suffixes, as displayed by sasutils
+SIZE_UNITS = {'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12, 'PB': 1e15}
+
+OPERATORS = {'=': operator.eq,
+             '!=': operator.ne,
+             '<': operator.lt,
+             '<=': operator.le,
+             '>': operator.gt,
+             '>=': operator.ge}
+
+PREDICATE_RE = re.compile(r'^\s*(\w+)\s*(?:(!=|<=|>=|==|=|<|>|~)|\s(in)\s)\s*'
+                          r'(.*?)\s*$')
+
+# sysfs attributes relative to a SAS end device "device" node that can be
+# used to evaluate predicates before resolving the end device
+PUSHDOWN_ATTRS = {'bay': 'sas_device/*[0-9]/bay_identifier',
+                  'model': 'target*/*[0-9]/model',
+                  'vendor': 'target*/*[0-9]/vendor',
+                  'wwid': 'target*/*[0-9]/wwid'}
+
+# wwid of devices in the slots of an enclosure (enclosure class node)
+ENCLOSURE_WWIDS = '*/device/wwid'
+
+
+def _number(value):
+    """Return value as a number if it looks like a number or a size."""
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    unit = value[-2:].upper()
+    if unit in SIZE_UNITS:
+        try:
+            return float(value[:-2]) * SIZE_UNITS[unit]
+        except ValueError:
+            pass
+    return None
+
+
+class Predicate(object):
+    """Single field comparison."""
+
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        if op == 'in':
+            self.values = [val.strip() for val in value.split(',')]
+        else:
+            self.values = [value]
+        self.numbers = [_number(val) for val in self.values]
+
+    def __repr__(self):
+        return '<%s.%s %s %s %s>' % (self.__module__, self.__class__.__name__,
+                                     self.field, self.op,
+                                     ','.join(self.values))
+
+    @property
+    def selective(self):
+        """True if only records with a given value may match."""
+        return self.op in ('=', 'in', '~')
+
+    def _match_value(self, value):
+        if value is None:
+            value = ''
+        if self.op == '~':
+            return fnmatchcase(str(value), self.values[0])
+        number = _number(value)
+        if self.op == 'in':
+            return any(number == num if number is not None and
+                       num is not None else str(value) == val
+                       for val, num in zip(self.values, self.numbers))
+        opfunc = OPERATORS[self.op]
+        if number is not None and self.numbers[0] is not None:
+            return opfunc(number, self.numbers[0])
+        return opfunc(str(value), self.values[0])
+
+    def match(self, value):
+        """Return True if value (or list of values) matches."""
+        if isinstance(value, (list, tuple, set)):
+            if self.op == '!=':
+                return all(self._match_value(val) for val in value)
+            return any(self._match_value(val) for val in value)
+        return self._match_value(value)
+
+
+def parse_predicate(text):
+    """Parse predicate string (eg. 'state!=running'), raise ValueError if
+    invalid."""
+    mobj = PREDICATE_RE.match(text)
+    if not mobj:
+        raise ValueError('invalid predicate "%s"' % text)
+    field, op, in_op, value = mobj.groups()
+    if op == '==':
+        op = '='
+    return Predicate(field, op or in_op, value)
+
+
+class Query(object):
+    """Conjunction of predicates."""
+
+    def __init__(self, predicates=()):
+        self.predicates = list(predicates)
+        # wwids of devices in enclosures matching enclosure predicates,
+        # None if not resolved
+        self.enclosure_wwids = None
+
+    @classmethod
+    def parse(cls, texts):
+        return cls(parse_predicate(text) for text in texts)
+
+    def __bool__(self):
+        return bool(self.predicates)
+
+    __nonzero__ = __bool__
+
+    @property
+    def fields(self):
+        """Set of fields used by predicates."""
+        return set(pred.field for pred in self.predicates)
+
+    def matches(self, record):
+        """Return True if record (dict) matches all predicates."""
+        return all(pred.match(record.get(pred.field))
+                   for pred in self.predicates)
+
+    #
+    # Pushdown
+    #
+
+    def resolve_enclosures(self, enclosures):
+        """Evaluate enclosure predicates on (enclosure class sysfs node,
+        identifiers) pairs, so that prefilter() can select end devices by
+        enclosure.
+
+        Devices are selected by the wwid of the devices found in the slots
+        of matching enclosures, so that all paths of a device are kept,
+        including the ones seen through another SES device of the same
+        enclosure group.
+        """
+        preds = [pred for pred in self.predicates
+                 if pred.field == 'enclosure' and pred.selective]
+        if not preds:
+            return
+        self.enclosure_wwids = set()
+        for sysfsnode, ids in enclosures:
+            if all(pred.match(ids) for pred in preds):
+                self.enclosure_wwids.update(
+                    sysfsnode.iterget(ENCLOSURE_WWIDS, True))
+
+    def prefilter(self, sysfsnode):
+        """Return False if the SAS end device of sysfs "device" node cannot
+        match; only a few sysfs attributes are read."""
+        for pred in self.predicates:
+            if not pred.selective or pred.field not in PUSHDOWN_ATTRS:
+                continue
+            values = [val for val in
+                      sysfsnode.iterget(PUSHDOWN_ATTRS[pred.field], True)
+                      if val]
+            if values and not pred.match(values):
+                return False
+        if self.enclosure_wwids is not None:
+            wwids = [val for val in
+                     sysfsnode.iterget(PUSHDOWN_ATTRS['wwid'], True) if val]
+            if wwids and not self.enclosure_wwids.intersection(wwids):
+                return False
+        return True
@@ -0,0 +1,84 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming machine-readable record output
+
+Records are dicts written one at a time, as soon as they are available,
+with a fixed schema (list of fields) given when the writer is created:
+missing fields are written as null (NDJSON) or empty (CSV) values and
+unknown fields are ignored.
+"""
+
+from collections import OrderedDict
+import csv
+import json
+import sys
+
+
+class RecordWriter(object):
+    """Base class of streaming record writers."""
+
+    def __init__(self, fields, stream=None):
+        self.fields = tuple(fields)
+        self.stream = stream or sys.stdout
+
+    def write(self, record):
+        """Write a single record (dict)."""
+        raise NotImplementedError
+
+    def close(self):
+        self.stream.flush()
+
+
+class NDJSONWriter(RecordWriter):
+    """Newline-delimited JSON writer: one JSON object per line."""
+
+    def write(self, record):
+        obj = OrderedDict((field, record.get(field)) for field in self.fields)
+        self.stream.write(json.dumps(obj) + '\n')
+        self.stream.flush()
+
+
+class CSVWriter(RecordWriter):
+    """CSV writer with a header line."""
+
+    def __init__(self, fields, stream=None):
+        RecordWriter.__init__(self, fields, stream)
+        self._writer = csv.writer(self.stream, lineterminator='\n')
+        self._writer.writerow(self.fields)
+
+    def write(self, record):
+        self._writer.writerow(['' if record.get(field) is None
+                               else record[field] for field in self.fields])
+        self.stream.flush()
+
+
+def add_record_arguments(group):
+    """Add --ndjson and --csv options to an argparse (mutually exclusive)
+    group."""
+    group.add_argument('--ndjson', action='store_true',
+                       help='stream records as newline-delimited JSON')
+    group.add_argument('--csv', action='store_true',
+                       help='stream records as CSV')
+
+
+def record_writer(pargs, fields, stream=None):
+    """Return record writer selected by command-line options or None."""
+    if getattr(pargs, 'ndjson', False):
+        return NDJSONWriter(fields, stream)
+    if getattr(pargs, 'csv', False):
+        return CSVWriter(fields, stream)
+    return None
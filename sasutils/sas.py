@@ -15,11 +15,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import logging
 
 from sasutils.scsi import SCSIDevice, SCSIHost
 from sasutils.scsi import BlockDevice, TapeDevice
-from sasutils.sysfs import SysfsDevice
+from sasutils.sysfs import SysfsDevice, hexint
 
 
 LOGGER = logging.getLogger(__name__)
@@ -29,58 +30,109 @@ LOGGER = logging.getLogger(__name__)
 #
 
 class SASPhy(SysfsDevice):
+    attr_types = {'phy_identifier': int,
+                  'invalid_dword_count': int,
+                  'loss_of_dword_sync_count': int,
+                  'phy_reset_problem_count': int,
+                  'running_disparity_error_count': int,
+                  'sas_address': hexint,
+                  'enable': int}
+
     def __init__(self, device, subsys='sas_phy'):
         SysfsDevice.__init__(self, device, subsys)
         self._port = None
 
     @property
     def port(self):
-        if self._port:
-            return self._port
-        try:
-            self._port = SASPort(self.sysfsnode.node('device/port'))
-        except KeyError:
-            pass # phy has no port
-        return self._port
+        if self._port is None:
+            with self._lock:
+                if self._port is None:
+                    try:
+                        self._port = SASPort(
+                            self.sysfsnode.node('device/port'))
+                    except KeyError:
+                        self._port = False  # phy has no port
+        return self._port or None
 
 
 class SASPort(SysfsDevice):
     def __init__(self, device, subsys='sas_port'):
         SysfsDevice.__init__(self, device, subsys)
-        self.expanders = []
-        self.end_devices = []
-        self.phys = []
+        self._expanders = None
+        self._end_devices = None
+        self._phys = None
 
-        phys = self.device.glob('phy-*')
-        for phy in phys:
-            self.phys.append(SASPhy(phy))
+    def iter_phys(self):
+        """Iterate over phys of this port (not cached)."""
+        for phy in self.device.iterglob('phy-*'):
+            yield SASPhy(phy)
 
-        end_devices = self.device.glob('end_device-*')
-        for end_device in end_devices:
-            self.end_devices.append(SASEndDevice(end_device))
+    def iter_end_devices(self):
+        """Iterate over end devices attached to this port (not cached)."""
+        for end_device in self.device.iterglob('end_device-*'):
+            yield SASEndDevice(end_device)
 
-        expanders = self.device.glob('expander-*')
-        for expander in expanders:
-            self.expanders.append(SASExpander(expander))
+    def iter_expanders(self):
+        """Iterate over expanders attached to this port (not cached)."""
+        for expander in self.device.iterglob('expander-*'):
+            yield SASExpander(expander)
+
+    @property
+    def phys(self):
+        if self._phys is None:
+            with self._lock:
+                if self._phys is None:
+                    self._phys = list(self.iter_phys())
+        return self._phys
+
+    @property
+    def end_devices(self):
+        if self._end_devices is None:
+            with self._lock:
+                if self._end_devices is None:
+                    self._end_devices = list(self.iter_end_devices())
+        return self._end_devices
+
+    @property
+    def expanders(self):
+        if self._expanders is None:
+            with self._lock:
+                if self._expanders is None:
+                    self._expanders = list(self.iter_expanders())
+        return self._expanders
 
 
 class SASNode(SysfsDevice):
     def __init__(self, device, subsys=None):
         SysfsDevice.__init__(self, device, subsys)
-        self.phys = []
-        self.ports = []
+        self._phys = None
+        self._ports = None
 
-        ports = self.device.glob('port-*')
-        for port in ports:
-            # print('node has port %s' % port.path)
-            self.ports.append(
-                SASPort(port))  # port.node(port))) #'sas_port/port-*')))
+    def iter_ports(self):
+        """Iterate over ports of this node (not cached)."""
+        for port in self.device.iterglob('port-*'):
+            yield SASPort(port)
 
-        phys = self.device.glob('phy-*')
-        for phy in phys:
-            # print('node has phy %s' % phy.path)
-            self.phys.append(
-                SASPhy(phy))  # .node(phy))) #phy.node('sas_phy/phy-*')))
+    def iter_phys(self):
+        """Iterate over phys of this node (not cached)."""
+        for phy in self.device.iterglob('phy-*'):
+            yield SASPhy(phy)
+
+    @property
+    def ports(self):
+        if self._ports is None:
+            with self._lock:
+                if self._ports is None:
+                    self._ports = list(self.iter_ports())
+        return self._ports
+
+    @property
+    def phys(self):
+        if self._phys is None:
+            with self._lock:
+                if self._phys is None:
+                    self._phys = list(self.iter_phys())
+        return self._phys
 
     def __repr__(self):
         return '<%s.%s %s phys=%d ports=%d>' % (self.__module__,
@@ -95,10 +147,17 @@ class SASNode(SysfsDevice):
         Iterate over end_devices (direct children) by scsi type.
         SCSI types are defined in the scsi module.
         """
-        for port in self.ports:
-            for end_device in port.end_devices:
-                if int(end_device.scsi_device.attrs.type) == int(device_type):
-                    yield end_device
+        device_type = int(device_type)
+
+        def prune_expanders(depth, obj):
+            return isinstance(obj, SASExpander)
+
+        for depth, obj in walk(self, maxdepth=2, prune=prune_expanders):
+            if isinstance(obj, SASEndDevice):
+                for target in obj.iter_targets():
+                    if target.attrs.typed('type') == device_type:
+                        yield obj
+                        break
 
 
 class SASHost(SASNode):
@@ -118,6 +177,12 @@ class SASExpander(SASNode):
 
 
 class SASDevice(SysfsDevice):
+    attr_types = {'bay_identifier': int,
+                  'enclosure_identifier': hexint,
+                  'phy_identifier': int,
+                  'sas_address': hexint,
+                  'scsi_target_id': int}
+
     def __init__(self, device, subsys='sas_device'):
         SysfsDevice.__init__(self, device, subsys)
 
@@ -125,16 +190,77 @@ class SASDevice(SysfsDevice):
 class SASEndDevice(SysfsDevice):
     def __init__(self, device, subsys='sas_end_device'):
         SysfsDevice.__init__(self, device, subsys)
-        self.sas_device = SASDevice(device)
-        # a single SAS end device may handle several SCSI targets
-        self.targets = []
-        for dev in device.glob('target*/*[0-9]'):
+        self._sas_device = None
+        self._targets = None
+
+    def iter_targets(self):
+        """Iterate over SCSI targets of this end device (not cached)."""
+        for dev in self.device.iterglob('target*/*[0-9]'):
             try:
-                self.targets.append(SCSIDevice(dev))
+                yield SCSIDevice(dev)
             except KeyError as err:
                 # eg. scsi_generic doesn't exist
                 LOGGER.warning("WARNING: sysfs %s weirdness: %s" % \
-                               (subsys, repr(err)))
+                               (self.name, repr(err)))
+
+    @property
+    def targets(self):
+        # a single SAS end device may handle several SCSI targets
+        if self._targets is None:
+            with self._lock:
+                if self._targets is None:
+                    self._targets = list(self.iter_targets())
+        return self._targets
+
+    @property
+    def sas_device(self):
+        if not self._sas_device:
+            with self._lock:
+                if not self._sas_device:
+                    self._sas_device = SASDevice(self.device)
+        return self._sas_device
+
+
+#
+# Streaming traversal
+#
+
+def walk(root, maxdepth=None, prune=None):
+    """
+    Iterate depth-first over the SAS topology below root (a SASHost or
+    SASExpander), yielding (depth, object) tuples: root at depth 0, then
+    its ports, the expanders and end devices attached to each port, the
+    SCSI targets of end devices, and so on.
+
+    Objects are created on the fly and not cached by their parent, so
+    memory use is bounded by the depth of the traversal. Objects deeper
+    than maxdepth are not visited. If prune(depth, obj) returns True, obj
+    (a descendant of root) and its own descendants are skipped.
+    """
+    yield 0, root
+    for item in _walk_children(root, 1, maxdepth, prune):
+        yield item
+
+
+def _iter_children(obj):
+    if isinstance(obj, SASNode):
+        return obj.iter_ports()
+    if isinstance(obj, SASPort):
+        return itertools.chain(obj.iter_expanders(), obj.iter_end_devices())
+    if isinstance(obj, SASEndDevice):
+        return obj.iter_targets()
+    return iter(())
+
+
+def _walk_children(obj, depth, maxdepth, prune):
+    if maxdepth is not None and depth > maxdepth:
+        return
+    for child in _iter_children(obj):
+        if prune is not None and prune(depth, child):
+            continue
+        yield depth, child
+        for item in _walk_children(child, depth + 1, maxdepth, prune):
+            yield item
 
 
 #
@@ -153,7 +279,10 @@ class SASBlockDevice(BlockDevice):
     @property
     def end_device(self):
         if not self._end_device:
-            self._end_device = SASEndDevice(self.sysfsnode.node('../../../..'))
+            with self._lock:
+                if not self._end_device:
+                    self._end_device = SASEndDevice(
+                        self.sysfsnode.node('../../../..'))
         return self._end_device
 
 
@@ -169,5 +298,8 @@ class SASTapeDevice(TapeDevice):
     @property
     def end_device(self):
         if not self._end_device:
-            self._end_device = SASEndDevice(self.sysfsnode.node('../../../..'))
+            with self._lock:
+                if not self._end_device:
+                    self._end_device = SASEndDevice(
+                        self.sysfsnode.node('../../../..'))
         return self._end_device
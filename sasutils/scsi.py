@@ -18,7 +18,7 @@
 import re
 import warnings
 
-from sasutils.sysfs import SysfsDevice, SysfsObject
+from sasutils.sysfs import SysfsDevice, SysfsObject, autoint, hexint, raw
 
 
 # DEVICE TYPES
@@ -71,6 +71,12 @@ def strtype(scsi_type):
 
 
 class SCSIHost(SysfsDevice):
+    attr_types = {'can_queue': int,
+                  'cmd_per_lun': int,
+                  'host_busy': int,
+                  'host_sas_address': hexint,
+                  'sg_tablesize': int,
+                  'unique_id': int}
 
     def __init__(self, device, subsys='scsi_host'):
         SysfsDevice.__init__(self, device, subsys)
@@ -96,40 +102,97 @@ class SCSIDevice(SysfsObject):
 
     SCSIDevice -> array_device (ArrayDevice) -> enclosure (EnclosureDevice)
     """
+    attr_types = {'device_blocked': int,
+                  'iocounterbits': int,
+                  'iodone_cnt': autoint,
+                  'ioerr_cnt': autoint,
+                  'iorequest_cnt': autoint,
+                  'queue_depth': int,
+                  'sas_address': hexint,
+                  'scsi_level': int,
+                  'timeout': int,
+                  'type': int,
+                  'vpd_pg80': raw,
+                  'vpd_pg83': raw}
 
     def __init__(self, device):
         # scsi_device attrs attached to device
         SysfsObject.__init__(self, device)
         self.scsi_generic = SCSIGeneric(self.sysfsnode)
-        try:
-            self.scsi_disk = SCSIDisk(self.sysfsnode)
-        except KeyError:
-            self.scsi_disk = None
-        try:
-            self.block = BlockDevice(self.sysfsnode, scsi_device=self)
-        except KeyError:
-            self.block = None
-        try:
-            self.tape = TapeDevice(self.sysfsnode, scsi_device=self)
-        except KeyError:
-            self.tape = None
-        try:
-            # define scsi type string as strtype for convenience
-            self.strtype = strtype(self.attrs.type)
-        except AttributeError:
-            self.strtype = None
+        # the following are probed on first access (False means not found)
+        self._scsi_disk = None
+        self._block = None
+        self._tape = None
+        self._strtype = None
         self._array_device = None
 
+    def json_serialize(self):
+        data = SysfsObject.json_serialize(self)
+        for name in ('scsi_disk', 'block', 'tape', 'strtype'):
+            del data['_' + name]
+            data[name] = getattr(self, name)
+        return data
+
+    @property
+    def scsi_disk(self):
+        if self._scsi_disk is None:
+            with self._lock:
+                if self._scsi_disk is None:
+                    try:
+                        self._scsi_disk = SCSIDisk(self.sysfsnode)
+                    except KeyError:
+                        self._scsi_disk = False
+        return self._scsi_disk or None
+
+    @property
+    def block(self):
+        if self._block is None:
+            with self._lock:
+                if self._block is None:
+                    try:
+                        self._block = BlockDevice(self.sysfsnode,
+                                                  scsi_device=self)
+                    except KeyError:
+                        self._block = False
+        return self._block or None
+
+    @property
+    def tape(self):
+        if self._tape is None:
+            with self._lock:
+                if self._tape is None:
+                    try:
+                        self._tape = TapeDevice(self.sysfsnode,
+                                                scsi_device=self)
+                    except KeyError:
+                        self._tape = False
+        return self._tape or None
+
+    @property
+    def strtype(self):
+        """scsi type string, defined for convenience"""
+        if self._strtype is None:
+            with self._lock:
+                if self._strtype is None:
+                    try:
+                        self._strtype = strtype(self.attrs.type)
+                    except AttributeError:
+                        self._strtype = False
+        return self._strtype or None
+
     @property
     def array_device(self):
-        if not self._array_device:
-            try:
-                array_node = self.sysfsnode.node('enclosure_device:*')
-                self._array_device = ArrayDevice(array_node)
-            except KeyError:
-                # no enclosure_device, this may happen due to sysfs issues
-                pass
-        return self._array_device
+        if self._array_device is None:
+            with self._lock:
+                if self._array_device is None:
+                    try:
+                        array_node = self.sysfsnode.node('enclosure_device:*')
+                        self._array_device = ArrayDevice(array_node)
+                    except KeyError:
+                        # no enclosure_device, this may happen due to sysfs
+                        # issues
+                        self._array_device = False
+        return self._array_device or None
 
 
 #
@@ -144,6 +207,10 @@ class EnclosureDevice(SCSIDevice):
 
 
 class ArrayDevice(SysfsObject):
+    attr_types = {'active': int,
+                  'fault': int,
+                  'locate': int,
+                  'slot': int}
 
     def __init__(self, sysfsnode):
         SysfsObject.__init__(self, sysfsnode)
@@ -157,13 +224,20 @@ class BlockDevice(SysfsDevice):
     """
     scsi_disk
     """
+    attr_types = {'capability': hexint,
+                  'ext_range': int,
+                  'range': int,
+                  'removable': int,
+                  'ro': int,
+                  'size': int}
+
     def __init__(self, device, subsys='block', scsi_device=None):
         SysfsDevice.__init__(self, device, subsys, sysfsdev_pattern='sd*')
         self._scsi_device = scsi_device
         self.queue = SysfsObject(self.sysfsnode.node('queue'))
 
     def json_serialize(self):
-        data = dict(self.__dict__)
+        data = SysfsObject.json_serialize(self)
         if self._scsi_device is not None:
             data['_scsi_device'] = repr(self._scsi_device)
         return data
@@ -178,16 +252,20 @@ class BlockDevice(SysfsDevice):
     @property
     def scsi_device(self):
         if not self._scsi_device:
-            self._scsi_device = SCSIDevice(self.device)
+            with self._lock:
+                if not self._scsi_device:
+                    self._scsi_device = SCSIDevice(self.device)
         return self._scsi_device
 
     def sizebytes(self):
         """Return block device size in bytes"""
-        blk_size = float(self.attrs.size)
+        blk_size = self.attrs.typed('size')
+        if blk_size is None:
+            raise AttributeError('%s has no valid size' % self.name)
         # Block size is expressed in 512b sectors regardless of
         # underlaying disk structure.
         # See https://goo.gl/L8GZCG for details
-        return blk_size * 512
+        return float(blk_size * 512)
 
     def dm(self):
         """Return /dev/mapper device name if present"""
@@ -214,5 +292,7 @@ class TapeDevice(SysfsDevice):
     @property
     def scsi_device(self):
         if not self._scsi_device:
-            self._scsi_device = SCSIDevice(self.device)
+            with self._lock:
+                if not self._scsi_device:
+                    self._scsi_device = SCSIDevice(self.device)
         return self._scsi_device
@@ -20,9 +20,13 @@
 Requires sg_ses from sg3_utils (recent version, like 1.77).
 """
 
+import errno
 import logging
 import re
-import subprocess
+
+from sasutils.command import get_executor, run_command
+from sasutils.scsi import EnclosureDevice
+from sasutils.sysfs import sysfs
 
 __author__ = 'sthiell@stanford.edu (Stephane Thiell)'
 
@@ -37,11 +41,11 @@ def ses_get_snic_nickname(sg_name):
     cmdargs = ['sg_ses', '--status', '/dev/' + sg_name]
     LOGGER.debug('ses_get_snic_nickname: executing: %s', cmdargs)
     try:
-        stdout, stderr = subprocess.Popen(cmdargs,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE).communicate()
+        result = run_command(cmdargs)
+        stdout, stderr = result.stdout, result.stderr
     except OSError as err:
-        LOGGER.warning('ses_get_snic_nickname: %s', err)
+        # already logged by run_command()
+        LOGGER.debug('ses_get_snic_nickname: %s', err)
         return None
 
     for line in stderr.decode("utf-8").splitlines():
@@ -59,11 +63,11 @@ def ses_get_snic_nickname(sg_name):
     cmdargs = ['sg_ses', '--page=snic', '-I0', '/dev/' + sg_name]
     LOGGER.debug('ses_get_snic_nickname: executing: %s', cmdargs)
     try:
-        stdout, stderr = subprocess.Popen(cmdargs,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE).communicate()
+        result = run_command(cmdargs)
+        stdout, stderr = result.stdout, result.stderr
     except OSError as err:
-        LOGGER.warning('ses_get_snic_nickname: %s', err)
+        # already logged by run_command()
+        LOGGER.debug('ses_get_snic_nickname: %s', err)
         return None
 
     for line in stderr.decode("utf-8", errors='backslashreplace').splitlines():
@@ -75,6 +79,45 @@ def ses_get_snic_nickname(sg_name):
         if mobj:
             return mobj.group(1)
 
+
+def _enclosure_sg_names():
+    """Return sg names of all SCSI enclosures."""
+    sg_names = []
+    try:
+        for node in sysfs.node('class').node('enclosure'):
+            try:
+                enclosure = EnclosureDevice(node.node('device'))
+                sg_names.append(enclosure.scsi_generic.name)
+            except KeyError:
+                continue
+    except KeyError:
+        pass  # no enclosure class in sysfs
+    return sg_names
+
+
+def ses_get_snic_nicknames(sg_names=None):
+    """Get subenclosure nicknames of several enclosures (default is all SCSI
+    enclosures) in parallel; return a dict of sg name -> nickname (or
+    None). Results are also kept in the command cache."""
+    if sg_names is None:
+        sg_names = _enclosure_sg_names()
+    sg_names = list(sg_names)
+    return dict(zip(sg_names,
+                    get_executor().map(ses_get_snic_nickname, sg_names)))
+
+
+def ses_prefetch_snic_nicknames(sg_names=None):
+    """Start getting subenclosure nicknames of several enclosures (default
+    is all SCSI enclosures) in the background, without waiting for them.
+    Later ses_get_snic_nickname() calls wait for their own enclosure only,
+    thanks to the command cache. Return the list of futures."""
+    if sg_names is None:
+        sg_names = _enclosure_sg_names()
+    executor = get_executor()
+    return [executor.submit(ses_get_snic_nickname, sg_name)
+            for sg_name in sg_names]
+
+
 def ses_set_snic_nickname(sg_name, nickname):
     """Set subenclosure nickname (SES-2) [snic]"""
     support_snic = False
@@ -83,9 +126,8 @@ def ses_set_snic_nickname(sg_name, nickname):
     cmdargs = ['sg_ses', '--status', '/dev/' + sg_name]
     LOGGER.debug('ses_set_snic_nickname: executing: %s', cmdargs)
     try:
-        stdout, stderr = subprocess.Popen(cmdargs,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE).communicate()
+        result = run_command(cmdargs)
+        stdout, stderr = result.stdout, result.stderr
     except OSError as err:
         LOGGER.error('ses_set_snic_nickname: %s', err)
         return
@@ -105,9 +147,8 @@ def ses_set_snic_nickname(sg_name, nickname):
     cmdargs = ['sg_ses', '--control', "--nickname=%s" % nickname,
                '/dev/' + sg_name]
     try:
-        stdout, stderr = subprocess.Popen(cmdargs,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE).communicate()
+        result = run_command(cmdargs, cache=False)
+        stdout, stderr = result.stdout, result.stderr
     except OSError as err:
         LOGGER.error('ses_set_snic_nickname: %s', err)
 
@@ -121,9 +162,8 @@ def _ses_get_ed_line(sg_name):
     """Helper function to get element descriptor associated lines."""
     cmdargs = ['sg_ses', '--page=ed', '--join', '/dev/' + sg_name]
     LOGGER.debug('ses_get_ed_metrics: executing: %s', cmdargs)
-    stdout, stderr = subprocess.Popen(cmdargs,
-                                      stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE).communicate()
+    result = run_command(cmdargs)
+    stdout, stderr = result.stdout, result.stderr
 
     for line in stderr.decode("utf-8", errors='backslashreplace').splitlines():
         LOGGER.debug('ses_get_ed_metrics: sg_ses(stderr): %s', line)
@@ -0,0 +1,213 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SCSI INQUIRY of VPD pages over the SG_IO ioctl
+
+Used when the kernel does not provide vpd_pg80/vpd_pg83 in sysfs, instead
+of running scsi_id for each device. Commands are sent by a transport
+object, SGIOTransport by default, that can be replaced by
+CapturedTransport to decode captured page buffers without devices.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+import errno
+import fcntl
+import logging
+import os
+from struct import unpack_from
+
+LOGGER = logging.getLogger(__name__)
+
+# from scsi/sg.h
+SG_IO = 0x2285
+SG_DXFER_FROM_DEV = -3
+SG_INFO_OK_MASK = 0x1
+
+INQUIRY = 0x12
+INQUIRY_EVPD = 0x01
+
+# initial allocation length, enough for most VPD pages
+INQUIRY_ALLOC_LEN = 512
+# maximum allocation length of INQUIRY
+INQUIRY_MAX_ALLOC_LEN = 0xffff
+
+SENSE_LEN = 32
+
+# default command timeout in seconds
+DEFAULT_TIMEOUT = 10
+
+# default number of concurrent INQUIRY commands for batches
+DEFAULT_JOBS = 16
+
+
+class _SgIoHdr(ctypes.Structure):
+    """struct sg_io_hdr"""
+    _fields_ = [('interface_id', ctypes.c_int),
+                ('dxfer_direction', ctypes.c_int),
+                ('cmd_len', ctypes.c_ubyte),
+                ('mx_sb_len', ctypes.c_ubyte),
+                ('iovec_count', ctypes.c_ushort),
+                ('dxfer_len', ctypes.c_uint),
+                ('dxferp', ctypes.c_void_p),
+                ('cmdp', ctypes.c_void_p),
+                ('sbp', ctypes.c_void_p),
+                ('timeout', ctypes.c_uint),
+                ('flags', ctypes.c_uint),
+                ('pack_id', ctypes.c_int),
+                ('usr_ptr', ctypes.c_void_p),
+                ('status', ctypes.c_ubyte),
+                ('masked_status', ctypes.c_ubyte),
+                ('msg_status', ctypes.c_ubyte),
+                ('sb_len_wr', ctypes.c_ubyte),
+                ('host_status', ctypes.c_ushort),
+                ('driver_status', ctypes.c_ushort),
+                ('resid', ctypes.c_int),
+                ('duration', ctypes.c_uint),
+                ('info', ctypes.c_uint)]
+
+
+def inquiry_cdb(page, length):
+    """Return INQUIRY CDB for VPD page with allocation length."""
+    return bytes((INQUIRY, INQUIRY_EVPD, page, length >> 8, length & 0xff, 0))
+
+
+class SGIOTransport(object):
+    """Send SCSI commands to sg devices with the SG_IO ioctl."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, devdir='/dev'):
+        self.timeout = timeout
+        self.devdir = devdir
+
+    def execute(self, sg_name, cdb, length):
+        """Send data-in command cdb to device sg_name and return data
+        received (at most length bytes); raise OSError on failure."""
+        cmd = ctypes.create_string_buffer(bytes(cdb), len(cdb))
+        data = ctypes.create_string_buffer(length)
+        sense = ctypes.create_string_buffer(SENSE_LEN)
+
+        hdr = _SgIoHdr()
+        hdr.interface_id = ord('S')
+        hdr.dxfer_direction = SG_DXFER_FROM_DEV
+        hdr.cmd_len = len(cdb)
+        hdr.mx_sb_len = SENSE_LEN
+        hdr.dxfer_len = length
+        hdr.dxferp = ctypes.addressof(data)
+        hdr.cmdp = ctypes.addressof(cmd)
+        hdr.sbp = ctypes.addressof(sense)
+        hdr.timeout = int(self.timeout * 1000)
+
+        fd = os.open(os.path.join(self.devdir, sg_name),
+                     os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            fcntl.ioctl(fd, SG_IO, hdr)
+        finally:
+            os.close(fd)
+
+        if (hdr.info & SG_INFO_OK_MASK) or hdr.status or hdr.host_status \
+                or hdr.driver_status:
+            raise OSError(errno.EIO, 'SG_IO command 0x%02x failed on %s '
+                          '(status 0x%x host 0x%x driver 0x%x)'
+                          % (cdb[0], sg_name, hdr.status, hdr.host_status,
+                             hdr.driver_status))
+        return data.raw[:length - max(hdr.resid, 0)]
+
+
+class CapturedTransport(object):
+    """Serve INQUIRY commands from captured VPD page buffers.
+
+    pages is a dict of sg device name -> dict of VPD page code -> buffer.
+    Data is truncated to the allocation length like a device would do.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.commands = []
+
+    def execute(self, sg_name, cdb, length):
+        self.commands.append((sg_name, bytes(cdb)))
+        if cdb[0] != INQUIRY or not cdb[1] & INQUIRY_EVPD:
+            raise OSError(errno.EIO, 'unsupported command 0x%02x' % cdb[0])
+        try:
+            pagebuf = self.pages[sg_name][cdb[2]]
+        except KeyError:
+            raise OSError(errno.EIO, 'VPD page 0x%02x not supported by %s'
+                          % (cdb[2], sg_name))
+        return bytes(pagebuf[:min(length, (cdb[3] << 8) | cdb[4])])
+
+
+_transport = None
+
+
+def get_transport():
+    """Return the default transport."""
+    global _transport
+    if _transport is None:
+        _transport = SGIOTransport()
+    return _transport
+
+
+def set_transport(transport):
+    """Set the default transport (eg. a CapturedTransport) and return the
+    previous one."""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
+
+
+def inquiry_vpd(sg_name, page, transport=None):
+    """Return VPD page buffer of sg device sg_name; raise OSError on
+    failure."""
+    transport = transport or get_transport()
+    length = INQUIRY_ALLOC_LEN
+    while True:
+        pagebuf = transport.execute(sg_name, inquiry_cdb(page, length),
+                                    length)
+        if len(pagebuf) < 4 or pagebuf[1] != page:
+            raise OSError(errno.EIO, 'bad VPD page 0x%02x from %s'
+                          % (page, sg_name))
+        needed = 4 + unpack_from('>H', pagebuf, 2)[0]
+        if needed <= length or length >= INQUIRY_MAX_ALLOC_LEN:
+            return pagebuf[:needed]
+        # page truncated, retry with the size reported by the device
+        length = min(needed, INQUIRY_MAX_ALLOC_LEN)
+
+
+def inquiry_vpd_many(sg_names, pages=(0x80, 0x83), jobs=DEFAULT_JOBS,
+                     transport=None):
+    """Read VPD pages of many sg devices concurrently.
+
+    Return a dict of sg device name -> dict of page -> buffer, or None if
+    the page could not be read.
+    """
+    transport = transport or get_transport()
+    sg_names = list(sg_names)
+
+    def read_pages(sg_name):
+        result = {}
+        for page in pages:
+            try:
+                result[page] = inquiry_vpd(sg_name, page, transport)
+            except OSError as err:
+                LOGGER.debug('INQUIRY VPD 0x%02x of %s: %s', page, sg_name,
+                             err)
+                result[page] = None
+        return result
+
+    if len(sg_names) <= 1 or jobs <= 1:
+        return dict((sg_name, read_pages(sg_name)) for sg_name in sg_names)
+    with ThreadPoolExecutor(max_workers=min(jobs, len(sg_names))) as pool:
+        return dict(zip(sg_names, pool.map(read_pages, sg_names)))
@@ -41,7 +41,8 @@ Requires smp_utils.
 """
 
 import re
-from subprocess import check_output
+
+from .command import run_command
 from .sysfs import SysfsObject
 
 __author__ = 'sthiell@stanford.edu (Stephane Thiell)'
@@ -110,7 +111,8 @@ class SMPDiscover(object):
         self._attached_phys = {}
         self._detached_phys = {}
 
-        output = check_output(('smp_discover', self.bsg))
+        result = run_command(('smp_discover', self.bsg)).check()
+        output = result.stdout.decode('utf-8', errors='backslashreplace')
 
         # phy  12:U:attached:[5001636001a42e3f:13 exp t(SMP)]  12 Gbps
         # phy  28:U:attached:[500605b00ab06f40:07  i(SSP+STP+SMP)]  12 Gbps
@@ -0,0 +1,471 @@
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact indexed snapshot of a SAS topology
+
+The SAS topology found in sysfs (hosts, ports, phys, expanders, end
+devices, SCSI devices and their block, generic, tape and array devices)
+is captured with all readable attributes in a single file. The file is
+memory-mapped when loaded and values are only decoded on access, so that
+opening a snapshot and looking up a few nodes does not depend on its size.
+
+File layout (little-endian):
+
+    header      magic, version, table sizes and offsets
+    strings     (nstrings + 1) x uint32 offsets, then UTF-8 string data
+    nodes       nnodes x (kind, name, parent, child start, nchildren,
+                          attr start, nattrs) uint32
+    children    nchildren x uint32 node indexes
+    attrs       nattrs x (key, blob offset, blob length) uint32
+    blobs       attribute values (raw bytes, identical values shared)
+
+All kinds, names and attribute keys are stored in the string table, which
+is sorted so that strings can be looked up by bisection and compared by
+index. Attributes of a node are sorted by key. Node 0 is the root node.
+
+Snapshots are written from /sys by default, or from any sysfs tree (eg. an
+extracted support bundle) given its sas_host class node:
+
+    >>> from sasutils.snapshot import Snapshot, write_snapshot
+    >>> write_snapshot('host1.snap')
+    >>> write_snapshot('host2.snap', SysfsNode('host2/sys/class/sas_host'))
+    >>> with Snapshot('host1.snap') as snap:
+    ...     for node in snap.find(kind='end_device'):
+    ...         print(node.path, node.attrs.get('sas_address'))
+"""
+
+import logging
+import mmap
+import os
+import stat
+import struct
+
+from sasutils.sas import SASEndDevice, SASExpander, SASHost, SASNode
+from sasutils.sas import SASPort, walk
+from sasutils.scsi import SCSIDevice
+from sasutils.sysfs import decode_text, sysfs
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'SASSNAP1'
+VERSION = 1
+
+HEADER_FMT = '<8s12I'
+HEADER_SIZE = 64
+
+NODE_FMT = '<7I'
+NODE_SIZE = struct.calcsize(NODE_FMT)
+ATTR_FMT = '<3I'
+ATTR_SIZE = struct.calcsize(ATTR_FMT)
+
+# parent index of the root node
+NO_PARENT = 0xffffffff
+
+
+#
+# Capture
+#
+
+def _read_attrs(sysfsnode):
+    """Return list of (key, bytes) of readable attribute files of a sysfs
+    node."""
+    attrs = []
+    try:
+        entries = list(os.scandir(sysfsnode.path))
+    except OSError as err:
+        LOGGER.warning('snapshot: %s', err)
+        return attrs
+    for entry in entries:
+        try:
+            if not entry.is_file(follow_symlinks=False) or \
+                    not entry.stat().st_mode & stat.S_IRUSR:
+                continue
+            attrs.append((entry.name, sysfsnode.getraw(entry.name)))
+        except (KeyError, OSError):
+            # eg. attributes that cannot be read on this device
+            continue
+    return attrs
+
+
+class _SnapshotBuilder(object):
+    """Collect nodes and attributes and write them as a snapshot file."""
+
+    def __init__(self):
+        # list of [kind, name, parent index, children, attrs]
+        self.nodes = []
+        self.add_node('root', '', None, [])
+
+    def add_node(self, kind, name, parent, attrs):
+        index = len(self.nodes)
+        self.nodes.append([kind, name, parent, [], attrs])
+        if parent is not None:
+            self.nodes[parent][3].append(index)
+        return index
+
+    def add_object(self, kind, obj, parent, *extra):
+        """Add sysfs object obj, with attributes of extra sysfs objects
+        (overridden by its own attributes)."""
+        attrs = {}
+        for sysfsobj in extra + (obj,):
+            attrs.update(_read_attrs(sysfsobj.sysfsnode))
+        return self.add_node(kind, obj.name, parent, sorted(attrs.items()))
+
+    def add_phys(self, phys, parent):
+        for phy in phys:
+            self.add_object('phy', phy, parent)
+
+    def add_scsi_device(self, scsi_device, parent):
+        index = self.add_object('scsi_device', scsi_device, parent)
+        self.add_object('scsi_generic', scsi_device.scsi_generic, index)
+        for kind in ('block', 'tape', 'array_device'):
+            obj = getattr(scsi_device, kind)
+            if obj:
+                self.add_object(kind, obj, index)
+        return index
+
+    def add_host(self, sas_host):
+        """Add topology below sas_host."""
+        # node indexes of the current branch, by depth
+        stack = []
+        for depth, obj in walk(sas_host):
+            del stack[depth:]
+            parent = stack[depth - 1] if depth else 0
+            if isinstance(obj, SASPort):
+                index = self.add_object('port', obj, parent)
+                self.add_phys(obj.iter_phys(), index)
+            elif isinstance(obj, SCSIDevice):
+                index = self.add_scsi_device(obj, parent)
+            elif isinstance(obj, SASEndDevice):
+                index = self.add_object('end_device', obj, parent,
+                                        obj.sas_device)
+            elif isinstance(obj, SASExpander):
+                index = self.add_object('expander', obj, parent,
+                                        obj.sas_device)
+            else:
+                index = self.add_object('host', obj, parent, obj.scsi_host)
+            if isinstance(obj, SASNode):
+                # phys of ports are added with their port
+                ported = set(str(phy) for phy in
+                             obj.device.iterglob('port-*/phy-*'))
+                self.add_phys((phy for phy in obj.iter_phys()
+                               if phy.name not in ported), index)
+            stack.append(index)
+
+    def write(self, path):
+        strings = set()
+        for kind, name, _, _, attrs in self.nodes:
+            strings.update((kind, name))
+            strings.update(key for key, _ in attrs)
+        strings = sorted(strings)
+        strindex = dict((string, idx) for idx, string in enumerate(strings))
+
+        strdata = bytearray()
+        stroffsets = []
+        for string in strings:
+            stroffsets.append(len(strdata))
+            strdata += string.encode('utf-8')
+        stroffsets.append(len(strdata))
+
+        nodes = bytearray()
+        children = []
+        attrtable = bytearray()
+        nattrs = 0
+        blobs = bytearray()
+        bloboffsets = {}  # shared blobs of identical values
+        for kind, name, parent, childlist, attrs in self.nodes:
+            nodes += struct.pack(NODE_FMT, strindex[kind], strindex[name],
+                                 NO_PARENT if parent is None else parent,
+                                 len(children), len(childlist), nattrs,
+                                 len(attrs))
+            children.extend(childlist)
+            for key, value in attrs:
+                offset = bloboffsets.get(value)
+                if offset is None:
+                    offset = bloboffsets[value] = len(blobs)
+                    blobs += value
+                attrtable += struct.pack(ATTR_FMT, strindex[key], offset,
+                                         len(value))
+                nattrs += 1
+
+        stroff_off = HEADER_SIZE
+        strdata_off = stroff_off + 4 * len(stroffsets)
+        nodes_off = strdata_off + len(strdata)
+        children_off = nodes_off + len(nodes)
+        attrs_off = children_off + 4 * len(children)
+        blobs_off = attrs_off + len(attrtable)
+
+        tmppath = '%s.%d' % (path, os.getpid())
+        with open(tmppath, 'wb') as fp:
+            header = struct.pack(HEADER_FMT, MAGIC, VERSION, len(strings),
+                                 len(self.nodes), len(children), nattrs,
+                                 stroff_off, strdata_off, nodes_off,
+                                 children_off, attrs_off, blobs_off,
+                                 len(blobs))
+            fp.write(header.ljust(HEADER_SIZE, b'\x00'))
+            fp.write(struct.pack('<%dI' % len(stroffsets), *stroffsets))
+            fp.write(strdata)
+            fp.write(nodes)
+            fp.write(struct.pack('<%dI' % len(children), *children))
+            fp.write(attrtable)
+            fp.write(blobs)
+        os.rename(tmppath, path)
+
+
+def write_snapshot(path, sysfsnode=None):
+    """Write snapshot of the SAS topology to path, from sysfs sas_host
+    class node (by default, /sys/class/sas_host). Return number of nodes."""
+    if sysfsnode is None:
+        sysfsnode = sysfs.node('class').node('sas_host')
+    builder = _SnapshotBuilder()
+    for node in sysfsnode:
+        builder.add_host(SASHost(node.node('device')))
+    builder.write(path)
+    return len(builder.nodes)
+
+
+#
+# Loading
+#
+
+class SnapshotAttributes(object):
+    """Read-only mapping of attributes of a snapshot node, decoded on
+    access. Values are text, like SysfsAttributes."""
+
+    def __init__(self, snapshot, start, count):
+        self._snapshot = snapshot
+        self._start = start
+        self._count = count
+
+    def _record(self, idx):
+        return struct.unpack_from(ATTR_FMT, self._snapshot._attrs,
+                                  (self._start + idx) * ATTR_SIZE)
+
+    def _find(self, key):
+        """Return (blob offset, length) of key or None."""
+        keyidx = self._snapshot._string_index(key)
+        if keyidx is None:
+            return None
+        # attributes are sorted by key string index
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            midkey, offset, length = self._record(mid)
+            if midkey < keyidx:
+                lo = mid + 1
+            elif midkey > keyidx:
+                hi = mid
+            else:
+                return offset, length
+        return None
+
+    def getraw(self, key):
+        """Return raw attribute value (bytes); raise KeyError if missing."""
+        found = self._find(key)
+        if found is None:
+            raise KeyError(key)
+        offset, length = found
+        return self._snapshot._blobs[offset:offset + length].tobytes()
+
+    def get(self, key, default=None):
+        try:
+            return decode_text(self.getraw(key))
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for idx in range(self._count):
+            yield self._snapshot.string(self._record(idx)[0])
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self.get(key)) for key in self]
+
+
+class SnapshotNode(object):
+    """Node of a snapshot."""
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+        self._record = struct.unpack_from(NODE_FMT, snapshot._nodes,
+                                          index * NODE_SIZE)
+
+    def __repr__(self):
+        return '<%s.%s %s %s>' % (self.__module__, self.__class__.__name__,
+                                  self.kind, self.path)
+
+    def __eq__(self, other):
+        return self.snapshot is other.snapshot and self.index == other.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    @property
+    def kind(self):
+        return self.snapshot.string(self._record[0])
+
+    @property
+    def name(self):
+        return self.snapshot.string(self._record[1])
+
+    @property
+    def parent(self):
+        parent = self._record[2]
+        if parent == NO_PARENT:
+            return None
+        return SnapshotNode(self.snapshot, parent)
+
+    @property
+    def children(self):
+        start, count = self._record[3:5]
+        return [SnapshotNode(self.snapshot, index) for index in
+                self.snapshot._children[start:start + count]]
+
+    @property
+    def attrs(self):
+        return SnapshotAttributes(self.snapshot, *self._record[5:7])
+
+    @property
+    def path(self):
+        """Names of ancestors and of this node, joined by '/'."""
+        names = []
+        node = self
+        while node.index:
+            names.append(node.name)
+            node = node.parent
+        return '/'.join(reversed(names))
+
+
+class Snapshot(object):
+    """Snapshot file loaded with mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        try:
+            header = struct.unpack_from(HEADER_FMT, self._mm)
+        except struct.error:
+            header = (None, None)
+        if header[0] != MAGIC or header[1] != VERSION:
+            self._mm.close()
+            raise ValueError('%s: not a snapshot file' % path)
+        self.nstrings, self.nnodes, nchildren, nattrs, stroff_off, \
+            strdata_off, nodes_off, children_off, attrs_off, blobs_off, \
+            blobs_size = header[2:]
+
+        self._view = view = memoryview(self._mm)
+        self._stroffsets = view[stroff_off:strdata_off]
+        self._strdata = view[strdata_off:nodes_off]
+        self._nodes = view[nodes_off:children_off]
+        self._children = Snapshot._uint32_array(
+            view[children_off:attrs_off], nchildren)
+        self._attrs = view[attrs_off:blobs_off]
+        self._blobs = view[blobs_off:blobs_off + blobs_size]
+        self._strings = {}  # decoded strings cache
+
+    @staticmethod
+    def _uint32_array(view, count):
+        """Return sequence of count little-endian uint32 in view."""
+        if struct.pack('=I', 1) == struct.pack('<I', 1):
+            return view.cast('I')
+        return struct.unpack('<%dI' % count, view)
+
+    def close(self):
+        """Close snapshot file; nodes and values must not be used after."""
+        if self._mm is None:
+            return
+        for view in (self._stroffsets, self._strdata, self._nodes,
+                     self._children, self._attrs, self._blobs, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mm.close()
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.nnodes
+
+    def __iter__(self):
+        for index in range(self.nnodes):
+            yield SnapshotNode(self, index)
+
+    def string(self, idx):
+        """Return string of index idx from the string table."""
+        string = self._strings.get(idx)
+        if string is None:
+            start, end = struct.unpack_from('<II', self._stroffsets, idx * 4)
+            string = bytes(self._strdata[start:end]).decode('utf-8')
+            self._strings[idx] = string
+        return string
+
+    def _string_index(self, string):
+        """Return index of string in the string table or None."""
+        lo, hi = 0, self.nstrings
+        while lo < hi:
+            mid = (lo + hi) // 2
+            midstr = self.string(mid)
+            if midstr < string:
+                lo = mid + 1
+            elif midstr > string:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    @property
+    def root(self):
+        return SnapshotNode(self, 0)
+
+    def node(self, index):
+        return SnapshotNode(self, index)
+
+    def find(self, kind=None, name=None):
+        """Iterate over nodes by kind and/or name."""
+        wanted = []
+        for field, string in ((0, kind), (1, name)):
+            if string is not None:
+                idx = self._string_index(string)
+                if idx is None:
+                    return
+                wanted.append((field, idx))
+        for index, record in enumerate(struct.iter_unpack(NODE_FMT,
+                                                          self._nodes)):
+            if all(record[field] == idx for field, idx in wanted):
+                yield SnapshotNode(self, index)
@@ -22,14 +22,52 @@ except ImportError:
     from collections import MutableMapping
 import json
 import glob
+import os
 from os import access, listdir, readlink, R_OK
 from os.path import basename, isdir, isfile, join, realpath
 import re
+import threading
+
+# SYSFS_ROOT may be overridden by environment, eg. to use a test sysfs tree
+SYSFS_ROOT = os.environ.get('SYSFS_ROOT') or '/sys'
+
+# Initial size of the per-thread buffer used to read sysfs files
+READ_BUFFER_SIZE = 4096
+
+_read_buffer = threading.local()
+
+
+def read_sysfs_file(path):
+    """Read a sysfs file into the per-thread reusable buffer and return a
+    memoryview of its content, valid until the next read by the thread.
+    Raise OSError on failure."""
+    buf = getattr(_read_buffer, 'buf', None)
+    if buf is None:
+        buf = _read_buffer.buf = bytearray(READ_BUFFER_SIZE)
+    size = 0
+    with open(path, 'rb', buffering=0) as fp:
+        while True:
+            if size == len(buf):
+                # grow in a new buffer: views of the old one stay valid
+                newbuf = bytearray(2 * len(buf))
+                newbuf[:size] = buf[:size]
+                buf = _read_buffer.buf = newbuf
+            with memoryview(buf) as view:
+                count = fp.readinto(view[size:])
+            if not count:
+                break
+            size += count
+    return memoryview(buf)[:size]
+
+
+_NON_ASCII = re.compile('[^\x00-\x7f]')
 
-SYSFS_ROOT = '/sys'
 
 # Some VPDs contain weird characters...
 def sanitize_sysfs_value(value):
+    if isinstance(value, str) and not _NON_ASCII.search(value):
+        # fast path, nothing to replace
+        return value.strip('\x00')
     try:
         value2 = value.strip('\x00')
     except TypeError:
@@ -40,6 +78,42 @@ def sanitize_sysfs_value(value):
     return value2.encode('ascii', errors='replace').decode()
 
 
+# Attribute type converters, called with the raw content of sysfs files
+def hexint(value):
+    """Convert hexadecimal attribute (eg. 0x5000cca2610b3d4b) to int."""
+    return int(value, 16)
+
+
+def autoint(value):
+    """Convert decimal or 0x-prefixed hexadecimal attribute to int."""
+    value = value.strip()
+    return int(value, 16 if value[:2] in (b'0x', '0x') else 10)
+
+
+def text(value):
+    """Convert attribute to printable text (default type)."""
+    if isinstance(value, bytes):
+        try:
+            value = value.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            pass
+    return sanitize_sysfs_value(value)
+
+
+def raw(value):
+    """Keep attribute content as bytes (eg. binary VPD pages)."""
+    return bytes(value)
+
+
+def decode_text(data):
+    """Convert raw attribute content (bytes) to text like text(), with a
+    fast path for ASCII content."""
+    try:
+        return data.decode('ascii').strip().strip('\x00')
+    except UnicodeDecodeError:
+        return text(data)
+
+
 class SysfsNode(object):
     def __init__(self, path=None):
         if path is None:
@@ -134,6 +208,40 @@ class SysfsNode(object):
 
         return sanitize_sysfs_value(result)
 
+    def getraw(self, pathname, absolute=False, view=False):
+        """get raw content of a sysfs file, without globbing
+
+        Return bytes, or a memoryview of the per-thread read buffer if view
+        is True (only valid until the next read by the same thread).
+        Raise KeyError if the file cannot be read.
+        """
+        if absolute:
+            path = pathname
+        else:
+            path = join(self.path, pathname)
+        try:
+            data = read_sysfs_file(path)
+        except (IOError, OSError):
+            raise KeyError('Not found: %s' % path)
+        return data if view else data.tobytes()
+
+    def gettext(self, pathname, absolute=False):
+        """get content of a sysfs file as text, without globbing
+
+        Same result as get() with a fast path for ASCII content.
+        """
+        if absolute:
+            path = pathname
+        else:
+            path = join(self.path, pathname)
+        if not (isfile(path) and access(path, R_OK)):
+            raise KeyError('Not found: %s' % path)
+        try:
+            data = read_sysfs_file(path).tobytes()
+        except (IOError, OSError) as exc:
+            return str(exc)
+        return decode_text(data)
+
     def readlink(self, pathname, default=None, absolute=False):
         if absolute:
             path = pathname
@@ -172,11 +280,37 @@ sysfs = SYSFSNODE_CLASS()
 
 
 class SysfsAttributes(MutableMapping):
-    """SysfsObject attributes with dot.notation access"""
+    """SysfsObject attributes with dot.notation access
+
+    When created with a sysfsnode, attribute files are only listed when
+    the whole mapping is needed (iteration, len, load...): getting a single
+    attribute reads its file directly.
+
+    types is the attribute schema of the sysfs class: a dict of attribute
+    name -> converter (int, hexint, raw...) used by typed().
+
+    Attributes may be read concurrently: each attribute file is only read
+    once, other threads wait for the first read.
+    """
 
-    def __init__(self):
+    def __init__(self, sysfsnode=None, types=None):
         self.values = {}
-        self.paths = {}
+        self.types = types or {}
+        self._typed = {}
+        self._sysfsnode = sysfsnode
+        self._paths = None if sysfsnode is not None else {}
+        self._lock = threading.Lock()
+
+    @property
+    def paths(self):
+        if self._paths is None:
+            with self._lock:
+                if self._paths is None:
+                    paths = {}
+                    for attr in self._sysfsnode.glob('*', is_dir=False):
+                        paths[attr] = join(self._sysfsnode.path, attr)
+                    self._paths = paths
+        return self._paths
 
     def add_path(self, attr, path):
         self.paths[attr] = path
@@ -185,21 +319,63 @@ class SysfsAttributes(MutableMapping):
         for path in self.paths:
             loaded = self[path]
 
+    def json_serialize(self):
+        return {'values': self.values, 'paths': self.paths}
+
+    def typed(self, key, default=None):
+        """Return attribute converted according to the schema (read and
+        converted once), or default if missing or invalid."""
+        try:
+            value = self._typed[key]
+        except KeyError:
+            with self._lock:
+                if key in self._typed:
+                    value = self._typed[key]
+                else:
+                    value = self._typed[key] = self._read_typed(key)
+        return default if value is None else value
+
+    def _read_typed(self, key):
+        convert = self.types.get(key, text)
+        try:
+            if key in self.values:
+                value = self.values[key]
+                if convert is not text:
+                    value = convert(value)
+                return value
+            if self._paths is None:
+                path = join(self._sysfsnode.path, key)
+            else:
+                path = self._paths[key]
+            if convert is text:
+                return sysfs.gettext(path, absolute=True)
+            return convert(sysfs.getraw(path, absolute=True))
+        except (KeyError, TypeError, ValueError):
+            return None
+
     # The next five methods are requirements of the ABC.
 
     def __setitem__(self, key, value):
         self.values[key] = sanitize_sysfs_value(value)
+        self._typed.pop(key, None)
 
     def get(self, key, default=None):
         if not self.values.__contains__(key):
-            try:
-                self.values[key] = sysfs.get(self.paths[key], absolute=True)
-            except KeyError:
-                if default is not None:
-                    return default
-                else:
-                    raise AttributeError("%r object has no attribute %r" %
-                                         (self.__class__.__name__, key))
+            with self._lock:
+                if not self.values.__contains__(key):
+                    try:
+                        if self._paths is None:
+                            path = join(self._sysfsnode.path, key)
+                        else:
+                            path = self._paths[key]
+                        self.values[key] = sysfs.gettext(path, absolute=True)
+                    except KeyError:
+                        if default is not None:
+                            return default
+                        else:
+                            raise AttributeError(
+                                "%r object has no attribute %r" %
+                                (self.__class__.__name__, key))
 
         return self.values[key]
 
@@ -209,6 +385,7 @@ class SysfsAttributes(MutableMapping):
     def __delitem__(self, key):
         if key in self.values:
             del self.values[key]
+        self._typed.pop(key, None)
         del self.paths[key]
 
     def __iter__(self):
@@ -221,21 +398,31 @@ class SysfsAttributes(MutableMapping):
 
 
 class SysfsObject(object):
+    """Base class of sysfs objects.
+
+    Objects may be shared by threads: lazy members (usually _name = None
+    and a name property) are filled once under self._lock.
+    """
+
+    # attribute schema (see SysfsAttributes), overridden by subclasses
+    attr_types = {}
+
     def __init__(self, sysfsnode):
         self.sysfsnode = sysfsnode
         self.name = str(sysfsnode)
-        self.attrs = SysfsAttributes()
+        self.attrs = SysfsAttributes(sysfsnode, self.attr_types)
+        # reentrant as filling a member may fill another one
+        self._lock = threading.RLock()
         self.classname = self.__class__.__name__
         if type(sysfsnode) is str:
             assert len(sysfsnode) > 0
-        attrs = self.sysfsnode.glob('*', is_dir=False)
-        for attr in attrs:
-            self.attrs.add_path(attr, join(self.sysfsnode.path, attr))
 
     def json_serialize(self):
         """May be overridden to change json serialization, eg. to avoid
         circular reference issues."""
-        return self.__dict__
+        data = dict(self.__dict__)
+        del data['_lock']
+        return data
 
     def to_json(self):
 
@@ -17,40 +17,170 @@
 
 # Inspired from decode_dev_ids() in sg3_utils/src/sg_vpd.c
 
+from collections import namedtuple
+from functools import lru_cache
 import os
 from struct import unpack_from
-import subprocess
+
+from sasutils.command import run_command
 
 __author__ = 'sthiell@stanford.edu (Stephane Thiell)'
 
+# Designator association
+VPD_ASSOC_LU = 0
+VPD_ASSOC_TPORT = 1
+VPD_ASSOC_TDEVICE = 2
+
+# Designator types
+VPD_DI_VENDOR = 0
+VPD_DI_T10 = 1
+VPD_DI_EUI64 = 2
+VPD_DI_NAA = 3
+VPD_DI_REL_TPORT = 4
+VPD_DI_TPORT_GROUP = 5
+VPD_DI_LU_GROUP = 6
+VPD_DI_MD5_LU = 7
+VPD_DI_SCSI_NAME = 8
+VPD_DI_PROTO_PORT = 9
+VPD_DI_UUID = 10
+
+# Code sets
+VPD_CS_BINARY = 1
+VPD_CS_ASCII = 2
+VPD_CS_UTF8 = 3
+
+# Preferred logical unit designator types, best first (like udev scsi_id)
+LU_DESIGNATOR_PREFERENCE = (VPD_DI_NAA, VPD_DI_EUI64, VPD_DI_SCSI_NAME,
+                            VPD_DI_UUID, VPD_DI_T10, VPD_DI_MD5_LU,
+                            VPD_DI_VENDOR)
+
+# Number of memoized decoded pages
+VPD_CACHE_SIZE = 8192
+
+Designator = namedtuple('Designator', 'association type code_set protocol '
+                                      'value')
+
+
+def _designator_value(desig_type, code_set, data):
+    """Return value of a designator from its data (memoryview)."""
+    if desig_type in (VPD_DI_REL_TPORT, VPD_DI_TPORT_GROUP,
+                      VPD_DI_LU_GROUP) and len(data) >= 4:
+        return unpack_from('>H', data, 2)[0]
+    if code_set in (VPD_CS_ASCII, VPD_CS_UTF8):
+        text = bytes(data).decode('utf-8', errors='backslashreplace')
+        return text.strip(' \x00')
+    if desig_type in (VPD_DI_NAA, VPD_DI_EUI64):
+        return '0x' + data.hex()
+    return data.hex()
+
+
+def _decode_pg83(pagebuf):
+    view = memoryview(pagebuf)
+    if len(view) < 4:
+        return ()
+    end = min(len(view), 4 + unpack_from('>H', view, 2)[0])
+    designators = []
+    offset = 4
+    while offset + 4 <= end:
+        proto_cs, piv_assoc_type, _, length = view[offset:offset + 4]
+        next_offset = offset + 4 + length
+        if next_offset > end:
+            break
+        assoc = (piv_assoc_type >> 4) & 0x3
+        desig_type = piv_assoc_type & 0xf
+        code_set = proto_cs & 0xf
+        protocol = None
+        if piv_assoc_type & 0x80 and assoc in (VPD_ASSOC_TPORT,
+                                               VPD_ASSOC_TDEVICE):
+            protocol = proto_cs >> 4
+        value = _designator_value(desig_type, code_set,
+                                  view[offset + 4:next_offset])
+        designators.append(Designator(assoc, desig_type, code_set, protocol,
+                                      value))
+        offset = next_offset
+    return tuple(designators)
+
+
+@lru_cache(maxsize=VPD_CACHE_SIZE)
+def _decode_pg83_cached(pagebuf):
+    return _decode_pg83(pagebuf)
+
+
+def vpd_decode_pg83(pagebuf):
+    """
+    Return the tuple of designators (Designator namedtuples) found in the
+    device identification VPD page buffer provided (eg. content of
+    vpd_pg83 in sysfs). Results are memoized per page content.
+    """
+    if not isinstance(pagebuf, bytes):
+        pagebuf = bytes(pagebuf)
+    return _decode_pg83_cached(pagebuf)
+
 
 def vpd_decode_pg83_lu(pagebuf):
     """
     Get the addressed logical unit address from the device identification
-    VPD page buffer provided (eg. content of vpd_pg83 in sysfs).
+    VPD page buffer provided (eg. content of vpd_pg83 in sysfs), or None.
+
+    NAA designators are preferred (the longest one), then EUI-64, SCSI name
+    string, UUID, T10 vendor identification...
     """
-    VPD_ASSOC_LU = 0
-    sz = len(pagebuf)
-    offset = 4
-    d, = unpack_from('B', pagebuf, offset + 2)
-    assert d == 0, 'skip_1st_iter not implemented'
-    while True:
-        code_set, = unpack_from('B', pagebuf, offset)
-        d, = unpack_from('B', pagebuf, offset + 1)
-        design_type = (d & 0xf)
-        assoc = (d >> 4) & 0x3
-        d, = unpack_from('B', pagebuf, offset + 3)
-        next_offset = offset + (d & 0xf) + 4
-        if next_offset > sz:
-            break
+    best = None
+    for desig in vpd_decode_pg83(pagebuf):
+        if desig.association != VPD_ASSOC_LU or \
+                desig.type not in LU_DESIGNATOR_PREFERENCE:
+            continue
+        rank = (-LU_DESIGNATOR_PREFERENCE.index(desig.type),
+                len(str(desig.value)))
+        if best is None or rank > best[0]:
+            best = (rank, desig.value)
+    return best[1] if best else None
 
-        # We only support designator_type=3 (NAA) for now.
-        if design_type == 3 and assoc == VPD_ASSOC_LU:
-            d, = unpack_from('B', pagebuf, offset + 3)
-            if d in (8, 16):
-                return '0x' + ''.join("%02x" % i for i in \
-                    unpack_from('B' * d, pagebuf, offset + 4))
-        offset = next_offset
+
+def vpd_decode_pg83_target_port(pagebuf):
+    """
+    Get the target port identifier (eg. SAS address) and relative target
+    port number (or None) from the device identification VPD page buffer.
+    """
+    port = relport = None
+    for desig in vpd_decode_pg83(pagebuf):
+        if desig.association != VPD_ASSOC_TPORT:
+            continue
+        if desig.type == VPD_DI_NAA and port is None:
+            port = desig.value
+        elif desig.type == VPD_DI_REL_TPORT:
+            relport = desig.value
+    return port, relport
+
+
+def vpd_read_page(sysfsnode, page):
+    """
+    Return the raw content of a VPD page (eg. 0x83) of a SCSI device from
+    its vpd_pgXX sysfs file, or None if not available.
+    """
+    try:
+        return sysfsnode.getraw('vpd_pg%02x' % page)
+    except KeyError:
+        return None
+
+
+@lru_cache(maxsize=VPD_CACHE_SIZE)
+def _decode_pg80_sn_cached(pagebuf):
+    view = memoryview(pagebuf)
+    page_len, = unpack_from('>H', view, 2)
+    serial = bytes(view[4:4 + page_len])
+    return serial.decode('ascii', errors='backslashreplace').strip(' \x00')
+
+
+def vpd_decode_pg80_sn(pagebuf):
+    """
+    Get the product serial number from the unit serial number VPD page
+    buffer provided (eg. content of vpd_pg80 in sysfs). Results are
+    memoized per page content.
+    """
+    if not isinstance(pagebuf, bytes):
+        pagebuf = bytes(pagebuf)
+    return _decode_pg80_sn_cached(pagebuf)
 
 
 #
@@ -64,7 +194,7 @@ def vpd_get_page80_sn(blkdev):
     env["PATH"] = "/lib/udev:" + env["PATH"]
     cmdargs = ['scsi_id', '--page=0x80', '--whitelisted',
                '--device=/dev/' + blkdev]
-    output = subprocess.Popen(cmdargs, stdout=subprocess.PIPE, env=env).communicate()[0]
+    output = run_command(cmdargs, env=env).stdout
     return output.decode("utf-8", errors='backslashreplace').rstrip().split()[-1]
 
 
@@ -76,5 +206,5 @@ def vpd_get_page83_lu(blkdev):
     env["PATH"] = "/lib/udev:" + env["PATH"]
     cmdargs = ['scsi_id', '--page=0x83', '--whitelisted',
                '--device=/dev/' + blkdev]
-    output = subprocess.Popen(cmdargs, stdout=subprocess.PIPE, env=env).communicate()[0]
+    output = run_command(cmdargs, env=env).stdout
     return output.decode("utf-8", errors='backslashreplace').rstrip()
@@ -29,6 +29,7 @@ setup(name='sasutils',
       platforms=['GNU/Linux'],
       keywords=['SAS', 'SCSI', 'storage'],
       description='Serial Attached SCSI (SAS) Linux utilities',
+      extras_require={'analytics': ['numpy']},
       long_description=open('README.rst').read(),
       classifiers=[
           'Development Status :: 5 - Production/Stable',
@@ -43,6 +44,7 @@ setup(name='sasutils',
       entry_points={
           'console_scripts': [
               'sas_counters=sasutils.cli.sas_counters:main',
+              'sas_counters_analyze=sasutils.cli.sas_counters_analyze:main',
               'sas_devices=sasutils.cli.sas_devices:main',
               'sas_discover=sasutils.cli.sas_discover:main',
               'sas_mpath_snic_alias=sasutils.cli.sas_mpath_snic_alias:main',
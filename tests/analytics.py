@@ -0,0 +1,53 @@
+from unittest import TestCase, skipIf
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sasutils.analytics import PhyCounterSeries
+
+PREFIX = 'sasutils.sas_counters.'
+KEY = PREFIX + 'host1.SAS9300-8e.0x500605b00a000000.phys.%d.0.%s'
+
+
+def sample(phy, value, ts, counter='invalid_dword_count'):
+    return '%s %s %s\n' % (KEY % (phy, counter), value, ts)
+
+
+@skipIf(numpy is None, 'NumPy is not available')
+class PhyCounterSeriesTest(TestCase):
+    """Test cases for phy error counter analytics"""
+
+    def growth(self, series):
+        report = series.phy_report()
+        return dict(((expander, phy), growth) for expander, phy, growth, _, _
+                    in report.top_phys(100))
+
+    def test_growth(self):
+        series = PhyCounterSeries()
+        series._add_lines([sample(0, 10, 100), sample(1, 0, 100),
+                           'sasutils.sas_counters.host1.other 1 100\n'])
+        series._add_lines([sample(0, 15, 200), sample(1, 2.0, 200)])
+        series._add_lines([sample(0, 3, 300)])   # counter reset
+        self.assertEqual(len(series), 2)
+        self.assertEqual(series.malformed, 0)
+        expander = 'host1.SAS9300-8e.0x500605b00a000000'
+        self.assertEqual(self.growth(series), {(expander, 0): 8,
+                                               (expander, 1): 2})
+
+    def test_malformed(self):
+        series = PhyCounterSeries()
+        # non-numeric 3-field line among valid lines
+        series._add_lines([sample(0, 10, 100), sample(0, 'nan?', 150),
+                           sample(0, 12, 200)])
+        self.assertEqual(series.malformed, 1)
+        # 2-field and 4-field lines: same token count as two valid lines
+        series._add_lines(['%s 14\n' % (KEY % (0, 'invalid_dword_count')),
+                           sample(0, 16, 300).rstrip() + ' extra\n',
+                           '\n'])
+        self.assertEqual(series.malformed, 3)
+        series._add_lines([sample(0, 1e30, 400), sample(0, 20, 500)])
+        self.assertEqual(series.malformed, 4)
+        expander = 'host1.SAS9300-8e.0x500605b00a000000'
+        self.assertEqual(self.growth(series), {(expander, 0): 10})
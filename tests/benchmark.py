@@ -0,0 +1,358 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end benchmark of sasutils command-line tools.
+
+Each command-line tool and a few core sysfs primitives are run against
+synthetic sysfs trees of increasing size (see gen_sysfs_fabric.py). Every
+benchmark runs in its own process and the following metrics are recorded:
+
+    wall       elapsed time (seconds)
+    cpu        user + system CPU time (seconds)
+    maxrss     peak resident set size (KiB)
+    syscr      read syscalls (from /proc/self/io)
+    open       files opened
+    listdir    directories listed (listdir and scandir)
+    popen      subprocesses started (sg_ses, scsi_id...)
+
+Results are written as JSON and can be compared against a stored baseline;
+the exit status is 1 if a metric regressed beyond the threshold:
+
+    $ python tests/benchmark.py --sizes 100,1000 -o baseline.json
+    (change some code)
+    $ python tests/benchmark.py --sizes 100,1000 --baseline baseline.json
+
+sg_ses and scsi_id cannot talk to synthetic devices, so they are replaced by
+small shell scripts; their invocations are still counted. Counters are
+collected with audit hooks, so the benchmark requires Python 3.8 or later
+(sasutils itself does not).
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+from os.path import abspath, dirname, join
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gen_sysfs_fabric import FabricGenerator
+
+TOPDIR = dirname(dirname(abspath(__file__)))
+
+DEFAULT_SIZES = '100,500,1000'
+DEFAULT_THRESHOLD = 0.25
+
+# benchmark name -> (sasutils.cli module or primitive, arguments)
+BENCHMARKS = OrderedDict([
+    ('sas_devices', ('sas_devices', [])),
+    ('sas_devices_vv', ('sas_devices', ['-vv'])),
+    ('sas_devices_ndjson', ('sas_devices', ['--ndjson'])),
+    ('sas_discover', ('sas_discover', [])),
+    ('sas_discover_vvv', ('sas_discover', ['-vvv'])),
+    ('sas_counters', ('sas_counters', [])),
+    ('ses_report', ('ses_report', ['-s'])),
+    ('sas_sd_snic_alias', ('sas_sd_snic_alias', ['sda'])),
+    ('sas_mpath_snic_alias', ('sas_mpath_snic_alias', ['dm-0'])),
+    ('sas_st_snic_alias', ('sas_st_snic_alias', ['st0'])),
+    ('sysfs_class_glob', (':sysfs_class_glob', [])),
+    ('sysfs_sas_tree', (':sysfs_sas_tree', [])),
+    ('inventory', (':inventory', [])),
+])
+
+# metric -> absolute slack below which differences are ignored
+METRICS = OrderedDict([('wall', 0.1), ('cpu', 0.1), ('maxrss', 4096),
+                       ('syscr', 0), ('open', 0), ('listdir', 0),
+                       ('popen', 0)])
+
+AUDIT_EVENTS = {'open': 'open',
+                'os.listdir': 'listdir',
+                'os.scandir': 'listdir',
+                'subprocess.Popen': 'popen'}
+
+FAKE_SG_SES = r"""#!/bin/sh
+dev=$(echo "$@" | sed 's/.*\/dev\///')
+case "$*" in
+  *--status*) echo "Supported diagnostic pages:"
+              echo "  Subenclosure nickname [snic]";;
+  *--page=snic*) echo "Subenclosure nickname status"
+                 echo "   nickname: jbod-$dev";;
+  *--page=ed*) echo "Temp 1 [1,0]  Element type: Temperature sensor"
+               echo "    Temperature=30 C"
+               echo "    status: OK";;
+esac
+"""
+
+FAKE_SCSI_ID = r"""#!/bin/sh
+echo "S$(echo "$@" | sed 's/.*\/dev\///')"
+"""
+
+
+#
+# Core sysfs primitives (run in benchmark child processes)
+#
+
+def sysfs_class_glob():
+    """Read all SAS end device attributes through class links."""
+    from sasutils.sysfs import sysfs
+    for node in sysfs.node('class').node('sas_end_device'):
+        node.node('device').glob('sas_device/*')[0].get('sas_address')
+
+
+def sysfs_sas_tree():
+    """Walk the SAS topology of all SAS hosts."""
+    from sasutils.sas import SASHost
+    from sasutils.sysfs import sysfs
+
+    def walk(sas_node):
+        for port in sas_node.ports:
+            for expander in port.expanders:
+                walk(expander)
+            for end_device in port.end_devices:
+                for target in end_device.targets:
+                    target.attrs.get('wwid')
+
+    for node in sysfs.node('class').node('sas_host'):
+        walk(SASHost(node.node('device')))
+
+
+def inventory():
+    """Load the SAS inventory."""
+    from sasutils.inventory import Inventory
+    Inventory()
+
+
+PRIMITIVES = {'sysfs_class_glob': sysfs_class_glob,
+              'sysfs_sas_tree': sysfs_sas_tree,
+              'inventory': inventory}
+
+
+def _proc_io():
+    try:
+        with open('/proc/self/io') as fp:
+            return dict(line.split(': ') for line in fp.read().splitlines())
+    except (IOError, OSError):
+        return {}
+
+
+def run_child(target, args, output):
+    """Run benchmark target in this process and write counters to output."""
+    counters = dict.fromkeys(AUDIT_EVENTS.values(), 0)
+
+    def hook(event, _args):
+        name = AUDIT_EVENTS.get(event)
+        if name:
+            counters[name] += 1
+
+    if not target.startswith(':'):
+        __import__('sasutils.cli.' + target)
+    io_start = _proc_io()
+    sys.addaudithook(hook)
+    try:
+        if target.startswith(':'):
+            PRIMITIVES[target[1:]]()
+        else:
+            sys.argv = [target] + args
+            runpy.run_module('sasutils.cli.' + target, run_name='__main__')
+    finally:
+        sys.stdout.flush()
+        io_end = _proc_io()
+        if 'syscr' in io_end:
+            counters['syscr'] = int(io_end['syscr']) - int(io_start['syscr'])
+        with open(output, 'w') as fp:
+            json.dump(counters, fp)
+
+
+#
+# Benchmark driver
+#
+
+def topology(ndevices, hbas=4, paths=2, max_slots=84):
+    """Return gen_sysfs_fabric parameters for about ndevices drives."""
+    enclosures = -(-ndevices // max_slots)
+    slots = -(-ndevices // enclosures)
+    needed = -(-enclosures * paths // hbas) + 1
+    tiers = 1
+    while FabricGenerator.attach_points(tiers) < needed:
+        tiers += 1
+    return dict(hbas=hbas, tiers=tiers, enclosures=enclosures, slots=slots,
+                paths=paths, tapes=4, dm=True)
+
+
+def make_fakebin(root):
+    bindir = join(root, 'fakebin')
+    os.mkdir(bindir)
+    for name, script in (('sg_ses', FAKE_SG_SES), ('scsi_id', FAKE_SCSI_ID)):
+        path = join(bindir, name)
+        with open(path, 'w') as fp:
+            fp.write(script)
+        os.chmod(path, 0o755)
+    return bindir
+
+
+def run_benchmark(name, sysfs_root, bindir, workdir):
+    """Run benchmark name in a child process, return metrics."""
+    target, args = BENCHMARKS[name]
+    output = join(workdir, 'counters.json')
+    env = dict(os.environ)
+    env.update(SYSFS_ROOT=sysfs_root,
+               PATH=bindir + os.pathsep + env.get('PATH', ''),
+               PYTHONPATH=TOPDIR + os.pathsep + join(TOPDIR, 'tests'))
+    cmd = [sys.executable, abspath(__file__), '--child', target, output] + \
+        args
+    start = time.time()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.time() - start
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    try:
+        with open(output) as fp:
+            metrics = json.load(fp)
+        os.unlink(output)
+    except (IOError, ValueError):
+        # child killed before writing its counters
+        metrics = dict.fromkeys(['syscr'] + list(AUDIT_EVENTS.values()), 0)
+    metrics.update(wall=wall, cpu=rusage.ru_utime + rusage.ru_stime,
+                   maxrss=rusage.ru_maxrss, status=proc.returncode)
+    return metrics
+
+
+def run_all(sizes, names, repeat, keep=False):
+    """Run benchmarks for all sizes; return results dict."""
+    results = OrderedDict()
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='sasutils-bench-')
+        try:
+            sysfs_root = join(workdir, 'sys')
+            params = topology(size)
+            FabricGenerator(sysfs_root, **params).generate()
+            bindir = make_fakebin(workdir)
+            sizeres = results[str(size)] = OrderedDict()
+            for name in names:
+                runs = [run_benchmark(name, sysfs_root, bindir, workdir)
+                        for _ in range(repeat)]
+                # keep fastest run, counters should not vary
+                best = min(runs, key=lambda metrics: metrics['wall'])
+                sizeres[name] = OrderedDict((key, best[key]) for key in
+                                            list(METRICS) + ['status'])
+                print_metrics(size, name, sizeres[name])
+        finally:
+            if keep:
+                print('kept %s' % workdir, file=sys.stderr)
+            else:
+                shutil.rmtree(workdir)
+    return results
+
+
+def print_metrics(size, name, metrics, extra=''):
+    print('%6s %-22s %8.3f %8.3f %8d %8d %8d %8d %6d%s%s'
+          % (size, name, metrics['wall'], metrics['cpu'], metrics['maxrss'],
+             metrics['syscr'], metrics['open'], metrics['listdir'],
+             metrics['popen'],
+             '' if not metrics.get('status') else ' (exit %d)'
+             % metrics['status'], extra))
+    sys.stdout.flush()
+
+
+def compare(results, baseline, threshold):
+    """Return list of (size, name, metric, old, new) regressions."""
+    regressions = []
+    for size, sizeres in results.items():
+        for name, metrics in sizeres.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            # a failing run is faster but is not an improvement
+            if not old.get('status') and metrics.get('status'):
+                regressions.append((size, name, 'status', old.get('status', 0),
+                                    metrics['status']))
+            for metric, slack in METRICS.items():
+                if metric not in old:
+                    continue
+                new = metrics[metric]
+                if new - old[metric] > max(slack, old[metric] * threshold):
+                    regressions.append((size, name, metric, old[metric], new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='comma-separated numbers of drives (default: %s)'
+                             % DEFAULT_SIZES)
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS),
+                        metavar='NAME', help='run only this benchmark '
+                        '(repeatable): %s' % ', '.join(BENCHMARKS))
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='run each benchmark N times, keep the fastest '
+                             '(default: 3)')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='write results as JSON to FILE')
+    parser.add_argument('--baseline', '-b', metavar='FILE',
+                        help='compare results against baseline JSON FILE')
+    parser.add_argument('--threshold', '-t', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='relative regression threshold (default: %s)'
+                             % DEFAULT_THRESHOLD)
+    parser.add_argument('--keep', action='store_true',
+                        help='keep generated sysfs trees')
+    pargs = parser.parse_args()
+
+    sizes = [int(size) for size in pargs.sizes.split(',')]
+    names = pargs.only or list(BENCHMARKS)
+
+    print('%6s %-22s %8s %8s %8s %8s %8s %8s %6s'
+          % ('DRIVES', 'BENCHMARK', 'WALL', 'CPU', 'MAXRSS', 'SYSCR', 'OPEN',
+             'LISTDIR', 'POPEN'))
+    results = run_all(sizes, names, pargs.repeat, pargs.keep)
+
+    if pargs.output:
+        with open(pargs.output, 'w') as fp:
+            json.dump(OrderedDict([('python', platform.python_version()),
+                                   ('sizes', sizes),
+                                   ('results', results)]), fp, indent=2)
+
+    if pargs.baseline:
+        with open(pargs.baseline) as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(results, baseline, pargs.threshold)
+        for size, name, metric, old, new in regressions:
+            print('REGRESSION %s@%s %s: %s -> %s' % (name, size, metric,
+                                                     old, new))
+        if regressions:
+            sys.exit(1)
+        print('No regression (threshold %.0f%%)' % (pargs.threshold * 100))
+
+
+if __name__ == '__main__':
+    # audit hooks are needed to count opened files and listed directories
+    if sys.version_info < (3, 8):
+        sys.exit('%s: Python 3.8 or later is required (running %s)'
+                 % (sys.argv[0], platform.python_version()))
+    if len(sys.argv) > 3 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[4:], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,141 @@
+import shutil
+import threading
+import tempfile
+import time
+from os.path import join
+from subprocess import CalledProcessError
+from unittest import TestCase
+
+import sasutils.command
+from sasutils.command import CommandCache, CommandExecutor, CommandRecorder
+from sasutils.command import CommandReplayer, CommandTimeout
+from sasutils.command import run_command
+
+
+class CommandTest(TestCase):
+    """Test cases for external command record and replay"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = join(self.tmpdir, 'commands.ndjson')
+        self.saved = (sasutils.command._recorder, sasutils.command._replayer,
+                      sasutils.command._configured)
+        self.saved_executor = sasutils.command._executor
+
+    def tearDown(self):
+        (sasutils.command._recorder, sasutils.command._replayer,
+         sasutils.command._configured) = self.saved
+        sasutils.command._executor = self.saved_executor
+        shutil.rmtree(self.tmpdir)
+
+    def _set_mode(self, recorder=None, replayer=None):
+        sasutils.command._recorder = recorder
+        sasutils.command._replayer = replayer
+        sasutils.command._configured = True
+        sasutils.command.command_cache.clear()
+
+    def test_record_replay(self):
+        self._set_mode(recorder=CommandRecorder(self.path))
+        result = run_command(['sh', '-c', 'echo out; echo err >&2; exit 3'])
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.stdout, b'out\n')
+        self.assertEqual(result.stderr, b'err\n')
+        self.assertRaises(CalledProcessError, result.check)
+        self.assertRaises(OSError, run_command, ['/nonexistent/sg_ses'])
+
+        self._set_mode(replayer=CommandReplayer(self.path))
+        replayed = run_command(['sh', '-c', 'echo out; echo err >&2; exit 3'])
+        self.assertEqual(replayed[:4], result[:4])
+        self.assertRaises(OSError, run_command, ['/nonexistent/sg_ses'])
+        # not recorded
+        self.assertRaises(OSError, run_command, ['sh', '-c', 'true'])
+
+    def test_replay_latency(self):
+        self._set_mode(recorder=CommandRecorder(self.path))
+        run_command(['true'])
+        self._set_mode(replayer=CommandReplayer(self.path, '0.2s'))
+        start = time.time()
+        result = run_command(['true'])
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertEqual(result.latency, 0.2)
+        self.assertEqual(result.check().stdout, b'')
+
+    def test_cache(self):
+        self._set_mode(recorder=CommandRecorder(self.path))
+        stamp = run_command(['date', '+%N'])
+        self.assertEqual(run_command(['date', '+%N']), stamp)
+        self.assertNotEqual(run_command(['date', '+%N'], cache=False), stamp)
+        with self.assertLogs('sasutils.command', 'WARNING') as logs:
+            self.assertRaises(OSError, run_command, ['/nonexistent/sg_ses'])
+            self.assertRaises(OSError, run_command, ['/nonexistent/sg_ses'])
+        # cached errors are only logged once
+        self.assertEqual(len(logs.records), 1)
+        with open(self.path) as fp:
+            self.assertEqual(len(fp.readlines()), 3)
+
+    def test_cache_coalescing(self):
+        cache = CommandCache()
+        calls = []
+        release = threading.Event()
+
+        def execute(args, env):
+            calls.append(args)
+            release.wait(5)
+            return args
+
+        threads = [threading.Thread(target=cache.get,
+                                    args=(['sg_ses', '/dev/sg0'], None,
+                                          execute))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats(),
+                         {'hits': 7, 'misses': 1, 'entries': 1})
+
+    def test_timeout(self):
+        self._set_mode(recorder=CommandRecorder(self.path))
+        executor = sasutils.command._executor = CommandExecutor(timeout=0.5)
+        start = time.time()
+        # the child of the shell is killed with its process group
+        self.assertRaises(CommandTimeout, run_command,
+                          ['sh', '-c', 'sleep 10; echo late'])
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(len(executor.timed_out), 1)
+        # recorded timeouts are replayed
+        self._set_mode(replayer=CommandReplayer(self.path))
+        self.assertRaises(CommandTimeout, run_command,
+                          ['sh', '-c', 'sleep 10; echo late'])
+
+    def test_deadline(self):
+        self._set_mode()
+        executor = sasutils.command._executor = CommandExecutor(
+            jobs=4, timeout=None, deadline=0.5)
+
+        def sleep(seconds):
+            try:
+                return run_command(['sleep', str(seconds)]).returncode
+            except CommandTimeout:
+                return None
+
+        start = time.time()
+        self.assertEqual(executor.map(sleep, [0, 10, 10]), [0, None, None])
+        self.assertLess(time.time() - start, 5)
+        # no command is run after the deadline
+        self.assertRaises(CommandTimeout, run_command, ['true'])
+        # identical sleep commands were coalesced by the command cache
+        self.assertEqual(len(executor.timed_out), 2)
+
+    def test_submit(self):
+        self._set_mode()
+        executor = sasutils.command._executor = CommandExecutor(jobs=2)
+        start = time.time()
+        future = executor.submit(run_command, ['sleep', '0.5'])
+        # submit does not wait for the command
+        self.assertLess(time.time() - start, 0.4)
+        # the in-flight command is shared through the command cache
+        self.assertEqual(run_command(['sleep', '0.5']).returncode, 0)
+        self.assertIs(future.result(), run_command(['sleep', '0.5']))
@@ -0,0 +1,64 @@
+import shutil
+import sys
+import tempfile
+from os.path import dirname, join
+from unittest import TestCase
+
+from sasutils.fabric import Fabric
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+
+class FabricTest(TestCase):
+    """Test cases for the logical fabric model"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # two enclosures with two paths each, through two HBAs
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def fabric(self):
+        return Fabric(SysfsNode(join(self.root, 'class', 'sas_host')))
+
+    def test_fabric(self):
+        fabric = self.fabric()
+        self.assertEqual(len(fabric.hosts), 2)
+        self.assertEqual(len(fabric.expanders), 4)
+        # per expander: SES device + 4 disks
+        self.assertEqual(len(fabric.end_devices), 20)
+        for fnode in fabric.end_devices:
+            self.assertEqual(len(fnode.paths), 1)
+            self.assertEqual(len(fnode.targets), 1)
+            parent = fabric.node(fnode.paths[0].parent)
+            self.assertEqual(parent.kind, 'expander')
+            self.assertIn(fnode.sas_address, parent.children)
+        self.assertEqual(fabric.paths('0xdeadbeef'), [])
+
+    def test_merge(self):
+        # simulate a SAS switch seen from both HBAs: same SAS address
+        expdir = join(self.root, 'class', 'sas_expander')
+        with open(join(expdir, 'expander-0:0', 'device', 'sas_device',
+                       'expander-0:0', 'sas_address')) as fp:
+            sas_address = fp.read().strip()
+        # written differently, but the same SAS address
+        with open(join(expdir, 'expander-1:0', 'device', 'sas_device',
+                       'expander-1:0', 'sas_address'), 'w') as fp:
+            fp.write(sas_address[2:].upper() + '\n')
+
+        fabric = self.fabric()
+        self.assertEqual(len(fabric.expanders), 3)
+        fnode = fabric.node(sas_address[2:].upper())
+        self.assertEqual(fnode.sas_address, sas_address)
+        self.assertEqual(len(fnode.objects), 2)
+        self.assertEqual(sorted(path.host for path in fnode.paths),
+                         ['host0', 'host1'])
+        self.assertEqual(len(fnode.parents), 2)
+        for path in fabric.paths(sas_address):
+            self.assertEqual(path.phys, 4)
+            self.assertEqual(path.linkrate, '4 x 12.0 Gbit')
@@ -0,0 +1,496 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2026
+#      The Board of Trustees of the Leland Stanford Junior University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generate a synthetic SAS fabric sysfs tree for scale testing.
+
+Unlike gen_sysfs_testenv.py, which records the sysfs tree of a real machine,
+this script writes a fake but realistic sysfs tree from a few topology
+parameters: number of HBAs, expander tiers, enclosures, slots per enclosure,
+multipath fan-out, tape drives (in a tape library enclosure) and
+device-mapper maps.
+
+The resulting tree can be used by all sasutils command-line tools by
+pointing the SYSFS_ROOT environment variable to it:
+
+    $ python tests/gen_sysfs_fabric.py --hbas 4 --tiers 2 --enclosures 16 \\
+          --slots 84 --paths 2 --dm /tmp/fabric
+    $ SYSFS_ROOT=/tmp/fabric sas_devices -v
+"""
+
+import argparse
+import os
+from os.path import dirname, join, relpath
+import struct
+import tempfile
+
+# Number of phys of each generated HBA and expander
+HBA_PHYS = 16
+EXP_PHYS = 48
+# Number of phys in a wide port
+WIDE_PORT = 4
+
+COUNTERS = ('invalid_dword_count', 'loss_of_dword_sync_count',
+            'phy_reset_problem_count', 'running_disparity_error_count')
+
+
+def blkname(index):
+    """Return sd block device name from index (sda, ..., sdz, sdaa, ...)."""
+    name = ''
+    index += 1
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        name = chr(ord('a') + rem) + name
+    return 'sd' + name
+
+
+class FabricGenerator(object):
+    """Write a synthetic SAS fabric into a sysfs-like directory tree."""
+
+    def __init__(self, root, hbas=1, tiers=1, enclosures=1, slots=12, paths=1,
+                 tapes=0, dm=False, errors=0):
+        self.root = root
+        self.hbas = hbas
+        self.tiers = tiers
+        self.enclosures = enclosures
+        self.slots = slots
+        self.paths = paths
+        self.tapes = tapes
+        self.dm = dm
+        self.errors = errors
+        self.pci = join(root, 'devices', 'pci0000:00')
+        self.sg_count = 0
+        self.sd_count = 0
+        self.st_count = 0
+        self.addr_count = 0
+        # per host counters: next expander/port/target ids
+        self.host_exp = {}
+        self.host_port = {}
+        self.host_target = {}
+        # LU -> list of block device names (for dm maps)
+        self.lu_blocks = {}
+        self.enclosure_slots = {}
+
+    #
+    # Low-level helpers
+    #
+    def write(self, path, value):
+        if not os.path.isdir(dirname(path)):
+            os.makedirs(dirname(path))
+        mode = 'wb' if isinstance(value, bytes) else 'w'
+        with open(path, mode) as fp:
+            if isinstance(value, bytes):
+                fp.write(value)
+            else:
+                fp.write('%s\n' % value)
+
+    def attrs(self, path, attrs):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for key, value in attrs.items():
+            self.write(join(path, key), value)
+
+    def link(self, path, target):
+        """Create relative symlink path -> target."""
+        if not os.path.isdir(dirname(path)):
+            os.makedirs(dirname(path))
+        os.symlink(relpath(target, dirname(path)), path)
+
+    def class_link(self, classname, name, target):
+        self.link(join(self.root, 'class', classname, name), target)
+
+    def new_addr(self, base=0x5000c50000000000):
+        self.addr_count += 1
+        return '0x%016x' % (base + self.addr_count * 4)
+
+    def counter(self):
+        # deterministic pseudo error counters
+        if self.errors and self.addr_count % self.errors == 0:
+            return self.addr_count % 7
+        return 0
+
+    #
+    # SAS objects
+    #
+    def add_phys(self, parent, prefix, count, sas_address, devtype):
+        phys = []
+        for index in range(count):
+            name = 'phy-%s:%d' % (prefix, index)
+            phydir = join(parent, name)
+            sasphy = join(phydir, 'sas_phy', name)
+            attrs = {'phy_identifier': index,
+                     'sas_address': sas_address,
+                     'device_type': devtype,
+                     'initiator_port_protocols': 'ssp,stp,smp',
+                     'target_port_protocols': 'none',
+                     'minimum_linkrate': '1.5 Gbit',
+                     'maximum_linkrate': '12.0 Gbit',
+                     'negotiated_linkrate': '12.0 Gbit'}
+            for key in COUNTERS:
+                attrs[key] = self.counter()
+            self.attrs(sasphy, attrs)
+            self.link(join(sasphy, 'device'), phydir)
+            self.class_link('sas_phy', name, sasphy)
+            phys.append(phydir)
+        return phys
+
+    def add_port(self, parent, host, phys):
+        portid = self.host_port.get(host, 0)
+        self.host_port[host] = portid + 1
+        name = 'port-%d:%d' % (host, portid)
+        portdir = join(parent, name)
+        sasport = join(portdir, 'sas_port', name)
+        self.attrs(sasport, {'num_phys': len(phys)})
+        self.link(join(sasport, 'device'), portdir)
+        self.class_link('sas_port', name, sasport)
+        for phydir in phys:
+            self.link(join(portdir, os.path.basename(phydir)), phydir)
+            self.link(join(phydir, 'port'), portdir)
+        return portdir
+
+    def add_host(self, host):
+        hostdir = join(self.pci, '0000:00:%02x.0' % host,
+                       '0000:%02x:00.0' % (host + 1), 'host%d' % host)
+        sas_address = '0x500605b00a%06x' % host
+        scsihost = join(hostdir, 'scsi_host', 'host%d' % host)
+        self.attrs(scsihost, {'board_name': 'SAS9300-16e',
+                              'board_assembly': 'H3-25379-01C',
+                              'board_tracer': 'SP%08d' % host,
+                              'host_sas_address': sas_address,
+                              'version_product': 'SAS3008',
+                              'version_bios': '08.37.00.00',
+                              'version_fw': '16.00.01.00',
+                              'unique_id': host})
+        self.link(join(scsihost, 'device'), hostdir)
+        self.class_link('scsi_host', 'host%d' % host, scsihost)
+        sashost = join(hostdir, 'sas_host', 'host%d' % host)
+        self.attrs(sashost, {'uevent': ''})
+        self.link(join(sashost, 'device'), hostdir)
+        self.class_link('sas_host', 'host%d' % host, sashost)
+        phys = self.add_phys(hostdir, str(host), HBA_PHYS, sas_address,
+                             'end device')
+        return hostdir, phys
+
+    def add_expander(self, parent, host, phys, level, product,
+                     nphys=EXP_PHYS):
+        expid = self.host_exp.get(host, 0)
+        self.host_exp[host] = expid + 1
+        portdir = self.add_port(parent, host, phys)
+        name = 'expander-%d:%d' % (host, expid)
+        expdir = join(portdir, name)
+        sas_address = self.new_addr(0x5001636000000000)
+        sasexp = join(expdir, 'sas_expander', name)
+        self.attrs(sasexp, {'vendor_id': 'HGST' if level else 'ASTEK',
+                            'product_id': product,
+                            'product_rev': '0210',
+                            'component_vendor_id': 'PMCSIERA',
+                            'component_id': '33101',
+                            'level': level})
+        self.link(join(sasexp, 'device'), expdir)
+        self.class_link('sas_expander', name, sasexp)
+        sasdev = join(expdir, 'sas_device', name)
+        self.attrs(sasdev, {'sas_address': sas_address,
+                            'device_type': 'edge',
+                            'enclosure_identifier': sas_address,
+                            'bay_identifier': 0,
+                            'phy_identifier': 0,
+                            'initiator_port_protocols': 'smp',
+                            'target_port_protocols': 'smp'})
+        self.link(join(sasdev, 'device'), expdir)
+        self.class_link('sas_device', name, sasdev)
+        self.attrs(join(expdir, 'bsg', name), {'dev': '247:%d' % expid})
+        exphys = self.add_phys(expdir, '%d:%d' % (host, expid), nphys,
+                               sas_address, 'edge')
+        return expdir, exphys, sas_address
+
+    def add_end_device(self, parent, host, phys, edname, bay, enclid):
+        portdir = self.add_port(parent, host, phys)
+        name = 'end_device-%s' % edname
+        eddir = join(portdir, name)
+        sas_address = self.new_addr()
+        sased = join(eddir, 'sas_end_device', name)
+        self.attrs(sased, {'bay_identifier': bay,
+                           'enclosure_identifier': enclid,
+                           'ready_led_meaning': 0,
+                           'I_T_nexus_loss_timeout': 2000,
+                           'initiator_response_timeout': 5000,
+                           'tlr_enabled': 0, 'tlr_supported': 0})
+        self.link(join(sased, 'device'), eddir)
+        self.class_link('sas_end_device', name, sased)
+        sasdev = join(eddir, 'sas_device', name)
+        self.attrs(sasdev, {'sas_address': sas_address,
+                            'device_type': 'end device',
+                            'enclosure_identifier': enclid,
+                            'bay_identifier': bay,
+                            'phy_identifier': bay,
+                            'initiator_port_protocols': 'none',
+                            'target_port_protocols': 'ssp'})
+        self.link(join(sasdev, 'device'), eddir)
+        self.class_link('sas_device', name, sasdev)
+        return eddir, sas_address
+
+    #
+    # SCSI objects
+    #
+    def add_scsi_device(self, eddir, host, scsi_type, vendor, model, rev,
+                        sas_address, lu, serial):
+        tgt = self.host_target.get(host, 0)
+        self.host_target[host] = tgt + 1
+        hctl = '%d:0:%d:0' % (host, tgt)
+        sdevdir = join(eddir, 'target%d:0:%d' % (host, tgt), hctl)
+        naa = bytes.fromhex(lu[2:])
+        port = bytes.fromhex(sas_address[2:])
+        desc = (b'\x01\x03\x00\x08' + naa +
+                b'\x61\x93\x00\x08' + port +
+                b'\x61\x94\x00\x04\x00\x00\x00\x01' +
+                b'\x61\xa3\x00\x08' + naa)
+        pg83 = b'\x00\x83' + struct.pack('>H', len(desc)) + desc
+        pg80 = b'\x00\x80\x00' + struct.pack('B', len(serial)) + \
+            serial.encode()
+        self.attrs(sdevdir, {'type': scsi_type, 'vendor': '%-8s' % vendor,
+                             'model': '%-16s' % model, 'rev': rev,
+                             'state': 'running', 'timeout': 30,
+                             'sas_address': sas_address,
+                             'wwid': 'naa.%s' % lu[2:],
+                             'queue_depth': 254, 'scsi_level': 7,
+                             'device_blocked': 0,
+                             'ioerr_cnt': '0x%x' % self.counter(),
+                             'iodone_cnt': '0x%x' % (tgt * 1000 + 13),
+                             'iorequest_cnt': '0x%x' % (tgt * 1000 + 13),
+                             'vpd_pg80': pg80, 'vpd_pg83': pg83})
+        self.attrs(join(sdevdir, 'scsi_device', hctl), {'uevent': ''})
+        self.class_link('scsi_device', hctl,
+                        join(sdevdir, 'scsi_device', hctl))
+        self.link(join(self.root, 'bus', 'scsi', 'devices', hctl), sdevdir)
+        sgname = 'sg%d' % self.sg_count
+        self.sg_count += 1
+        sgdir = join(sdevdir, 'scsi_generic', sgname)
+        self.attrs(sgdir, {'dev': '21:%d' % self.sg_count})
+        self.link(join(sgdir, 'device'), sdevdir)
+        self.class_link('scsi_generic', sgname, sgdir)
+        return sdevdir, hctl
+
+    def add_disk(self, eddir, host, sas_address, lu, serial, size):
+        sdevdir, hctl = self.add_scsi_device(eddir, host, 0, 'SEAGATE',
+                                             'ST16000NM004J', 'E004',
+                                             sas_address, lu, serial)
+        self.attrs(join(sdevdir, 'scsi_disk', hctl),
+                   {'cache_type': 'write back', 'FUA': 1,
+                    'protection_type': 0})
+        name = blkname(self.sd_count)
+        self.sd_count += 1
+        blkdir = join(sdevdir, 'block', name)
+        self.attrs(blkdir, {'size': size, 'removable': 0, 'ro': 0,
+                            'dev': '8:%d' % (self.sd_count * 16)})
+        self.attrs(join(blkdir, 'queue'), {'nr_requests': 256,
+                                           'rotational': 1,
+                                           'scheduler': '[mq-deadline] none',
+                                           'max_sectors_kb': 1280,
+                                           'logical_block_size': 512})
+        os.makedirs(join(blkdir, 'holders'))
+        self.link(join(blkdir, 'device'), sdevdir)
+        self.link(join(self.root, 'block', name), blkdir)
+        self.class_link('block', name, blkdir)
+        self.lu_blocks.setdefault(lu, []).append(blkdir)
+        return sdevdir
+
+    def add_tape(self, eddir, host, index):
+        sas_address = self.new_addr(0x50012be000000000)
+        lu = self.new_addr(0x50012be000000000)
+        sdevdir, hctl = self.add_scsi_device(eddir, host, 1, 'IBM',
+                                             'ULTRIUM-TD8', 'K4K1',
+                                             sas_address, lu,
+                                             '10WT%06d' % index)
+        name = 'st%d' % self.st_count
+        self.st_count += 1
+        for sfx in ('', 'a', 'l', 'm'):
+            for pfx in ('', 'n'):
+                stdir = join(sdevdir, 'scsi_tape', pfx + name + sfx)
+                self.attrs(stdir, {'dev': '9:%d' % self.st_count})
+                self.link(join(stdir, 'device'), sdevdir)
+                self.class_link('scsi_tape', pfx + name + sfx, stdir)
+        return sdevdir
+
+    def add_enclosure_device(self, eddir, host, sas_address, index, path,
+                             components=None):
+        lu = self.new_addr(0x5000ccab00000000)
+        # enclosure logical identifier is shared by all SES paths
+        encl_id = '0x%016x' % (0x5000ccab04000000 + index * 0x100)
+        sdevdir, hctl = self.add_scsi_device(eddir, host, 13, 'HGST',
+                                             'H4102-J', '3010', sas_address,
+                                             lu, 'THCL%06d' % index)
+        encdir = join(sdevdir, 'enclosure', hctl)
+        self.attrs(encdir, {'components': components or self.slots,
+                            'id': encl_id})
+        self.link(join(encdir, 'device'), sdevdir)
+        self.class_link('enclosure', hctl, encdir)
+        self.enclosure_slots[(index, path)] = encdir
+        return encdir
+
+    def add_slot(self, encdir, slot, sdevdir):
+        slotname = 'SLOT %03d' % slot
+        slotdir = join(encdir, slotname)
+        self.attrs(slotdir, {'slot': slot, 'status': 'OK', 'fault': 0,
+                             'locate': 0, 'type': 'array device'})
+        self.link(join(slotdir, 'device'), sdevdir)
+        self.link(join(sdevdir, 'enclosure_device:%s' % slotname), slotdir)
+
+    #
+    # Topology
+    #
+    @staticmethod
+    def attach_points(tiers):
+        """Return number of wide ports available per HBA."""
+        return (HBA_PHYS // WIDE_PORT +
+                (tiers - 1) * (EXP_PHYS // WIDE_PORT - 1))
+
+    def generate(self):
+        needed = -(-self.enclosures * self.paths // self.hbas) + \
+            (1 if self.tapes else 0)
+        if needed > self.attach_points(self.tiers):
+            raise ValueError('not enough HBA ports for %d enclosure paths, '
+                             'add HBAs or expander tiers'
+                             % (self.enclosures * self.paths))
+        hosts = []
+        for host in range(self.hbas):
+            hosts.append(self.add_host(host))
+
+        # per host downstream attachment points: list of (parent dir, phys)
+        attach = []
+        for host, (hostdir, phys) in enumerate(hosts):
+            points = []
+            # one wide port per HBA connector
+            for wport in range(len(phys) // WIDE_PORT):
+                points.append((hostdir, phys[wport * WIDE_PORT:
+                                             (wport + 1) * WIDE_PORT]))
+            attach.append(points)
+
+        # switch tiers: one switch expander per HBA and per tier
+        for host in range(self.hbas):
+            for tier in range(1, self.tiers):
+                parent, phys = attach[host].pop(0)
+                expdir, exphys, _ = self.add_expander(parent, host, phys, 0,
+                                                      'Switch184')
+                points = []
+                for wport in range(len(exphys) // WIDE_PORT):
+                    points.append((expdir, exphys[wport * WIDE_PORT:
+                                                  (wport + 1) * WIDE_PORT]))
+                # keep unconsumed upper tier points after the new ones
+                attach[host] = points + attach[host]
+
+        # enclosures: each enclosure path (IOM) hangs off a different HBA
+        disks = [[None] * self.slots for _ in range(self.enclosures)]
+        for encl in range(self.enclosures):
+            for path in range(self.paths):
+                host = (encl * self.paths + path) % self.hbas
+                parent, phys = attach[host].pop(0)
+                expdir, exphys, expaddr = self.add_expander(
+                    parent, host, phys, 1, 'H4102-J', self.slots + 1)
+                expid = self.host_exp[host] - 1
+                # SES end device on virtual phy
+                eddir, sesaddr = self.add_end_device(
+                    expdir, host, exphys[-1:],
+                    '%d:%d:%d' % (host, expid, self.slots), 0, expaddr)
+                encdir = self.add_enclosure_device(eddir, host, sesaddr, encl,
+                                                   path)
+                for slot in range(self.slots):
+                    if disks[encl][slot] is None:
+                        lu = self.new_addr(0x5000c50090000000)
+                        serial = 'ZL%06d%04d' % (encl, slot)
+                        disks[encl][slot] = (lu, serial)
+                    lu, serial = disks[encl][slot]
+                    eddir, addr = self.add_end_device(
+                        expdir, host, exphys[slot:slot + 1],
+                        '%d:%d:%d' % (host, expid, slot), slot, expaddr)
+                    sdevdir = self.add_disk(eddir, host, addr, lu, serial,
+                                            31251759104)
+                    self.add_slot(encdir, slot, sdevdir)
+
+        # tape library: tape drives in the bays of an enclosure
+        if self.tapes:
+            host = 0
+            parent, phys = attach[host].pop(0)
+            expdir, exphys, expaddr = self.add_expander(
+                parent, host, phys, 1, 'TS4500', self.tapes + 1)
+            expid = self.host_exp[host] - 1
+            eddir, sesaddr = self.add_end_device(
+                expdir, host, exphys[-1:],
+                '%d:%d:%d' % (host, expid, self.tapes), 0, expaddr)
+            encdir = self.add_enclosure_device(eddir, host, sesaddr,
+                                               self.enclosures, 0,
+                                               self.tapes)
+            for index in range(self.tapes):
+                eddir, _ = self.add_end_device(
+                    expdir, host, exphys[index:index + 1],
+                    '%d:%d:%d' % (host, expid, index), index, expaddr)
+                sdevdir = self.add_tape(eddir, host, index)
+                self.add_slot(encdir, index, sdevdir)
+
+        if self.dm:
+            self.add_dm_maps()
+
+    def add_dm_maps(self):
+        for index, (lu, blkdirs) in enumerate(sorted(self.lu_blocks.items())):
+            name = 'dm-%d' % index
+            dmdir = join(self.root, 'devices', 'virtual', 'block', name)
+            self.attrs(dmdir, {'size': 31251759104, 'dev': '253:%d' % index})
+            self.attrs(join(dmdir, 'dm'), {'name': 'mpath%s' % lu[-6:],
+                                           'uuid': 'mpath-3%s' % lu[2:]})
+            for blkdir in blkdirs:
+                blk = os.path.basename(blkdir)
+                self.link(join(dmdir, 'slaves', blk), blkdir)
+                self.link(join(blkdir, 'holders', name), dmdir)
+            self.link(join(self.root, 'block', name), dmdir)
+            self.class_link('block', name, dmdir)
+
+
+def main():
+    """Entry point for gen_sysfs_fabric."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hbas', type=int, default=1,
+                        help='number of SAS HBAs (default: 1)')
+    parser.add_argument('--tiers', type=int, default=1,
+                        help='number of expander tiers, 2 or more adds SAS '
+                             'switches (default: 1)')
+    parser.add_argument('--enclosures', type=int, default=1,
+                        help='number of enclosures (default: 1)')
+    parser.add_argument('--slots', type=int, default=12,
+                        help='number of slots per enclosure (default: 12)')
+    parser.add_argument('--paths', type=int, default=1,
+                        help='multipath fan-out per enclosure (default: 1)')
+    parser.add_argument('--tapes', type=int, default=0,
+                        help='number of tape drives in a tape library')
+    parser.add_argument('--dm', action='store_true',
+                        help='create device-mapper maps for multipath LUs')
+    parser.add_argument('--errors', type=int, default=0, metavar='N',
+                        help='set non-zero error counters every N objects')
+    parser.add_argument('root', nargs='?',
+                        help='output directory (default: a new temporary '
+                             'directory)')
+    pargs = parser.parse_args()
+
+    root = pargs.root or tempfile.mkdtemp(prefix='sysfs-')
+    try:
+        FabricGenerator(root, pargs.hbas, pargs.tiers, pargs.enclosures,
+                        pargs.slots, pargs.paths, pargs.tapes, pargs.dm,
+                        pargs.errors).generate()
+    except ValueError as err:
+        parser.error(str(err))
+    print(root)
+
+
+if __name__ == '__main__':
+    main()
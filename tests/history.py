@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from os.path import join
+from unittest import TestCase
+
+from sasutils.history import CounterHistory
+
+KEY0 = 'host1.phys.0.invalid_dword_count'
+KEY1 = 'host1.phys.1.invalid_dword_count'
+
+
+class CounterHistoryTest(TestCase):
+    """Test cases for the local counter history"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = join(self.tmpdir, 'counters.hist')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_gains(self):
+        with CounterHistory(self.path, max_series=4, nslots=3) as hist:
+            hist.record(100, [(KEY0, 10), (KEY1, 5)])
+            hist.record(200, [(KEY0, 15), (KEY1, 5)])
+            hist.record(300, [(KEY0, 16), (KEY1, 2)])   # KEY1 reset
+            self.assertEqual(len(hist), 2)
+            self.assertEqual(hist.gains(150), [(KEY0, 6), (KEY1, 2)])
+            self.assertEqual(hist.gains(50), [(KEY1, 2), (KEY0, 1)])
+            self.assertEqual(hist.gains(150, keys=lambda k: k == KEY0),
+                             [(KEY0, 6)])
+            # oldest slot is reused
+            hist.record(400, [(KEY0, 16), (KEY1, 2)])
+            hist.record(500, [(KEY0, 17), (KEY1, 2)])
+            self.assertEqual(hist.gains(1000), [(KEY0, 2), (KEY1, 2)])
+            hist.record(600, [(KEY0, 17), (KEY1, 2)])
+            self.assertEqual(hist.gains(1000), [(KEY0, 1)])
+
+        # history and geometry are kept between runs
+        with CounterHistory(self.path, max_series=8, nslots=8,
+                            readonly=True) as hist:
+            self.assertEqual((hist.max_series, hist.nslots), (4, 3))
+            self.assertIn(KEY0, hist)
+            self.assertEqual(hist.last(KEY0), 17)
+            self.assertEqual(hist.gains(1000), [(KEY0, 1)])
+
+    def test_full(self):
+        with CounterHistory(self.path, max_series=1, nslots=2) as hist:
+            hist.record(100, [(KEY0, 1), (KEY1, 1)])
+            self.assertEqual(len(hist), 1)
+            self.assertNotIn(KEY1, hist)
+
+    def test_invalid(self):
+        CounterHistory(self.path, max_series=4, nslots=3).close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(size - 1)
+        self.assertRaises(ValueError, CounterHistory, self.path)
+        self.assertRaises(ValueError, CounterHistory, self.path,
+                          readonly=True)
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(16)
+        self.assertRaises(ValueError, CounterHistory, self.path)
+        with open(self.path, 'wb') as fp:
+            fp.write(b'\x00' * size)
+        self.assertRaises(ValueError, CounterHistory, self.path)
+        open(self.path, 'wb').close()
+        self.assertRaises(ValueError, CounterHistory, self.path)
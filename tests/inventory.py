@@ -0,0 +1,89 @@
+import shutil
+import sys
+import tempfile
+from os.path import dirname, join
+from unittest import TestCase
+
+from sasutils.inventory import Inventory
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+
+class InventoryTest(TestCase):
+    """Test cases for the indexed SAS inventory"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # two enclosures with two paths each, through two HBAs
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+        self.inv = Inventory(SysfsNode(join(self.root, 'class', 'sas_host')))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_inventory(self):
+        inv = self.inv
+        self.assertEqual(len(inv.hosts), 2)
+        self.assertEqual(len(inv.expanders), 4)
+        # per expander: SES device + 4 disks
+        self.assertEqual(len(inv.end_devices), 20)
+        self.assertEqual(len(inv), 20)
+        self.assertEqual(len(inv.enclosures), 4)
+
+    def test_lookups(self):
+        inv = self.inv
+        sda = inv.by_block('/dev/sda')
+        self.assertIs(inv.by_block('sda'), sda)
+        self.assertIs(inv.by_sg(sda.scsi_generic.name), sda)
+        self.assertIsNone(inv.by_block('sdzz'))
+        self.assertIsNone(inv.by_tape('st0'))
+
+        # multipath: one SCSI device per path
+        wwid = sda.attrs.wwid
+        paths = inv.by_wwid(wwid)
+        self.assertEqual(len(paths), 2)
+        self.assertIn(sda, paths)
+        self.assertEqual(inv.by_wwid(wwid.upper().replace('NAA.', '0x')),
+                         paths)
+        self.assertEqual(inv.by_serial(' ZL0000000000 '), paths)
+        self.assertEqual(inv.by_wwid('naa.0'), [])
+
+        end_device = inv.end_device(sda)
+        sas_address = end_device.sas_device.attrs.sas_address
+        self.assertEqual(inv.by_sas_address(sas_address[2:].upper()),
+                         [end_device])
+        host_address = inv.hosts[0].scsi_host.attrs.host_sas_address
+        self.assertEqual(inv.by_sas_address(host_address), [inv.hosts[0]])
+
+    def test_topology(self):
+        inv = self.inv
+        host = inv.hosts[0]
+        expanders = inv.children(host)
+        self.assertEqual(len(expanders), 2)
+        self.assertIsNone(inv.parent(host))
+        for expander in expanders:
+            self.assertIs(inv.parent(expander), host)
+            self.assertEqual(len(inv.children(expander)), 5)
+        end_device = inv.children(expanders[0])[0]
+        self.assertEqual(len(inv.children(end_device)), 1)
+
+    def test_enclosures(self):
+        inv = self.inv
+        sda = inv.by_block('sda')
+        bay = inv.bay(sda)
+        enclosure = inv.enclosure(sda)
+        self.assertEqual(bay, 0)
+        self.assertIn(enclosure, inv.enclosures)
+        self.assertEqual(inv.by_bay(enclosure, bay), [sda])
+        self.assertEqual(inv.by_bay('/dev/' + enclosure.scsi_generic.name,
+                                    '0'), [sda])
+        # enclosure logical identifier
+        encl_id = enclosure.sysfsnode.glob('enclosure/*')[0].get('id')
+        self.assertEqual(len(inv.by_bay(encl_id.upper(), bay)), 1)
+        self.assertEqual(inv.by_bay('sg999', bay), [])
+        # SES devices are not in an enclosure bay
+        self.assertIsNone(inv.bay(enclosure))
+        self.assertIsNone(inv.enclosure(enclosure))
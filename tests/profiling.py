@@ -0,0 +1,88 @@
+import atexit
+import os.path
+import shutil
+import sys
+import tempfile
+from os.path import dirname, join
+from unittest import TestCase
+
+import sasutils.command
+from sasutils import profiling, sgio, sysfs
+from sasutils.command import CommandRecorder, CommandReplayer, run_command
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+COMMAND = ['sh', '-c', 'echo out']
+
+
+class ProfilingTest(TestCase):
+    """Test cases for sysfs I/O and subprocess profiling"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        FabricGenerator(self.root, hbas=1, enclosures=1, slots=2,
+                        paths=1).generate()
+        self.saved = (sasutils.command._recorder, sasutils.command._replayer,
+                      sasutils.command._configured)
+        # record a command to replay while profiling
+        self._set_mode(recorder=CommandRecorder(join(self.root, 'cmds')))
+        run_command(COMMAND)
+        self._set_mode(replayer=CommandReplayer(join(self.root, 'cmds')))
+        self.profiler = profiling.enable()
+
+    def tearDown(self):
+        atexit.unregister(self.profiler.report)
+        profiling._profiler = None
+        # uninstall instrumentation
+        for owner in (sysfs, sysfs.SysfsNode, sasutils.command,
+                      sgio.SGIOTransport):
+            for name, value in list(vars(owner).items()):
+                if hasattr(value, '__wrapped__'):
+                    setattr(owner, name, value.__wrapped__)
+        for name, module in list(sys.modules.items()):
+            if name.startswith('sasutils') and module is not None:
+                realpath = getattr(module, 'realpath', None)
+                if hasattr(realpath, '__wrapped__'):
+                    module.realpath = os.path.realpath
+        (sasutils.command._recorder, sasutils.command._replayer,
+         sasutils.command._configured) = self.saved
+        sasutils.command.command_cache.clear()
+        shutil.rmtree(self.root)
+
+    def _set_mode(self, recorder=None, replayer=None):
+        sasutils.command._recorder = recorder
+        sasutils.command._replayer = replayer
+        sasutils.command._configured = True
+        sasutils.command.command_cache.clear()
+
+    def operations(self, result, name):
+        return dict((op, counter['count']) for op, counter
+                    in result['phases'][name]['operations'].items())
+
+    def test_phases(self):
+        hosts = SysfsNode(join(self.root, 'class', 'sas_host'))
+        with profiling.phase('hosts'):
+            for node in hosts.glob('host*'):
+                phy = node.node('device').glob('phy-*')[0]
+                phy.node('sas_phy').glob('*')[0].get('negotiated_linkrate')
+                node.gettext('uevent')
+        profiling.phase('commands')
+        hits = sasutils.command.command_cache.stats()['hits']
+        self.assertEqual(run_command(COMMAND).stdout, b'out\n')
+        # served by the command cache
+        run_command(COMMAND)
+
+        result = self.profiler.to_dict()
+        self.assertEqual(list(result['phases']),
+                         ['main', 'hosts', 'commands'])
+        # back to main at the end of the with block
+        self.assertEqual(self.operations(result, 'main'), {})
+        # node() lookups are globs too
+        self.assertEqual(self.operations(result, 'hosts'),
+                         {'glob': 5, 'get': 1, 'gettext': 1})
+        self.assertEqual(self.operations(result, 'commands'),
+                         {'exec sh': 1})
+        self.assertEqual(result['command_cache']['hits'], hits + 1)
+        self.assertIs(profiling.enable(), self.profiler)
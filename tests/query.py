@@ -0,0 +1,98 @@
+import shutil
+import sys
+import tempfile
+from os.path import basename, dirname, join
+from unittest import TestCase
+
+from sasutils.query import Query, parse_predicate
+from sasutils.scsi import EnclosureDevice
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+
+class QueryTest(TestCase):
+    """Test cases for device selection predicates"""
+
+    def test_parse(self):
+        pred = parse_predicate(' state == running ')
+        self.assertEqual((pred.field, pred.op, pred.values),
+                         ('state', '=', ['running']))
+        pred = parse_predicate('enclosure in sg12, JBOD_01')
+        self.assertEqual((pred.field, pred.op, pred.values),
+                         ('enclosure', 'in', ['sg12', 'JBOD_01']))
+        self.assertTrue(pred.selective)
+        self.assertFalse(parse_predicate('size>=16TB').selective)
+        self.assertRaises(ValueError, parse_predicate, 'state')
+        self.assertRaises(ValueError, Query.parse, ['bay=1', '=1'])
+        self.assertFalse(Query.parse([]))
+        self.assertEqual(Query.parse(['bay=1', 'bay<3', 'model~ST*']).fields,
+                         set(['bay', 'model']))
+
+    def test_matches(self):
+        record = {'size': '16.0TB', 'bay': 7, 'model': 'ST16000NM004J',
+                  'enclosure': ['sg12', 'JBOD_01'], 'state': 'offline',
+                  'sn': None}
+        for texts in (['size=16TB', 'size>10000GB', 'size<=16TB'],
+                      ['bay=7', 'bay in 1,7', 'bay>=7', 'bay!=8'],
+                      ['model~ST16*', 'model>ST1', 'model in a,ST16000NM004J'],
+                      ['enclosure=JBOD_01', 'enclosure~sg*',
+                       'enclosure!=JBOD_02'],
+                      ['state!=running', 'sn=', 'missing=']):
+            self.assertTrue(Query.parse(texts).matches(record), texts)
+        for text in ('size>16TB', 'bay in 1,2', 'bay<7', 'model~HGST*',
+                     'enclosure=JBOD_02', 'enclosure!=JBOD_01',
+                     'state=running', 'sn!=', 'missing=1'):
+            self.assertFalse(Query.parse([text]).matches(record), text)
+
+
+class QueryPushdownTest(TestCase):
+    """Test cases for predicates evaluated on sysfs nodes"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def end_devices(self, query):
+        """Return names of the end devices not skipped by query."""
+        sysfsnode = SysfsNode(join(self.root, 'class', 'sas_end_device'))
+        return sorted(basename(node.path) for node in sysfsnode
+                      if query.prefilter(node.node('device')))
+
+    def test_prefilter(self):
+        # per HBA: 2 expanders with a SES device and 4 disks
+        self.assertEqual(len(self.end_devices(Query())), 20)
+        self.assertEqual(len(self.end_devices(Query.parse(['bay=1']))), 4)
+        self.assertEqual(len(self.end_devices(
+            Query.parse(['model~ST16000*']))), 16)
+        # disks of bays 0 and 1, and SES devices (bay 0)
+        self.assertEqual(len(self.end_devices(
+            Query.parse(['vendor in SEAGATE,HGST', 'bay in 0,1']))), 12)
+        self.assertEqual(len(self.end_devices(
+            Query.parse(['vendor=HGST']))), 4)
+        # not selective or not pushed down: nothing is skipped
+        self.assertEqual(len(self.end_devices(
+            Query.parse(['bay>1', 'size=16TB']))), 20)
+
+    def test_resolve_enclosures(self):
+        enclosures = []
+        for node in SysfsNode(join(self.root, 'class', 'enclosure')):
+            sg_name = EnclosureDevice(node.node('device')).scsi_generic.name
+            encl_id = node.get('id')
+            enclosures.append((node, [sg_name, 'JBOD_%s' % encl_id[-3:]]))
+        self.assertEqual(len(enclosures), 4)
+
+        query = Query.parse(['enclosure=JBOD_000'])
+        query.resolve_enclosures(enclosures)
+        # 4 disks seen through both paths of the first enclosure
+        self.assertEqual(len(query.enclosure_wwids), 4)
+        self.assertEqual(len(self.end_devices(query)), 8)
+
+        query = Query.parse(['enclosure!=JBOD_000'])
+        query.resolve_enclosures(enclosures)
+        self.assertIsNone(query.enclosure_wwids)
@@ -0,0 +1,132 @@
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+from unittest import TestCase
+
+from sasutils.records import CSVWriter, NDJSONWriter, add_record_arguments
+from sasutils.records import record_writer
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+TOPDIR = dirname(dirname(abspath(__file__)))
+
+FIELDS = ('name', 'bay', 'size')
+
+
+class RecordWriterTest(TestCase):
+    """Test cases for streaming record writers"""
+
+    def test_ndjson(self):
+        stream = io.StringIO()
+        writer = NDJSONWriter(FIELDS, stream)
+        writer.write({'size': 16, 'name': 'sda', 'unknown': 1})
+        writer.write({'name': 'sdb', 'bay': None})
+        writer.close()
+        lines = stream.getvalue().splitlines()
+        # fixed schema: field order, missing fields are null
+        self.assertEqual(lines[0], '{"name": "sda", "bay": null, "size": 16}')
+        self.assertEqual(json.loads(lines[1]),
+                         {'name': 'sdb', 'bay': None, 'size': None})
+
+    def test_csv(self):
+        stream = io.StringIO()
+        writer = CSVWriter(FIELDS, stream)
+        self.assertEqual(stream.getvalue(), 'name,bay,size\n')
+        writer.write({'size': 16, 'name': 'sda,sdb', 'unknown': 1})
+        writer.write({'name': 'sdc', 'bay': 0, 'size': None})
+        writer.close()
+        self.assertEqual(stream.getvalue(),
+                         'name,bay,size\n"sda,sdb",,16\nsdc,0,\n')
+
+    def test_record_writer(self):
+        parser = argparse.ArgumentParser()
+        add_record_arguments(parser.add_mutually_exclusive_group())
+        stream = io.StringIO()
+        self.assertIsNone(record_writer(parser.parse_args([]), FIELDS))
+        self.assertIsInstance(record_writer(parser.parse_args(['--ndjson']),
+                                            FIELDS, stream), NDJSONWriter)
+        self.assertIsInstance(record_writer(parser.parse_args(['--csv']),
+                                            FIELDS, stream), CSVWriter)
+        self.assertRaises(SystemExit, parser.parse_args, ['--csv',
+                                                          '--ndjson'])
+
+
+class RecordCLITest(TestCase):
+    """Test cases for --ndjson and --csv outputs of command-line tools"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_cli(self, command, *args):
+        env = dict(os.environ, SYSFS_ROOT=self.root, PYTHONPATH=TOPDIR)
+        return subprocess.check_output(
+            [sys.executable, '-m', 'sasutils.cli.' + command] + list(args),
+            env=env, stderr=subprocess.DEVNULL, universal_newlines=True)
+
+    def test_sas_devices(self):
+        output = self.run_cli('sas_devices', '--ndjson', '-o',
+                              '{wwid} {type} {paths} {size}')
+        records = [json.loads(line) for line in output.splitlines()]
+        # one record per LU: 8 disks and 4 SES devices (one per path)
+        self.assertEqual(len(records), 12)
+        for record in records:
+            self.assertEqual(list(record),
+                             ['wwid', 'type', 'paths', 'size', 'enclosure'])
+            if record['type'] == 'disk':
+                self.assertEqual(record['paths'], 2)
+                self.assertEqual(record['size'], '16.0TB')
+                # both SES devices of the enclosure
+                self.assertEqual(len(record['enclosure'].split(',')), 2)
+            else:
+                self.assertEqual(record['paths'], 1)
+                self.assertEqual(record['enclosure'], '')
+
+        rows = list(csv.reader(io.StringIO(self.run_cli(
+            'sas_devices', '--csv', '-o', '{wwid} {bay}'))))
+        self.assertEqual(rows[0], ['wwid', 'bay', 'enclosure'])
+        self.assertEqual(sorted(row[0] for row in rows[1:]),
+                         sorted(record['wwid'] for record in records))
+
+    def test_sas_discover(self):
+        # block device without a valid size
+        sda = join(self.root, 'class', 'block', 'sda')
+        os.unlink(join(sda, 'size'))
+
+        records = [json.loads(line) for line in
+                   self.run_cli('sas_discover', '--ndjson').splitlines()]
+        nodes = [record['node'] for record in records]
+        self.assertEqual(nodes.count('host'), 2)
+        self.assertEqual(nodes.count('expander'), 4)
+        self.assertEqual(nodes.count('end_device'), 20)
+        self.assertEqual(nodes.count('scsi_device'), 20)
+        sizes = dict((record['block'], record['size']) for record in records
+                     if record['block'])
+        self.assertEqual(len(sizes), 16)
+        self.assertIsNone(sizes.pop('sda'))
+        self.assertEqual(set(sizes.values()), set([31251759104 * 512]))
+        for record in records:
+            if record['node'] == 'expander':
+                self.assertEqual((record['depth'], record['parent']),
+                                 (1, record['host']))
+                self.assertEqual(record['linkrate'], '4 x 12.0 Gbit')
+            elif record['node'] == 'scsi_device':
+                self.assertEqual(record['depth'], 3)
+                self.assertTrue(record['parent'].startswith('end_device-'))
+
+        rows = list(csv.reader(io.StringIO(self.run_cli('sas_discover',
+                                                        '--csv'))))
+        self.assertEqual(rows[0][:4], ['host', 'depth', 'node', 'name'])
+        self.assertEqual(len(rows), len(records) + 1)
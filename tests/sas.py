@@ -0,0 +1,113 @@
+import shutil
+import sys
+import tempfile
+from os.path import dirname, join, realpath
+from unittest import TestCase
+
+from sasutils.sas import SASEndDevice, SASExpander, SASHost, SASPort, walk
+from sasutils.scsi import SCSIDevice, TYPE_DISK, TYPE_ENCLOSURE
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+KINDS = ((SASHost, 'host'), (SASExpander, 'expander'), (SASPort, 'port'),
+         (SASEndDevice, 'end_device'), (SCSIDevice, 'scsi_device'))
+
+
+def kind(obj):
+    for cls, name in KINDS:
+        if isinstance(obj, cls):
+            return name
+
+
+class WalkTest(TestCase):
+    """Test cases for the streaming SAS topology traversal"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # a switch tier between each HBA and two enclosure expanders
+        FabricGenerator(self.root, hbas=1, tiers=2, enclosures=2, slots=2,
+                        paths=1).generate()
+        hosts = SysfsNode(join(self.root, 'class', 'sas_host'))
+        self.host = SASHost(hosts.node('host0').node('device'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_walk(self):
+        items = [(depth, kind(obj), obj.name) for depth, obj
+                 in walk(self.host)]
+        self.assertEqual(items[:5], [
+            (0, 'host', 'host0'),
+            (1, 'port', 'port-0:0'),
+            (2, 'expander', 'expander-0:0'),
+            (3, 'port', 'port-0:1'),
+            (4, 'expander', 'expander-0:1')])
+        # depth-first: each object lies in the device tree of its parent
+        stack = []
+        for depth, obj in walk(self.host):
+            del stack[depth:]
+            path = realpath(obj.sysfsnode.path)
+            if stack:
+                self.assertEqual(depth, len(stack))
+                self.assertTrue(path.startswith(stack[-1] + '/'), path)
+            if isinstance(obj, SCSIDevice):
+                stack.append(path)
+            else:
+                # class device of a SAS transport object
+                stack.append(dirname(dirname(path)))
+        self.assertEqual(max(item[0] for item in items), 7)
+        kinds = [item[1] for item in items]
+        self.assertEqual(kinds.count('expander'), 3)
+        # SES device and 2 disks per enclosure
+        self.assertEqual(kinds.count('end_device'), 6)
+        self.assertEqual(kinds.count('scsi_device'), 6)
+        # the root is at depth 0 only
+        self.assertEqual([item for item in items if item[0] == 0],
+                         [(0, 'host', 'host0')])
+
+    def test_maxdepth(self):
+        items = list(walk(self.host, maxdepth=2))
+        self.assertEqual([(depth, kind(obj)) for depth, obj in items],
+                         [(0, 'host'), (1, 'port'), (2, 'expander')])
+        self.assertEqual([kind(obj) for _, obj in walk(self.host,
+                                                       maxdepth=0)],
+                         ['host'])
+
+    def test_prune(self):
+        seen = []
+
+        def prune(depth, obj):
+            seen.append((depth, kind(obj)))
+            return isinstance(obj, SASEndDevice)
+
+        items = [(depth, kind(obj)) for depth, obj
+                 in walk(self.host, prune=prune)]
+        # pruned objects and their descendants are not visited
+        self.assertNotIn('end_device', [item[1] for item in items])
+        self.assertNotIn('scsi_device', [item[1] for item in items])
+        self.assertEqual(len([item for item in seen
+                              if item[1] == 'end_device']), 6)
+        # prune is never called on the root
+        self.assertNotIn((0, 'host'), seen)
+
+        # pruning the root children only leaves the root
+        self.assertEqual([kind(obj) for _, obj in
+                          walk(self.host, prune=lambda depth, obj: True)],
+                         ['host'])
+
+    def test_end_devices_by_scsi_type(self):
+        expanders = [obj for _, obj in walk(self.host)
+                     if isinstance(obj, SASExpander)]
+        switch, enclosure = expanders[:2]
+        # direct children only: none below the switch expander
+        self.assertEqual(list(switch.end_devices_by_scsi_type(TYPE_DISK)),
+                         [])
+        disks = list(enclosure.end_devices_by_scsi_type(TYPE_DISK))
+        self.assertEqual(len(disks), 2)
+        for end_device in disks:
+            self.assertIsInstance(end_device, SASEndDevice)
+        ses = list(enclosure.end_devices_by_scsi_type(str(TYPE_ENCLOSURE)))
+        self.assertEqual(len(ses), 1)
+        self.assertNotIn(ses[0].name, [disk.name for disk in disks])
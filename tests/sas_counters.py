@@ -0,0 +1,66 @@
+import io
+import json
+import shutil
+import tempfile
+from contextlib import redirect_stderr
+from os.path import join
+from unittest import TestCase
+
+from sasutils.cli.sas_counters import ChangeFilter
+
+KEY0 = 'host1.phys.0.invalid_dword_count'
+KEY1 = 'host1.phys.1.invalid_dword_count'
+
+
+class ChangeFilterTest(TestCase):
+    """Test cases for sas_counters --changed-only"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = join(self.tmpdir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_filter(self, samples, timestamp, heartbeat=600):
+        """Return keys emitted by a sas_counters run."""
+        changes = ChangeFilter(self.path, heartbeat)
+        emitted = [key for key, value in samples
+                   if changes(key, value, timestamp)]
+        with redirect_stderr(io.StringIO()) as err:
+            changes.close()
+        self.assertIn('%d emitted' % len(emitted), err.getvalue())
+        return emitted
+
+    def test_changed_only(self):
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 2)], 1000),
+                         [KEY0, KEY1])
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 2)], 1060), [])
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 3)], 1120),
+                         [KEY1])
+        # series not seen during a run are forgotten
+        self.assertEqual(self.run_filter([(KEY1, 3)], 1180), [])
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 3)], 1240),
+                         [KEY0])
+
+    def test_heartbeat(self):
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 2)], 1000,
+                                         heartbeat=100), [KEY0, KEY1])
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 3)], 1050,
+                                         heartbeat=100), [KEY1])
+        # unchanged KEY0 last emitted at 1000, KEY1 at 1050
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 3)], 1100,
+                                         heartbeat=100), [KEY0])
+        self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 3)], 1150,
+                                         heartbeat=100), [KEY1])
+
+    def test_invalid_state(self):
+        for state in ('not json', '[1, 2]', '42',
+                      json.dumps({KEY0: 1, KEY1: []})):
+            with open(self.path, 'w') as fp:
+                fp.write(state)
+            self.assertEqual(self.run_filter([(KEY0, 1), (KEY1, 2)], 1000),
+                             [KEY0, KEY1])
+        with open(self.path) as fp:
+            self.assertEqual(json.load(fp), {KEY0: ['1', 1000],
+                                             KEY1: ['2', 1000]})
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from os.path import abspath, dirname, join
+from unittest import TestCase
+
+from sasutils.cli.sas_devices import FMT_MAP, DeviceTable
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+TOPDIR = dirname(dirname(abspath(__file__)))
+
+FIELDS = ('bay', 'model', 'size', 'sn')
+
+
+class DeviceTableTest(TestCase):
+    """Test cases for the columnar device table of sas_devices"""
+
+    def setUp(self):
+        self.table = DeviceTable(FIELDS)
+        self.rows = [{'bay': 0, 'model': 'ST16000NM004J', 'size': '16.0TB',
+                      'sn': 'ZL01'},
+                     {'bay': 1, 'model': 'ST16000NM004J', 'size': '16.0TB',
+                      'sn': 'ZL02'},
+                     {'bay': 0, 'model': 'ST16000NM004J', 'size': '16.0TB',
+                      'sn': 'ZL01'},
+                     {'model': 'ST16000NM004J', 'unknown': 1},
+                     {}]
+        for index, row in enumerate(self.rows):
+            self.table.append(row, obj=index)
+
+    def test_append(self):
+        table = self.table
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.objects, [0, 1, 2, 3, 4])
+        self.assertEqual(DeviceTable().fields, list(FMT_MAP))
+        # the empty row is not counted
+        self.assertEqual(table.nonempty, 4)
+
+    def test_columns(self):
+        table = self.table
+        # shared values are stored once per column
+        self.assertEqual(table.values['model'], ['ST16000NM004J', ''])
+        self.assertEqual(table.columns['model'], [0, 0, 0, 0, 1])
+        self.assertEqual(table.values['bay'], [0, 1, ''])
+        self.assertEqual(table.columns['bay'], [0, 1, 0, 2, 2])
+        self.assertEqual(table.values['size'], ['16.0TB', ''])
+        self.assertNotIn('unknown', table.columns)
+
+    def test_row(self):
+        table = self.table
+        for index, row in enumerate(self.rows[:3]):
+            self.assertEqual(table.row(index), row)
+        # missing fields decode as empty values
+        self.assertEqual(table.row(3), {'bay': '', 'model': 'ST16000NM004J',
+                                        'size': '', 'sn': ''})
+        self.assertEqual(table.row(4), dict.fromkeys(FIELDS, ''))
+
+    def test_used_fields(self):
+        self.assertEqual(self.table.used_fields(), list(FIELDS))
+        table = DeviceTable(FIELDS)
+        table.append({'model': 'ST16000NM004J', 'size': ''})
+        table.append({'bay': 2})
+        self.assertEqual(table.used_fields(), ['bay', 'model'])
+        self.assertEqual(DeviceTable(FIELDS).used_fields(), [])
+
+    def test_fold(self):
+        # identical rows are grouped, by order of first appearance
+        self.assertEqual(self.table.fold(), [[0, 2], [1], [3], [4]])
+        table = DeviceTable(FIELDS)
+        for bay in (2, 1, 2, 1, 2):
+            table.append({'bay': bay})
+        self.assertEqual(table.fold(), [[0, 2, 4], [1, 3]])
+        self.assertEqual(DeviceTable(FIELDS).fold(), [])
+
+
+class ReadPlanTest(TestCase):
+    """Test cases for optional reads skipped by restricted formats"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def operations(self, *args):
+        """Return profiled operation counts of a sas_devices run."""
+        profile = join(self.root, 'profile.json')
+        env = dict(os.environ, SYSFS_ROOT=self.root, PYTHONPATH=TOPDIR,
+                   SASUTILS_PROFILE=profile)
+        subprocess.check_call(
+            [sys.executable, '-m', 'sasutils.cli.sas_devices'] + list(args),
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(profile) as fp:
+            phases = json.load(fp)['phases']
+        counts = Counter()
+        for stats in phases.values():
+            for operation, opstats in stats['operations'].items():
+                counts[operation] += opstats['count']
+        return counts
+
+    def test_ses_snic(self):
+        # no enclosure group headers nor nickname: sg_ses is not run
+        counts = self.operations('--ndjson', '-o', '{wwid}')
+        self.assertEqual(counts['exec sg_ses'], 0)
+        # once per SES device (the command may fail here)
+        counts = self.operations('--ndjson', '-o', '{wwid} {snic}')
+        self.assertEqual(counts['exec sg_ses'], 4)
+        counts = self.operations('--ndjson', '-o', '{wwid}', '-w',
+                                 'enclosure=JBOD_01')
+        self.assertEqual(counts['exec sg_ses'], 4)
+        counts = self.operations('-o', '{wwid}')
+        self.assertEqual(counts['exec sg_ses'], 4)
+
+    def test_vpd_pg80(self):
+        base = self.operations('--ndjson', '-o', '{wwid}')
+        counts = self.operations('--ndjson', '-o', '{wwid} {sn}')
+        # unit serial number pages of the 12 LUs, no SG_IO fallback
+        self.assertEqual(counts['getraw'] - base['getraw'], 12)
+        self.assertEqual(counts['exec sg_ses'], 0)
+        self.assertEqual(counts['sg_io'], 0)
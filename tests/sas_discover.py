@@ -0,0 +1,109 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from os.path import dirname, join
+from unittest import TestCase
+from unittest.mock import patch
+
+from sasutils.cli.sas_discover import SDHostNode, SDWatcher, host_signature
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+
+class SDWatcherTest(TestCase):
+    """Test cases for sas_discover watch mode change detection"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        FabricGenerator(self.root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+        self.hostsdir = join(self.root, 'class', 'sas_host')
+        disp = {'verbose': 0, 'addr': False, 'devices': False,
+                'counters': False}
+        self.watcher = SDWatcher('test', SysfsNode(self.hostsdir), disp,
+                                 0.01)
+
+    def tearDown(self):
+        if self.watcher._uevents is not None:
+            self.watcher._uevents.close()
+        shutil.rmtree(self.root)
+
+    def host_path(self, name):
+        return os.path.realpath(join(self.hostsdir, name, 'device'))
+
+    def end_devices(self, host):
+        for dirpath, dirnames, _ in os.walk(self.host_path(host)):
+            for name in sorted(dirnames):
+                if name.startswith('end_device-'):
+                    yield join(dirpath, name)
+
+    def test_host_signature(self):
+        path = self.host_path('host0')
+        signature = host_signature(path)
+        self.assertEqual(host_signature(path), signature)
+
+        # link rate change
+        phy = sorted(name for name in os.listdir(path)
+                     if name.startswith('phy-'))[0]
+        with open(join(path, phy, 'sas_phy', phy, 'negotiated_linkrate'),
+                  'w') as fp:
+            fp.write('6.0 Gbit\n')
+        changed = host_signature(path)
+        self.assertNotEqual(changed, signature)
+
+        # removed end device
+        shutil.rmtree(next(self.end_devices('host0')))
+        self.assertNotEqual(host_signature(path), changed)
+
+    def test_render(self):
+        def rendered_hosts(print_tree):
+            return [call[0][0].name for call in print_tree.call_args_list
+                    if type(call[0][0]) is SDHostNode]
+
+        with patch.object(SDHostNode, 'print_tree', autospec=True,
+                          side_effect=SDHostNode.print_tree) as print_tree:
+            lines = self.watcher.render()
+            self.assertEqual(rendered_hosts(print_tree), ['host0', 'host1'])
+            # unchanged topology: nothing is discovered again
+            print_tree.reset_mock()
+            self.assertEqual(self.watcher.render(), lines)
+            self.assertEqual(rendered_hosts(print_tree), [])
+            # only the changed host is discovered again
+            shutil.rmtree(next(self.end_devices('host1')))
+            changed = self.watcher.render()
+            self.assertEqual(rendered_hosts(print_tree), ['host1'])
+        self.assertNotEqual(changed, lines)
+        host1 = lines.index('`--host1 ')
+        self.assertEqual(changed[:host1], lines[:host1])
+
+    def test_wait(self):
+        watcher = self.watcher
+        watcher._uevents, events = socket.socketpair()
+        try:
+            watcher.render()
+            # no uevent: no check until the fallback poll
+            self.assertFalse(watcher.wait())
+            watcher._checked = time.time() - 3600
+            self.assertTrue(watcher.wait())
+            watcher.render()
+            # uevents are drained
+            events.send(b'change@/devices/x')
+            events.send(b'change@/devices/y')
+            self.assertTrue(watcher.wait())
+            self.assertFalse(watcher.wait())
+            # I/O counters change without uevents
+            watcher.disp['counters'] = True
+            self.assertTrue(watcher.wait())
+        finally:
+            events.close()
+
+    def test_wait_no_uevents(self):
+        if self.watcher._uevents is not None:
+            self.watcher._uevents.close()
+            self.watcher._uevents = None
+        self.assertTrue(self.watcher.wait())
@@ -0,0 +1,66 @@
+import shutil
+import sys
+import tempfile
+from os.path import dirname, join
+from unittest import TestCase
+
+from sasutils.snapshot import Snapshot, write_snapshot
+from sasutils.sysfs import SysfsNode
+
+sys.path.insert(0, dirname(__file__))
+from gen_sysfs_fabric import FabricGenerator  # noqa: E402
+
+
+class SnapshotTest(TestCase):
+    """Test cases for topology snapshots"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        root = join(self.tmpdir, 'sys')
+        FabricGenerator(root, hbas=2, enclosures=2, slots=4,
+                        paths=2).generate()
+        self.path = join(self.tmpdir, 'fabric.snap')
+        self.nnodes = write_snapshot(
+            self.path, SysfsNode(join(root, 'class', 'sas_host')))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_snapshot(self):
+        with Snapshot(self.path) as snap:
+            self.assertEqual(len(snap), self.nnodes)
+            hosts = snap.root.children
+            self.assertEqual([host.name for host in hosts],
+                             ['host0', 'host1'])
+            self.assertEqual(hosts[0].attrs['host_sas_address'],
+                             '0x500605b00a000000')
+            self.assertIsNone(snap.root.parent)
+            # 2 x 2 enclosure paths of 4 disks and a SES device
+            self.assertEqual(len(list(snap.find(kind='end_device'))), 20)
+            self.assertEqual(len(list(snap.find(kind='block'))), 16)
+            self.assertEqual(list(snap.find(kind='dummy')), [])
+
+            block = next(snap.find(kind='block', name='sda'))
+            scsi_device = block.parent
+            self.assertEqual(scsi_device.kind, 'scsi_device')
+            self.assertIn(block, scsi_device.children)
+            self.assertEqual(block.attrs.get('size'), '31251759104')
+            self.assertTrue(block.path.startswith('host0/port-0:0/'))
+            # binary attribute
+            pg80 = scsi_device.attrs.getraw('vpd_pg80')
+            self.assertEqual(pg80[1], 0x80)
+
+            end_device = scsi_device.parent
+            self.assertIn('sas_address', end_device.attrs)
+            self.assertEqual(end_device.attrs.get('bay_identifier'), '0')
+            self.assertIsNone(end_device.attrs.get('dummy'))
+            self.assertRaises(KeyError, end_device.attrs.__getitem__,
+                              'dummy')
+            self.assertEqual(list(end_device.attrs),
+                             sorted(end_device.attrs))
+
+    def test_not_snapshot(self):
+        path = join(self.tmpdir, 'empty')
+        with open(path, 'wb') as fp:
+            fp.write(b'not a snapshot')
+        self.assertRaises(ValueError, Snapshot, path)
@@ -1,9 +1,11 @@
 import os
+import threading
+import time
 from os.path import dirname, join
 from unittest import TestCase
 
 import sasutils.sysfs
-from sasutils.sysfs import SysfsNode, SysfsObject, SysfsDevice
+from sasutils.sysfs import SysfsNode, SysfsObject, SysfsDevice, hexint
 
 if 'gen_sysfs_testenv' not in os.environ:
     sasutils.sysfs.SYSFS_ROOT = 'sys'
@@ -58,6 +60,16 @@ class SysfsNodeTest(TestCase):
         self.assertRaises(KeyError, blkdevnode.get, 'dummyentry')
         self.assertEqual(blkdevnode.get('dummyentry', ignore_errors=True), None)
 
+    def test_getraw(self):
+        blkdevnode = sysfs.node('block').node(self.sd)
+        data = blkdevnode.getraw('removable')
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(blkdevnode.getraw('removable', view=True), data)
+        self.assertEqual(blkdevnode.gettext('removable'),
+                         blkdevnode.get('removable'))
+        self.assertRaises(KeyError, blkdevnode.getraw, 'dummyentry')
+        self.assertRaises(KeyError, blkdevnode.gettext, 'dummyentry')
+
 
 class SysfsObjectTest(TestCase):
     """Test cases for SysfsObject"""
@@ -71,6 +83,43 @@ class SysfsObjectTest(TestCase):
                          join(sysfsroot, 'block/%s' % self.sd))
         self.assertTrue(sysfsobj.attrs.size > 0)
 
+    def test_typed(self):
+        class BlockObject(SysfsObject):
+            attr_types = {'size': int, 'removable': int, 'ro': hexint}
+
+        sysfsobj = BlockObject(sysfs.node('block').node(self.sd))
+        size = sysfsobj.attrs.typed('size')
+        self.assertEqual(size, int(sysfsobj.attrs.size))
+        self.assertIn(sysfsobj.attrs.typed('removable'), (0, 1))
+        self.assertIn(sysfsobj.attrs.typed('ro'), (0, 1))
+        self.assertEqual(sysfsobj.attrs.typed('dummyentry'), None)
+        self.assertEqual(sysfsobj.attrs.typed('dummyentry', -1), -1)
+        # attributes without type are text
+        self.assertEqual(sysfsobj.attrs.typed('dev'), sysfsobj.attrs.dev)
+
+    def test_concurrent_get(self):
+        sysfsobj = SysfsObject(sysfs.node('block').node(self.sd))
+        module_sysfs = sasutils.sysfs.sysfs
+        reads = []
+
+        def slow_gettext(path, *args, **kwargs):
+            reads.append(path)
+            time.sleep(0.05)
+            return SysfsNode.gettext(module_sysfs, path, *args, **kwargs)
+
+        module_sysfs.gettext = slow_gettext
+        try:
+            threads = [threading.Thread(target=sysfsobj.attrs.get,
+                                        args=('size',)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del module_sysfs.gettext
+        # single read, other threads waited for it
+        self.assertEqual(len(reads), 1)
+
 
 class SysfsDeviceTest(TestCase):
     """Test cases for SysfsDevice"""
@@ -0,0 +1,74 @@
+from struct import pack
+from unittest import TestCase
+
+from sasutils.sgio import CapturedTransport, inquiry_vpd, inquiry_vpd_many
+from sasutils.vpd import vpd_decode_pg80_sn, vpd_decode_pg83
+from sasutils.vpd import vpd_decode_pg83_lu, vpd_decode_pg83_target_port
+from sasutils.vpd import VPD_ASSOC_TPORT, VPD_DI_REL_TPORT
+
+
+def designator(proto_cs, piv_assoc_type, value):
+    return pack('>BBBB', proto_cs, piv_assoc_type, 0, len(value)) + value
+
+
+def vpd_page(page, data):
+    return pack('>BBH', 0, page, len(data)) + data
+
+
+# device identification page of a SAS disk
+PG83 = vpd_page(0x83, b''.join((
+    designator(0x01, 0x03, bytes.fromhex('5000cca2610b3d48')),
+    designator(0x61, 0x93, bytes.fromhex('5000cca2610b3d49')),
+    designator(0x61, 0x94, pack('>HH', 0, 1)),
+    designator(0x61, 0xa3, bytes.fromhex('5000cca2610b3d4b')),
+    designator(0x53, 0xa8, b'naa.5000CCA2610B3D4B\x00\x00\x00\x00'))))
+
+PG80 = vpd_page(0x80, b'    ZL2E0B4M')
+
+
+class VPDTest(TestCase):
+    """Test cases for VPD decoding and SG_IO INQUIRY"""
+
+    def test_decode_pg83(self):
+        designators = vpd_decode_pg83(PG83)
+        self.assertEqual(len(designators), 5)
+        self.assertEqual(vpd_decode_pg83_lu(PG83), '0x5000cca2610b3d48')
+        self.assertEqual(vpd_decode_pg83_target_port(PG83),
+                         ('0x5000cca2610b3d49', 1))
+        relport = designators[2]
+        self.assertEqual(relport.association, VPD_ASSOC_TPORT)
+        self.assertEqual(relport.type, VPD_DI_REL_TPORT)
+        self.assertEqual(relport.protocol, 6)  # SAS
+        self.assertEqual(designators[4].value, 'naa.5000CCA2610B3D4B')
+        # memoryview buffers and truncated pages
+        self.assertEqual(vpd_decode_pg83(memoryview(PG83)), designators)
+        self.assertEqual(vpd_decode_pg83(PG83[:20]), designators[:1])
+
+    def test_decode_pg80(self):
+        self.assertEqual(vpd_decode_pg80_sn(PG80), 'ZL2E0B4M')
+
+    def test_inquiry_vpd(self):
+        transport = CapturedTransport({'sg1': {0x80: PG80, 0x83: PG83}})
+        self.assertEqual(inquiry_vpd('sg1', 0x83, transport), PG83)
+        self.assertEqual(transport.commands[0][1],
+                         bytes.fromhex('120183020000'))
+        self.assertRaises(OSError, inquiry_vpd, 'sg2', 0x80, transport)
+
+    def test_inquiry_vpd_truncated(self):
+        # pages longer than the initial allocation length are read again
+        bigpage = vpd_page(0x83, designator(0x02, 0x00, b'x' * 250) * 3)
+        transport = CapturedTransport({'sg1': {0x83: bigpage}})
+        self.assertEqual(inquiry_vpd('sg1', 0x83, transport), bigpage)
+        self.assertEqual(len(transport.commands), 2)
+
+    def test_inquiry_vpd_many(self):
+        pages = dict(('sg%d' % i, {0x80: PG80, 0x83: PG83})
+                     for i in range(20))
+        pages['sg5'] = {0x83: PG83}
+        transport = CapturedTransport(pages)
+        result = inquiry_vpd_many(list(pages) + ['sg99'], jobs=4,
+                                  transport=transport)
+        self.assertEqual(len(result), 21)
+        self.assertEqual(vpd_decode_pg80_sn(result['sg0'][0x80]), 'ZL2E0B4M')
+        self.assertEqual(result['sg5'], {0x80: None, 0x83: PG83})
+        self.assertEqual(result['sg99'], {0x80: None, 0x83: None})